@@ -8,8 +8,12 @@ from .models import (
     Quiz,
     Question,
     CourseRating,
+    CourseStats,
     StudentProgress,
-    QuizAttempt
+    ChapterScore,
+    QuizAttempt,
+    TeacherDashboardSnapshot,
+    CourseDailyRollup
 )
 
 
@@ -60,6 +64,7 @@ class CourseAdmin(admin.ModelAdmin):
     search_fields = (
         'title', 'description', 'teacher__email', 'teacher__first_name', 'teacher__last_name')
     ordering = ('-created_at',)
+    list_select_related = ('teacher', 'stats')
     readonly_fields = (
         'created_at', 'updated_at', 'enrollment_count', 'average_rating')
 
@@ -83,6 +88,17 @@ class CourseAdmin(admin.ModelAdmin):
     filter_horizontal = ('enrolled_students',)
 
 
+@admin.register(CourseStats)
+class CourseStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        'course', 'enrollment_count', 'average_rating', 'rating_count', 'completion_count', 'progress_count', 'updated_at')
+    list_select_related = ('course',)
+    search_fields = ('course__title',)
+    ordering = ('-updated_at',)
+    readonly_fields = (
+        'course', 'enrollment_count', 'rating_sum', 'rating_count', 'completion_count', 'progress_count', 'updated_at')
+
+
 @admin.register(Chapter)
 class ChapterAdmin(admin.ModelAdmin):
     list_display = (
@@ -166,6 +182,13 @@ class CourseRatingAdmin(admin.ModelAdmin):
     )
 
 
+class ChapterScoreInline(admin.TabularInline):
+    model = ChapterScore
+    fields = ('chapter', 'score', 'completed_at')
+    raw_id_fields = ('chapter',)
+    extra = 0
+
+
 @admin.register(StudentProgress)
 class StudentProgressAdmin(admin.ModelAdmin):
     list_display = (
@@ -175,23 +198,25 @@ class StudentProgressAdmin(admin.ModelAdmin):
         'student__email', 'student__first_name', 'student__last_name', 'course__title')
     ordering = ('-enrolled_at',)
     readonly_fields = (
-        'enrolled_at', 'last_accessed_at', 'progress_percentage')
+        'enrolled_at', 'last_accessed_at', 'progress_percentage',
+        'completed_chapter_count', 'total_chapter_count')
 
     fieldsets = (
         ('Progress Information', {
-            'fields': ('student', 'course', 'enrolled_at', 'last_accessed_at', 'progress_percentage')
+            'fields': ('student', 'course', 'enrolled_at', 'last_accessed_at', 'progress_percentage',
+                       'completed_chapter_count', 'total_chapter_count')
         }),
         ('Completion Status', {
             'fields': ('completed', 'completed_at', 'certificate_url')
         }),
         ('Scores & Progress', {
             'fields': (
-                'completed_chapters', 'chapter_scores', 'quiz_scores', 'final_exam_score', 'final_exam_attempts', 'total_time_spent'),
+                'quiz_scores', 'final_exam_score', 'final_exam_attempts', 'total_time_spent'),
             'classes': ('collapse',)
         }),
     )
 
-    filter_horizontal = ('completed_chapters',)
+    inlines = [ChapterScoreInline]
 
 
 @admin.register(QuizAttempt)
@@ -213,3 +238,26 @@ class QuizAttemptAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(TeacherDashboardSnapshot)
+class TeacherDashboardSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('teacher', 'refreshed_at', 'updated_at')
+    list_select_related = ('teacher',)
+    search_fields = ('teacher__email',)
+    ordering = ('-updated_at',)
+    readonly_fields = ('teacher', 'data', 'refreshed_at', 'updated_at')
+
+
+@admin.register(CourseDailyRollup)
+class CourseDailyRollupAdmin(admin.ModelAdmin):
+    list_display = (
+        'course', 'day', 'enrollments', 'completions', 'attempts', 'passed_attempts', 'average_score',
+        'active_students')
+    list_select_related = ('course',)
+    list_filter = ('day',)
+    search_fields = ('course__title',)
+    ordering = ('-day',)
+    readonly_fields = (
+        'course', 'day', 'enrollments', 'completions', 'attempts', 'passed_attempts', 'score_sum',
+        'active_students')
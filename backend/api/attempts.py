@@ -0,0 +1,294 @@
+"""
+Quiz attempt persistence with an optional write-behind journal.
+
+By default `record()` inserts the attempt straight away. With
+`QUIZ_ATTEMPTS['WRITE_BEHIND']` enabled the graded attempt is appended to a
+per-process journal file instead, and a background thread moves journal
+segments into `QuizAttempt` with batched `bulk_create` calls. Attempts carry
+their primary key from the start, so replaying a segment that was already
+partly flushed inserts nothing twice. Segments left behind by a process that
+died are picked up by the next flush or by the `replay_attempts` command.
+
+A segment that fails to flush stays on disk for the next pass without holding
+up the others. Lines that cannot be parsed, and rows the database refuses,
+are moved to a `.quarantine` file next to the segment instead of being
+retried forever; renaming it to `.ready` once fixed replays it.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import dashboard
+from .models import User, Quiz, QuizAttempt
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WRITE_BEHIND': False,
+    'JOURNAL_DIR': None,
+    'BATCH_SIZE': 500,
+    # Seconds between background flushes; None disables the flusher thread
+    'FLUSH_INTERVAL': 1.0,
+    'FSYNC': True,
+    # Largest number of submissions accepted by one submit-batch request
+    'MAX_BATCH': 100,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'QUIZ_ATTEMPTS', {}).get(name, DEFAULTS[name])
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class Journal:
+    """Append-only journal of graded attempts for one process"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.file = None
+        self.pid = None
+        self.thread = None
+
+    @property
+    def path(self):
+        return self.directory / f'attempts-{os.getpid()}.jsonl'
+
+    def append(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self.lock:
+            if self.file is None or self.pid != os.getpid():
+                # Reopen after a fork so children never share the parent's file
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self.file = open(self.path, 'a', encoding='utf-8')
+                self.pid = os.getpid()
+            self.file.write(line)
+            self.file.flush()
+            if get_setting('FSYNC'):
+                os.fsync(self.file.fileno())
+        self.start()
+
+    def rotate(self):
+        """Close the active segment and mark it ready for flushing"""
+        with self.lock:
+            if self.file is None or self.pid != os.getpid():
+                return
+            self.file.close()
+            self.file = None
+            if self.path.exists():
+                # The timestamp keeps names unique even if a dead process had our pid
+                self.path.rename(self.directory / f'attempts-{self.pid}-{time.time_ns()}.ready')
+
+    def pending_segments(self, include_active=False):
+        """
+        This process's ready segments plus any segment of a process that is
+        gone. With include_active every segment is returned, which is only
+        safe while no server process is writing.
+        """
+        if not self.directory.exists():
+            return []
+        segments = []
+        for path in sorted(self.directory.glob('attempts-*')):
+            if path.suffix not in ('.ready', '.jsonl'):
+                continue
+            pid = int(path.stem.split('-')[1])
+            if pid == os.getpid():
+                ready = path.suffix == '.ready'
+            else:
+                ready = not pid_alive(pid)
+            if include_active or ready:
+                segments.append(path)
+        return segments
+
+    def flush(self, include_active=False):
+        """Move every pending segment into the database; returns the number of attempts written"""
+        with self.flush_lock:
+            self.rotate()
+            written = 0
+            for path in self.pending_segments(include_active):
+                try:
+                    written += replay_segment(path)
+                except FileNotFoundError:
+                    # Another process recovered it first
+                    continue
+                except Exception:
+                    # Left on disk for the next pass; later segments still go in
+                    logger.exception('Flushing quiz attempt journal segment %s failed', path)
+                    continue
+                path.unlink(missing_ok=True)
+            return written
+
+    def start(self):
+        interval = get_setting('FLUSH_INTERVAL')
+        if interval is None or (self.thread is not None and self.thread.is_alive()):
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, args=(interval,), name='attempt-journal', daemon=True)
+                self.thread.start()
+
+    def run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                # Segments stay on disk and are retried on the next pass
+                logger.exception('Flushing the quiz attempt journal failed')
+            finally:
+                connection.close()
+
+
+def attempt_from_entry(entry):
+    return QuizAttempt(
+        id=uuid.UUID(entry['id']),
+        student_id=uuid.UUID(entry['student_id']),
+        quiz_id=uuid.UUID(entry['quiz_id']),
+        answers=entry['answers'],
+        score=entry['score'],
+        time_taken=entry['time_taken'],
+        started_at=parse_datetime(entry['started_at']),
+        completed_at=parse_datetime(entry['started_at']),
+    )
+
+
+def insert_attempts(attempts):
+    """
+    bulk_create attempts, skipping ones already present. Attempts whose
+    student or quiz was deleted meanwhile are dropped, as the cascade would
+    have done had they been inserted straight away.
+    """
+    quiz_ids = set(Quiz.objects.filter(
+        pk__in={attempt.quiz_id for attempt in attempts}).values_list('pk', flat=True))
+    student_ids = set(User.objects.filter(
+        pk__in={attempt.student_id for attempt in attempts}).values_list('pk', flat=True))
+    attempts = [
+        attempt for attempt in attempts
+        if attempt.quiz_id in quiz_ids and attempt.student_id in student_ids
+    ]
+    QuizAttempt.objects.bulk_create(attempts, ignore_conflicts=True)
+    if attempts:
+        dashboard.activity_changed(quiz_ids)
+    return len(attempts)
+
+
+# Raised for rows the database will refuse however often they are retried
+REJECTED_ROW_ERRORS = (ValueError, TypeError, ValidationError, IntegrityError, DataError)
+
+
+def insert_lines(batch, quarantined):
+    """
+    insert_attempts() for (line, attempt) pairs. If the batch is refused it is
+    retried row by row, and the lines of the rows refused again are added to
+    `quarantined`.
+    """
+    try:
+        with transaction.atomic():
+            return insert_attempts([attempt for _, attempt in batch])
+    except REJECTED_ROW_ERRORS:
+        pass
+    written = 0
+    for line, attempt in batch:
+        try:
+            with transaction.atomic():
+                written += insert_attempts([attempt])
+        except REJECTED_ROW_ERRORS as exc:
+            logger.warning('Quarantining journaled attempt %s: %s', attempt.pk, exc)
+            quarantined.append(line)
+    return written
+
+
+def quarantine_path(path):
+    return path.with_suffix('.quarantine')
+
+
+def replay_segment(path):
+    """Insert a journal segment's attempts in batches, quarantining bad lines"""
+    batch_size = get_setting('BATCH_SIZE')
+    written = 0
+    batch = []
+    quarantined = []
+    with open(path, encoding='utf-8') as segment:
+        for line in segment:
+            try:
+                batch.append((line, attempt_from_entry(json.loads(line))))
+            except (ValueError, KeyError, TypeError) as exc:
+                # Including a torn final line from a crash mid-write
+                logger.warning('Quarantining unreadable line in %s: %s', path, exc)
+                quarantined.append(line)
+                continue
+            if len(batch) >= batch_size:
+                written += insert_lines(batch, quarantined)
+                batch = []
+    if batch:
+        written += insert_lines(batch, quarantined)
+    if quarantined:
+        with open(quarantine_path(path), 'a', encoding='utf-8') as quarantine:
+            quarantine.writelines(line if line.endswith('\n') else line + '\n' for line in quarantined)
+    return written
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal():
+    directory = str(get_setting('JOURNAL_DIR') or Path(settings.BASE_DIR) / 'journal')
+    with _journals_lock:
+        if directory not in _journals:
+            _journals[directory] = Journal(directory)
+        return _journals[directory]
+
+
+def flush_journals():
+    """Flush the journals whose flusher ran in this process, on the way out"""
+    with _journals_lock:
+        journals = [journal for journal in _journals.values() if journal.thread is not None]
+    for journal in journals:
+        journal.flush()
+
+
+atexit.register(flush_journals)
+
+
+def record(student_id, quiz_id, answers, score, time_taken):
+    """Persist a graded attempt, directly or through the journal"""
+    now = timezone.now()
+    if not get_setting('WRITE_BEHIND'):
+        return QuizAttempt.objects.create(
+            student_id=student_id, quiz_id=quiz_id, answers=answers, score=score,
+            time_taken=time_taken, started_at=now, completed_at=now)
+
+    attempt_id = uuid.uuid4()
+    get_journal().append({
+        'id': str(attempt_id),
+        'student_id': str(student_id),
+        'quiz_id': str(quiz_id),
+        'answers': answers,
+        'score': score,
+        'time_taken': time_taken,
+        'started_at': now.isoformat(),
+    })
+    return None
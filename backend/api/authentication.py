@@ -0,0 +1,215 @@
+"""
+JWT authentication without a user lookup per request.
+
+Access tokens carry the user's id, email, role and `token_version`, so
+`ClaimsJWTAuthentication` answers `request.user.pk`, `.role` and
+`.is_authenticated` from the token alone. Any other attribute, or using the
+user as a model instance (assigning it to a foreign key, comparing it),
+loads the full row through a short-lived in-process cache keyed by id and
+token version.
+
+Changing a user's role or deactivating them bumps `token_version` (see
+`User.save`). Tokens minted with an older version are rejected. When
+CACHE_SHARED is set, the current version of each user is kept in the Django
+cache, where every worker sees the change straight away. Otherwise each
+process keeps versions for LOCAL_VERSION_TIMEOUT seconds: a change saved in
+the process applies at once, and one saved by another worker within that
+many seconds. Reading a version loads the whole row, so a view that then
+needs the full user makes no second query.
+"""
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .models import User
+
+DEFAULTS = {
+    # Seconds a loaded user row is reused for
+    'TIMEOUT': 30,
+    'MAX_ENTRIES': 1024,
+    # Seconds a user's token version and active flag are cached for
+    'VERSION_TIMEOUT': 300,
+    # The same when the cache is per process, bounding how long another
+    # worker's revocation takes to apply here
+    'LOCAL_VERSION_TIMEOUT': 5,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'AUTH_USER_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def version_key(user_id):
+    return f'auth:version:{user_id}'
+
+
+def load_version(user_id):
+    """Read a user's version from the table, keeping the row for views that need it"""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return None
+    user_cache.put(user)
+    return (user.token_version, user.is_active)
+
+
+def get_version(user_id):
+    """(token_version, is_active) of a user, or None if they do not exist"""
+    if not getattr(settings, 'CACHE_SHARED', False):
+        state = local_versions.get(user_id)
+        if state is None:
+            state = load_version(user_id)
+            if state is None:
+                return None
+            local_versions.set(user_id, state)
+        return state
+    key = version_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = load_version(user_id)
+        if state is None:
+            return None
+        cache.set(key, state, timeout=get_setting('VERSION_TIMEOUT'))
+    return tuple(state)
+
+
+def set_version(user_id, token_version, is_active):
+    cache.set(version_key(user_id), (token_version, is_active), timeout=get_setting('VERSION_TIMEOUT'))
+    local_versions.set(user_id, (token_version, is_active))
+
+
+def forget_version(user_id):
+    cache.delete(version_key(user_id))
+    local_versions.forget(user_id)
+
+
+class VersionCache:
+    """Per-process token versions, for when the Django cache is not shared"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(str(user_id))
+            # Aged against the current timeout, so lowering it applies at once
+            if entry is None or entry[0] + get_setting('LOCAL_VERSION_TIMEOUT') <= time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, user_id, state):
+        with self.lock:
+            self.entries[str(user_id)] = (time.monotonic(), tuple(state))
+            self.entries.move_to_end(str(user_id))
+            while len(self.entries) > get_setting('MAX_ENTRIES'):
+                self.entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self.lock:
+            self.entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_versions = VersionCache()
+
+
+class UserCache:
+    """A small LRU of full user rows keyed by (id, token version)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id, token_version):
+        key = (str(user_id), token_version)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                # Requests may modify and save their user; never share the instance
+                return copy.copy(entry[1])
+
+        user = User.objects.filter(pk=user_id, token_version=token_version).first()
+        if user is None:
+            return None
+        self.put(user)
+        return copy.copy(user)
+
+    def put(self, user):
+        key = (str(user.pk), user.token_version)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + get_setting('TIMEOUT'), user)
+            self.entries.move_to_end(key)
+            while len(self.entries) > get_setting('MAX_ENTRIES'):
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    An authenticated user answered from token claims. Attributes other than
+    the claims, and model behaviour, load the full `User` on first use.
+    """
+
+    def __init__(self, user_id, email, role, token_version):
+        super().__init__(partial(ClaimsUser.load, user_id, token_version))
+        # Written to __dict__ directly: SimpleLazyObject forwards setattr
+        self.__dict__.update(
+            id=user_id, pk=user_id, email=email, role=role, token_version=token_version,
+            is_active=True, is_authenticated=True, is_anonymous=False)
+
+    @staticmethod
+    def load(user_id, token_version):
+        user = user_cache.get(user_id, token_version)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        return user
+
+    def __bool__(self):
+        # DRF's permission checks test truthiness, which would load the row
+        return True
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that builds request.user from the token's claims"""
+
+    def get_user(self, validated_token):
+        claims = (validated_token.get('user_id'), validated_token.get('role'), validated_token.get('ver'))
+        if None in claims:
+            # Minted before these claims existed
+            return super().get_user(validated_token)
+
+        user_id, role, token_version = claims
+        try:
+            user_id = uuid.UUID(str(user_id))
+        except ValueError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        state = get_version(user_id)
+        if state is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        current_version, is_active = state
+        if not is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if token_version != current_version:
+            raise InvalidToken(_('Token was issued before the account changed'))
+        return ClaimsUser(user_id, validated_token.get('email'), role, token_version)
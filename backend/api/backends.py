@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .hashing import make_password, verify_password
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend that checks passwords on the hashing pool"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            make_password(password)
+            return None
+
+        is_correct, must_update = verify_password(password, user.password)
+        if not is_correct:
+            return None
+        if must_update:
+            user.password = make_password(password)
+            user.save(update_fields=['password'])
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,516 @@
+"""
+In-process endpoint benchmarks.
+
+Each scenario issues one request through the full Django/DRF stack with the
+test client and records the SQL query count, latency and response size.
+Burst scenarios send their requests from several concurrent clients on a
+file copy of the database, and contention scenarios run a read/write mix on
+a copy under a given SQLite profile; both also report throughput. Each
+scenario is run several times and folded into one row of medians. Results
+are plain dictionaries so they can be written as JSON and compared against
+a stored baseline.
+"""
+import itertools
+import math
+import platform
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import django
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.utils import load_backend
+from django.db.models import Count, F
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import attempts, dashboard
+from .models import (
+    User,
+    Course,
+    Quiz,
+    StudentProgress
+)
+
+# `settings` are overridden while the scenario is measured. With `burst`, the
+# iterations are sent by that many concurrent clients, cycling through `data`
+# if it is a list.
+Request = namedtuple('Request', 'method url data user settings burst', defaults=(None, None))
+
+# A read/write mix run by concurrent threads directly against a copy of the
+# database opened with the given connection OPTIONS
+Contention = namedtuple('Contention', 'options writers readers')
+
+# seed_scale's default --password
+SEED_PASSWORD = 'questify-seed'
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Fixtures:
+    """Representative rows picked from a seeded database"""
+
+    def __init__(self):
+        self.teacher = User.objects.filter(role='teacher').annotate(
+            enrolled=Count('courses_taught__enrolled_students')).order_by('-enrolled').first()
+        self.student = User.objects.filter(role='student').annotate(
+            enrolled=Count('enrolled_courses')).order_by('-enrolled').first()
+        if self.teacher is None or self.student is None:
+            raise LookupError('The database has no teachers or students; run seed_scale first')
+
+        self.course = Course.objects.filter(teacher=self.teacher).annotate(
+            enrolled=Count('enrolled_students')).order_by('-enrolled').first()
+        self.progress = StudentProgress.objects.filter(
+            student=self.student, course__chapters__isnull=False).select_related('course').first()
+        self.chapter = self.progress.course.chapters.first() if self.progress else None
+        self.quiz = Quiz.objects.filter(type='final').annotate(
+            question_count=Count('questions')).order_by('-question_count').first()
+        self.answers = {
+            str(question_id): correct
+            for question_id, correct in self.quiz.questions.values_list('id', 'correct_answer')
+        } if self.quiz else {}
+        self.progress_ids = list(StudentProgress.objects.order_by('pk').values_list('pk', flat=True)[:200])
+        self.student_emails = list(User.objects.filter(role='student').order_by(
+            'email').values_list('email', flat=True)[:64])
+        self.journal_dir = tempfile.mkdtemp(prefix='questify-journal-')
+
+
+@scenario('courses-list')
+def courses_list(fx):
+    return Request('get', reverse('courses-list'), None, fx.student)
+
+
+@scenario('courses-available')
+def courses_available(fx):
+    return Request('get', reverse('courses-available'), None, fx.student)
+
+
+@scenario('courses-enrolled')
+def courses_enrolled(fx):
+    return Request('get', reverse('courses-enrolled'), None, fx.student)
+
+
+@scenario('courses-students')
+def courses_students(fx):
+    return Request(
+        'get', reverse('courses-students', kwargs={'pk': fx.course.pk}), None, fx.teacher)
+
+
+@scenario('quizzes-submit')
+def quizzes_submit(fx):
+    return Request(
+        'post', reverse('quizzes-submit', kwargs={'pk': fx.quiz.pk}),
+        {'answers': fx.answers, 'time_taken': 12}, fx.student)
+
+
+@scenario('quizzes-submit-write-behind')
+def quizzes_submit_write_behind(fx):
+    """The same submission with attempts journaled; flush cost is reported separately"""
+    return quizzes_submit(fx)._replace(settings={'QUIZ_ATTEMPTS': {
+        'WRITE_BEHIND': True, 'JOURNAL_DIR': fx.journal_dir, 'FLUSH_INTERVAL': None}})
+
+
+@scenario('quizzes-submit-burst')
+def quizzes_submit_burst(fx):
+    """
+    16 clients submitting at once, each attempt inserted on its request
+    thread. Queries run on the clients' own connections and are not counted.
+    """
+    return quizzes_submit(fx)._replace(burst=16)
+
+
+@scenario('quizzes-submit-write-behind-burst')
+def quizzes_submit_write_behind_burst(fx):
+    """The same burst with attempts journaled and flushed afterwards"""
+    return quizzes_submit_write_behind(fx)._replace(burst=16)
+
+
+@scenario('progress-complete-chapter')
+def progress_complete_chapter(fx):
+    return Request(
+        'post', reverse('progress-complete-chapter', kwargs={'pk': fx.progress.pk}),
+        {'chapter_id': str(fx.chapter.pk), 'score': 90}, fx.student)
+
+
+@scenario('teacher_dashboard')
+def teacher_dashboard(fx):
+    return Request('get', reverse('teacher_dashboard'), None, fx.teacher)
+
+
+@scenario('teacher_dashboard-refresh')
+def teacher_dashboard_refresh(fx):
+    """A forced snapshot rebuild with its sections evaluated one after another"""
+    return Request(
+        'get', reverse('teacher_dashboard') + '?refresh=true', None, fx.teacher, {'ANALYTICS_WORKERS': 0})
+
+
+@scenario('teacher_dashboard-refresh-concurrent')
+def teacher_dashboard_refresh_concurrent(fx):
+    """
+    The same rebuild with sections on the analytics pool. Their queries run on
+    the workers' connections, so `queries` only counts the request thread's.
+    """
+    return teacher_dashboard_refresh(fx)._replace(settings={'ANALYTICS_WORKERS': 4})
+
+
+@scenario('course_analytics')
+def course_analytics(fx):
+    return Request(
+        'get', reverse('course_analytics', kwargs={'course_id': fx.course.pk}), None, fx.teacher,
+        {'ANALYTICS_WORKERS': 0})
+
+
+@scenario('course_analytics-concurrent')
+def course_analytics_concurrent(fx):
+    """Course analytics with sections on the analytics pool; `queries` undercounts as above"""
+    return course_analytics(fx)._replace(settings={'ANALYTICS_WORKERS': 4})
+
+
+@scenario('login')
+def login(fx):
+    return Request('post', reverse('login'), {'email': fx.student.email, 'password': SEED_PASSWORD}, None)
+
+
+@scenario('login-burst')
+def login_burst(fx):
+    """
+    16 clients signing in different students at once, hashing on the pool.
+    The queue holds the whole burst, so this measures throughput rather than
+    shedding. Queries run on the clients' own connections and are not counted.
+    """
+    return Request(
+        'post', reverse('login'),
+        [{'email': email, 'password': SEED_PASSWORD} for email in fx.student_emails], None,
+        {'PASSWORD_HASHING': {**settings.PASSWORD_HASHING, 'MAX_QUEUE': 16}}, burst=16)
+
+
+@scenario('login-burst-unpooled')
+def login_burst_unpooled(fx):
+    """The same burst hashing on the request threads"""
+    return login_burst(fx)._replace(settings={'PASSWORD_HASHING': {'WORKERS': 0}})
+
+
+@scenario('sqlite-contention-basic')
+def sqlite_contention_basic(fx):
+    """Django's SQLite defaults: rollback journal and deferred transactions"""
+    return Contention({}, writers=4, readers=4)
+
+
+@scenario('sqlite-contention-production')
+def sqlite_contention_production(fx):
+    """The production profile: WAL, the tuned pragmas and BEGIN IMMEDIATE"""
+    return Contention(settings.SQLITE_PRODUCTION_OPTIONS, writers=4, readers=4)
+
+
+def measure(request, iterations, warmup=2, fixtures=None):
+    if isinstance(request, Contention):
+        return measure_contention(request, iterations, fixtures)
+    # No background dashboard refreshes during the measurements; drain()
+    # times the refresh of the sections they flagged instead
+    settings_override = {'DASHBOARD_SNAPSHOTS': {'REFRESH_INTERVAL': None}, **(request.settings or {})}
+    with override_settings(**settings_override):
+        if request.burst:
+            return measure_burst(request, iterations)
+        return measure_request(request, iterations, warmup)
+
+
+def measure_request(request, iterations, warmup):
+    client = APIClient(raise_request_exception=False)
+    client.force_authenticate(user=request.user)
+    send = getattr(client, request.method)
+
+    for _ in range(warmup):
+        send(request.url, request.data, format='json')
+
+    latencies = []
+    queries = []
+    response = None
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = send(request.url, request.data, format='json')
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+
+    result = {
+        'status': response.status_code,  # type: ignore
+        'queries': max(queries),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'bytes': len(response.content),  # type: ignore
+    }
+    return drain(result)
+
+
+def drain(result):
+    """Finish the work deferred past the responses, reporting its cost in `result`"""
+    if attempts.get_setting('WRITE_BEHIND'):
+        # Drain the journal and report the per-attempt cost of the batched insert
+        started = time.perf_counter()
+        flushed = attempts.get_journal().flush()
+        if flushed:
+            result['flush_ms_per_attempt'] = round(
+                (time.perf_counter() - started) * 1000 / flushed, 3)
+    started = time.perf_counter()
+    if dashboard.refresh_pending():
+        result['dashboard_refresh_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+
+def copy_database(workdir, options):
+    """Copy the database into a file in `workdir`; returns settings for connecting to the copy"""
+    path = f'{workdir}/db.sqlite3'
+    connection.ensure_connection()
+    with sqlite3.connect(path) as target:
+        connection.connection.backup(target)
+    target.close()
+    return {**connection.settings_dict, 'NAME': path, 'OPTIONS': options}
+
+
+def measure_burst(request, iterations):
+    """
+    The test database lives in shared-cache memory, where a writer that finds
+    the database busy fails with "database table is locked" at once instead
+    of waiting. Clients then use a file copy opened with the configured
+    OPTIONS, as the server would, so concurrent writes queue for the lock.
+    """
+    workdir = settings_dict = None
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        workdir = tempfile.mkdtemp(prefix='questify-burst-')
+        settings_dict = copy_database(workdir, connection.settings_dict.get('OPTIONS', {}))
+    try:
+        return run_burst(request, iterations, settings_dict)
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_burst(request, iterations, settings_dict):
+    payloads = request.data if isinstance(request.data, list) else [request.data]
+    numbers = itertools.count()
+    start = threading.Barrier(request.burst + 1)
+    lock = threading.Lock()
+    latencies, statuses, sizes = [], [], []
+
+    def send_requests():
+        if settings_dict is not None:
+            connections[DEFAULT_DB_ALIAS] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(
+                settings_dict, DEFAULT_DB_ALIAS)
+        client = APIClient(raise_request_exception=False)
+        if request.user is not None:
+            client.force_authenticate(user=request.user)
+        send = getattr(client, request.method)
+        start.wait()
+        try:
+            while (number := next(numbers)) < iterations:
+                started = time.perf_counter()
+                response = send(request.url, payloads[number % len(payloads)], format='json')
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    statuses.append(response.status_code)
+                    sizes.append(len(response.content))
+        finally:
+            connection.close()
+
+    clients = [threading.Thread(target=send_requests) for _ in range(request.burst)]
+    for client in clients:
+        client.start()
+    start.wait()
+    started = time.perf_counter()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+
+    errors = sum(status >= 400 for status in statuses)
+    return drain({
+        # The worst status seen, so throttled or shed requests show up
+        'status': max(statuses),
+        'queries': 0,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'bytes': max(sizes),
+        # Failures return quickly, so they would pass for throughput
+        'requests_per_sec': round((len(statuses) - errors) / elapsed, 2),
+        'errors': errors,
+    })
+
+
+def measure_contention(workload, iterations, fx):
+    """
+    Each writer runs `iterations` transactions that read a progress row and
+    then update it, as completing a chapter does, while each reader runs the
+    same number of grouped counts. Writes that fail with "database is
+    locked" are counted rather than retried.
+    """
+    if connection.vendor != 'sqlite':
+        raise NotImplementedError('Contention scenarios compare SQLite profiles')
+    workdir = tempfile.mkdtemp(prefix='questify-contention-')
+    settings_dict = copy_database(workdir, workload.options)
+
+    alias = 'contention'
+    start = threading.Barrier(workload.writers + workload.readers + 1)
+    lock = threading.Lock()
+    write_latencies = []
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+
+    def write():
+        progress = StudentProgress.objects.using(alias)
+        for number in range(iterations):
+            pk = fx.progress_ids[(threading.get_ident() + number) % len(fx.progress_ids)]
+            started = time.perf_counter()
+            try:
+                with transaction.atomic(using=alias):
+                    progress.filter(pk=pk).values_list('total_time_spent', flat=True).first()
+                    progress.filter(pk=pk).update(total_time_spent=F('total_time_spent') + 1)
+                outcome = 'writes'
+            except OperationalError:
+                outcome = 'locked'
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                counts[outcome] += 1
+                write_latencies.append(elapsed)
+
+    def read():
+        for _ in range(iterations):
+            list(StudentProgress.objects.using(alias).values('course').annotate(students=Count('pk')))
+            with lock:
+                counts['reads'] += 1
+
+    def worker(task):
+        # A per-thread connection that is not in DATABASES
+        connections[alias] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+        start.wait()
+        try:
+            task()
+        finally:
+            connections[alias].close()
+            del connections[alias]
+
+    threads = [threading.Thread(target=worker, args=(write,)) for _ in range(workload.writers)]
+    threads += [threading.Thread(target=worker, args=(read,)) for _ in range(workload.readers)]
+    try:
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'status': 200 if not counts['locked'] else 500,
+        'queries': 0,
+        # Latencies are of write transactions, failed ones included
+        'p50_ms': round(percentile(write_latencies, 50), 3),
+        'p95_ms': round(percentile(write_latencies, 95), 3),
+        'p99_ms': round(percentile(write_latencies, 99), 3),
+        'bytes': 0,
+        'requests_per_sec': round((counts['reads'] + counts['writes']) / elapsed, 2),
+        'reads_per_sec': round(counts['reads'] / elapsed, 2),
+        'writes_per_sec': round(counts['writes'] / elapsed, 2),
+        'locked_errors': counts['locked'],
+    }
+
+
+# Fields where the worst run is kept; every other field is a timing or rate
+WORST_OF = ('status', 'queries', 'bytes', 'errors', 'locked_errors')
+
+
+def combine(samples):
+    """
+    Fold repeated runs of a scenario into one row: the worst status, query
+    count and size, and the median of every timing and rate.
+    """
+    row = {}
+    for sample in samples:
+        for key in sample:
+            if key in row:
+                continue
+            values = [other[key] for other in samples if key in other]
+            row[key] = max(values) if key in WORST_OF else round(statistics.median(values), 3)
+    return row
+
+
+def run(names=None, iterations=30, scale=None, repeats=3):
+    fixtures = Fixtures()
+    results = {}
+    try:
+        for name in names or SCENARIOS:
+            results[name] = combine([
+                measure(SCENARIOS[name](fixtures), iterations, fixtures=fixtures)
+                for _ in range(repeats)
+            ])
+    finally:
+        shutil.rmtree(fixtures.journal_dir, ignore_errors=True)
+    return {
+        'meta': {
+            'scale': scale,
+            'iterations': iterations,
+            'repeats': repeats,
+            'created_at': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'rows': {
+                'courses': Course.objects.count(),
+                'students': User.objects.filter(role='student').count(),
+                'progress': StudentProgress.objects.count(),
+            },
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, max_latency_regression=0.5, latency_floor_ms=2.0,
+            max_query_increase=0, max_bytes_regression=0.10):
+    """
+    Compare results against a baseline and return a list of regressions.
+
+    Latency is compared on the median p95 of the repeated runs and only
+    counts once it is both relatively and absolutely worse, which keeps
+    sub-millisecond noise out of the way. Burst and contention timings
+    depend on thread scheduling more than on the code, so those scenarios
+    are not latency gated; their throughput is reported instead.
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        if result['status'] != before['status'] and result['status'] >= 400:
+            regressions.append(f"{name}: status {before['status']} -> {result['status']}")
+        if result['queries'] > before['queries'] + max_query_increase:
+            regressions.append(f"{name}: queries {before['queries']} -> {result['queries']}")
+        slower = result['p95_ms'] - before['p95_ms']
+        concurrent = 'requests_per_sec' in result
+        if not concurrent and slower > latency_floor_ms and slower > before['p95_ms'] * max_latency_regression:
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']:.1f}ms -> {result['p95_ms']:.1f}ms")
+        if result['bytes'] > before['bytes'] * (1 + max_bytes_regression):
+            regressions.append(f"{name}: bytes {before['bytes']} -> {result['bytes']}")
+    return regressions
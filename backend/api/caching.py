@@ -0,0 +1,121 @@
+"""
+Cache of serialized course summaries and course detail trees.
+
+Every course has a version token stored in the cache. Cached representations
+are keyed by that token, so invalidating a course is a single write that
+orphans every representation built before it; orphaned entries simply
+expire. Tokens are random rather than counters so an evicted token can never
+resurrect an older representation.
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'catalog'
+# Bump when the serialized shape changes so old entries are not served
+SCHEMA_VERSION = 1
+
+_counters_lock = threading.Lock()
+_counters = {
+    'summary': {'hits': 0, 'misses': 0},
+    'detail': {'hits': 0, 'misses': 0},
+    'invalidations': 0,
+}
+
+
+def timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def _count(kind, hits, misses):
+    with _counters_lock:
+        _counters[kind]['hits'] += hits
+        _counters[kind]['misses'] += misses
+
+
+def _version_key(object_id, namespace='course'):
+    return f'{KEY_PREFIX}:version:{namespace}:{object_id}'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def get_versions(object_ids, namespace='course'):
+    """Current version tokens, creating them for objects seen for the first time"""
+    keys = {_version_key(object_id, namespace): object_id for object_id in object_ids}
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def invalidate(object_id, namespace='course'):
+    """
+    Orphan every cached entry keyed by the object's version. The version is
+    bumped again once the transaction commits, so a concurrent reader that
+    rebuilt an entry from the uncommitted state cannot leave it behind.
+    """
+    def bump():
+        cache.set(_version_key(object_id, namespace), _new_version(), timeout=None)
+        with _counters_lock:
+            _counters['invalidations'] += 1
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def invalidate_course(course_id):
+    invalidate(course_id)
+
+
+def get_summaries(course_ids, build, variant=''):
+    """
+    Return serialized summaries for the courses, in order. `build` receives
+    the ids that were not cached and returns a {course_id: data} mapping.
+    """
+    versions = get_versions(course_ids)
+    keys = {
+        course_id: f'{KEY_PREFIX}:summary:{SCHEMA_VERSION}:{variant}:{course_id}:{versions[course_id]}'
+        for course_id in course_ids
+    }
+    cached = cache.get_many(keys.values())
+    found = {course_id: cached[key] for course_id, key in keys.items() if key in cached}
+    missing = [course_id for course_id in course_ids if course_id not in found]
+    _count('summary', len(found), len(missing))
+
+    if missing:
+        built = build(missing)
+        cache.set_many({keys[course_id]: dict(data) for course_id, data in built.items()},
+                       timeout=timeout())
+        found.update(built)
+    return [found[course_id] for course_id in course_ids if course_id in found]
+
+
+def get_detail(course_id, build, variant=''):
+    """Return the serialized course tree, calling `build()` on a miss"""
+    version = get_versions([course_id])[course_id]
+    key = f'{KEY_PREFIX}:detail:{SCHEMA_VERSION}:{variant}:{course_id}:{version}'
+    data = cache.get(key)
+    _count('detail', int(data is not None), int(data is None))
+    if data is None:
+        data = dict(build())
+        cache.set(key, data, timeout=timeout())
+    return data
+
+
+def stats():
+    with _counters_lock:
+        snapshot = {
+            kind: dict(values) if isinstance(values, dict) else values
+            for kind, values in _counters.items()
+        }
+    for kind in ('summary', 'detail'):
+        lookups = snapshot[kind]['hits'] + snapshot[kind]['misses']
+        snapshot[kind]['hit_rate'] = round(snapshot[kind]['hits'] / lookups, 4) if lookups else None
+    return snapshot
@@ -0,0 +1,64 @@
+"""
+Concurrent evaluation of independent read-only view sections.
+
+Analytics and dashboard views are built from several aggregate queries that
+do not depend on each other. `run_sections()` evaluates them on a small
+process-wide thread pool, each on its worker's own database connection, so
+their latencies overlap instead of adding up. This works the same under
+WSGI and ASGI, where DRF views still run synchronously. The pool size is
+`ANALYTICS_WORKERS`, which also bounds the extra connections it opens.
+Inside a transaction the sections run in the calling thread, because other
+connections cannot see its uncommitted rows. Queries on the workers count
+towards the calling request's profile.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from . import profiling
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_workers():
+    return getattr(settings, 'ANALYTICS_WORKERS', 4)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_workers(), thread_name_prefix='analytics')
+        return _executor
+
+
+def call(section, tz):
+    # Workers outlive requests, so manage their connections as a request would
+    close_old_connections()
+    try:
+        # The copied context carries the request's profile, if it is sampled
+        with timezone.override(tz), profiling.profiled_connections():
+            return section()
+    finally:
+        close_old_connections()
+
+
+def run_sections(sections):
+    """Evaluate a dict of zero-argument callables and return their results by name"""
+    if get_workers() < 2 or len(sections) < 2 or connection.in_atomic_block:
+        return {name: section() for name, section in sections.items()}
+
+    executor = get_executor()
+    tz = timezone.get_current_timezone()
+    # Each section gets a copy of the request's context, database routing included
+    futures = {
+        name: executor.submit(contextvars.copy_context().run, call, section, tz)
+        for name, section in sections.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,168 @@
+"""
+Conditional GET for read-mostly resources.
+
+Validators are derived from the database rather than the serialized body:
+the rows' newest `updated_at`, the newest `updated_at` and row count of each
+nested child relation, and the newest timestamp of any joined row the
+representation shows. A retrieve reads them with a single aggregate query.
+A paginated list annotates them onto the page query itself, so its cost
+stays per page and it needs no extra query. Counts make deletions change the
+ETag; the delete receivers in `signals` also touch the parent so
+`Last-Modified` moves forward too. Nothing is serialized to compute them.
+"""
+import hashlib
+from datetime import datetime
+
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+class NotModified(Exception):
+    """Raised from `initial()` to answer with the prepared 304/412 response"""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+def child_subquery(model, path, aggregate):
+    rows = model.objects.filter(**{path: OuterRef('pk')}).order_by().values(path)
+    return Subquery(rows.annotate(value=aggregate).values('value'))
+
+
+def compute_validators(queryset, fields=(), children=()):
+    """
+    Return (etag source, last modified) for a queryset, or None when it is
+    empty. `fields` are timestamp lookups on joined rows and `children` are
+    (model, lookup back to this row) pairs for nested relations.
+    """
+    annotations = {}
+    aggregates = {'rows': Count('pk'), 'latest': Max('updated_at')}
+    for index, field in enumerate(fields):
+        aggregates[f'field{index}'] = Max(field)
+    for index, (model, path) in enumerate(children):
+        annotations[f'child{index}_latest'] = child_subquery(model, path, Max('updated_at'))
+        annotations[f'child{index}_count'] = child_subquery(model, path, Count('pk'))
+        aggregates[f'child{index}_latest_max'] = Max(f'child{index}_latest')
+        aggregates[f'child{index}_count_sum'] = Sum(f'child{index}_count')
+
+    values = queryset.order_by().annotate(**annotations).aggregate(**aggregates)
+    if not values['rows']:
+        return None
+    timestamps = [value for name, value in values.items()
+                  if value is not None and ('latest' in name or name.startswith('field'))]
+    return values, max(timestamps)
+
+
+def row_annotations(fields=(), children=()):
+    """
+    The values `compute_validators` aggregates, per row. `fields` must be
+    single-valued here, or rows would repeat.
+    """
+    annotations = {'validator_latest': F('updated_at')}
+    for index, field in enumerate(fields):
+        annotations[f'validator_field{index}'] = F(field)
+    for index, (model, path) in enumerate(children):
+        annotations[f'validator_child{index}_latest'] = child_subquery(model, path, Max('updated_at'))
+        annotations[f'validator_child{index}_count'] = child_subquery(model, path, Count('pk'))
+    return annotations
+
+
+def page_validators(rows, names):
+    """
+    Return (etag source, last modified) for a page of rows annotated with
+    `row_annotations`, or None when it is empty. The ids are part of the
+    source, so rows moving in or out of the page change the ETag.
+    """
+    values = [(str(row.pk), *(getattr(row, name) for name in names)) for row in rows]
+    timestamps = [value for row in values for value in row[1:] if isinstance(value, datetime)]
+    if not timestamps:
+        return None
+    return values, max(timestamps)
+
+
+class ConditionalGetMixin:
+    """
+    Send strong `ETag` and `Last-Modified` headers on list and retrieve, and
+    answer requests whose validators still match with 304 before the handler
+    runs. Views describe what their representation is built from with
+    `validator_fields` and `validator_children`.
+    """
+    conditional_actions = ('list', 'retrieve')
+    validator_fields = ()
+    validator_children = ()
+
+    def get_validator_fields(self):
+        return self.validator_fields
+
+    def get_validator_children(self):
+        return self.validator_children
+
+    def get_validator_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return queryset
+
+    def get_validator_variant(self):
+        """Everything besides the rows that changes the representation"""
+        request = self.request
+        return (request.get_full_path(), request.accepted_renderer.format,
+                str(request.user.pk) if self.action == 'list' else '')
+
+    def validates_page(self):
+        """Whether this request's validators come from its page rather than a query of their own"""
+        return self.action == 'list' and self.paginator is not None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.validators = None
+        if (request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions
+                or self.validates_page()):
+            return
+        computed = compute_validators(
+            self.get_validator_queryset(),
+            self.get_validator_fields(), self.get_validator_children())
+        if computed is not None:
+            values, last_modified = computed
+            self.check_validators(sorted(values.items()), last_modified)
+
+    def paginate_queryset(self, queryset):
+        if self.request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return super().paginate_queryset(queryset)
+        annotations = row_annotations(self.get_validator_fields(), self.get_validator_children())
+        page = super().paginate_queryset(queryset.annotate(**annotations))
+        computed = page_validators(page or [], annotations)
+        if computed is not None:
+            self.check_validators(*computed)
+        return page
+
+    def check_validators(self, values, last_modified):
+        """Set the response's validators, raising NotModified if the request's still match"""
+        source = repr((self.get_validator_variant(), values)).encode()
+        etag = '"%s"' % hashlib.sha1(source).hexdigest()
+        last_modified = int(last_modified.timestamp())
+        self.validators = (etag, last_modified)
+
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, 'validators', None)
+        if validators and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            # Revalidate every time rather than letting browsers apply
+            # heuristic freshness to Last-Modified
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
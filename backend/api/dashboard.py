@@ -0,0 +1,301 @@
+"""
+Materialized teacher dashboards.
+
+Each teacher's dashboard is stored as a `TeacherDashboardSnapshot` built
+from four sections: per-course performance rows, enrollments (distinct
+students and the latest enrollments), recent quiz activity and weekly
+activity trends. The overall statistics are derived from the course rows
+without a query. Trends are recounted when a new week begins.
+
+Writes never rebuild snapshots themselves. Once a write commits, the
+receivers in `signals` flag the sections it affects on the owning teachers'
+snapshots with one UPDATE, so every process sees the flag. A background
+thread in each process then recomputes only the flagged sections every
+REFRESH_INTERVAL seconds, so a burst of quiz submissions costs one activity
+query per teacher rather than one rebuild per attempt. Flags left by a
+process that died are picked up by any other process's thread or by
+`refresh_dashboards --stale`, and writes that skip model signals (bulk
+inserts) by a full `refresh_dashboards`.
+"""
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import concurrency, timeseries
+from .models import Course, CourseStats, QuizAttempt, StudentProgress, TeacherDashboardSnapshot
+from .serializers import StudentProgressSerializer
+
+logger = logging.getLogger(__name__)
+
+RECENT_ROWS = 5
+
+DEFAULTS = {
+    # Seconds between background refreshes of flagged sections; None
+    # disables the thread and leaves them to `refresh_dashboards --stale`
+    'REFRESH_INTERVAL': 5.0,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'DASHBOARD_SNAPSHOTS', {}).get(name, DEFAULTS[name])
+
+
+def normalize(data):
+    """Round-trip through the renderer's encoder so stored and fresh data look alike"""
+    return json.loads(json.dumps(data, cls=JSONEncoder))
+
+
+def course_rows(teacher_id, course_ids=None):
+    """
+    Performance rows for the teacher's courses from one joined query.
+    Courses without a stats row are computed together with grouped
+    queries rather than rebuilt one by one.
+    """
+    courses = Course.objects.filter(teacher_id=teacher_id)
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+    rows = courses.order_by('created_at').values(
+        'id', 'title', 'stats__course', *(f'stats__{name}' for name in CourseStats.COUNTERS))
+    counters = {}
+    missing = []
+    for row in rows:
+        counters[row['id']] = {
+            'title': row['title'],
+            **{name: row[f'stats__{name}'] for name in CourseStats.COUNTERS},
+        }
+        if row['stats__course'] is None:
+            missing.append(row['id'])
+    if missing:
+        for course_id, values in CourseStats.compute(missing).items():
+            counters[course_id].update(values)
+    return normalize([
+        {
+            'course_id': course_id,
+            'course_title': values['title'],
+            'enrollment_count': values['enrollment_count'],
+            'completion_rate': values['completion_count'] / max(values['progress_count'], 1) * 100,
+            'average_rating': values['rating_sum'] / values['rating_count'] if values['rating_count'] else 0.0,
+            # Kept so the overall statistics can be summed without a query
+            'counters': {name: values[name] for name in CourseStats.COUNTERS},
+        }
+        for course_id, values in counters.items()
+    ])
+
+
+def enrollment_section(teacher_id):
+    progress = StudentProgress.objects.filter(course__teacher_id=teacher_id)
+    total_students = progress.aggregate(total=Count('student', distinct=True))['total']
+    recent_enrollments = progress.prefetch_related('chapter_results').order_by('-enrolled_at')[:RECENT_ROWS]
+    return normalize({
+        'total_students': total_students,
+        'recent_enrollments': StudentProgressSerializer(recent_enrollments, many=True).data,
+    })
+
+
+def activity_section(teacher_id):
+    recent_attempts = QuizAttempt.objects.filter(
+        quiz__course__teacher_id=teacher_id
+    ).select_related('student', 'quiz__course').only(
+        'score', 'started_at', 'student__email', 'student__first_name', 'student__last_name',
+        'quiz__title', 'quiz__course__title'
+    ).order_by('-started_at')[:RECENT_ROWS]
+    return normalize({
+        'recent_activity': [
+            {
+                'type': 'quiz_completion',
+                'student_name': attempt.student.name,
+                'course_title': attempt.quiz.course.title,
+                'quiz_title': attempt.quiz.title,
+                'score': attempt.score,
+                'timestamp': attempt.started_at
+            }
+            for attempt in recent_attempts
+        ]
+    })
+
+
+def trend_window():
+    """Bucket starts of the dashboard's trend window, as stored"""
+    return normalize(timeseries.bucket_starts()[:-1])
+
+
+def trends_current(data):
+    trends = data.get('trends')
+    return trends is not None and [row['period_start'] for row in trends['buckets']] == trend_window()
+
+
+def update_trends(teacher_id, data):
+    """Recount the trends, once a new bucket has begun"""
+    data['trends'] = normalize(timeseries.series(Course.objects.filter(teacher_id=teacher_id)))
+
+
+def summarize(data):
+    """Fill in the overall statistics from the stored sections"""
+    rows = data['course_performance']
+    totals = {
+        name: sum(row['counters'][name] for row in rows)
+        for name in CourseStats.COUNTERS
+    }
+    data['statistics'] = {
+        'total_courses': len(rows),
+        'total_students': data['total_students'],
+        'average_rating': round(totals['rating_sum'] / max(totals['rating_count'], 1), 1),
+        'completion_rate': round(totals['completion_count'] / max(totals['progress_count'], 1) * 100, 1),
+    }
+    return data
+
+
+def trends_section(teacher_id):
+    return {'trends': normalize(timeseries.series(Course.objects.filter(teacher_id=teacher_id)))}
+
+
+SECTIONS = {
+    'courses': lambda teacher_id: {'course_performance': course_rows(teacher_id)},
+    'enrollments': enrollment_section,
+    'activity': activity_section,
+    'trends': trends_section,
+}
+
+# Sections that writes can leave out of date, each with a `<name>_stale` flag
+STALE_SECTIONS = ('courses', 'enrollments', 'activity')
+
+
+def build(teacher_id, sections=SECTIONS, data=None):
+    """Compute `sections` over the stored `data`, or the whole dashboard"""
+    results = concurrency.run_sections({
+        name: lambda section=SECTIONS[name]: section(teacher_id) for name in sections
+    })
+    data = dict(data or {})
+    for values in results.values():
+        data.update(values)
+    return summarize(data)
+
+
+def rebuild(teacher_ids):
+    """Recompute and store the snapshots of the given teachers; returns them by teacher id"""
+    now = timezone.now()
+    snapshots = [
+        TeacherDashboardSnapshot(teacher_id=teacher_id, data=build(teacher_id),
+                                 refreshed_at=now, updated_at=now)
+        for teacher_id in teacher_ids
+    ]
+    TeacherDashboardSnapshot.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=['teacher'],
+        update_fields=['data', 'refreshed_at', 'updated_at', *map(stale_field, STALE_SECTIONS)])
+    return {snapshot.teacher_id: snapshot for snapshot in snapshots}  # type: ignore
+
+
+def get_snapshot(teacher, refresh=False):
+    """The teacher's snapshot, built on first use or when a refresh is forced"""
+    start()
+    if not refresh:
+        snapshot = TeacherDashboardSnapshot.objects.filter(teacher_id=teacher.pk).first()
+        if snapshot is not None:
+            if not trends_current(snapshot.data):
+                update_trends(teacher.pk, snapshot.data)
+                snapshot.save(update_fields=['data', 'updated_at'])
+            return snapshot
+    return rebuild([teacher.pk])[teacher.pk]
+
+
+# Stale sections
+
+def stale_field(section):
+    return f'{section}_stale'
+
+
+def mark(sections, courses=(), quizzes=(), teachers=()):
+    """Flag `sections` on the snapshots of the teachers owning these rows"""
+    owners = Q(teacher_id__in=teachers)
+    if courses:
+        owners |= Q(teacher__in=Course.objects.filter(pk__in=courses).values('teacher'))
+    if quizzes:
+        owners |= Q(teacher__in=Course.objects.filter(quizzes__in=quizzes).values('teacher'))
+    flags = {stale_field(section): True for section in sections}
+    # Rows already flagged are left alone rather than rewritten
+    unflagged = Q()
+    for field in flags:
+        unflagged |= Q(**{field: False})
+    TeacherDashboardSnapshot.objects.filter(owners).filter(unflagged).update(**flags)
+    start()
+
+
+def refresh(teacher_id):
+    """Recompute a snapshot's flagged sections; returns whether there were any"""
+    with transaction.atomic():
+        # The flags are read, cleared and the data written in one transaction,
+        # so a mark made meanwhile is never lost to a concurrent refresh
+        snapshot = TeacherDashboardSnapshot.objects.select_for_update().filter(teacher_id=teacher_id).first()
+        sections = [section for section in STALE_SECTIONS
+                    if snapshot is not None and getattr(snapshot, stale_field(section))]
+        if not sections:
+            return False
+        snapshot.data = build(teacher_id, sections, snapshot.data)  # type: ignore
+        for section in sections:
+            setattr(snapshot, stale_field(section), False)
+        snapshot.save(update_fields=['data', 'updated_at', *map(stale_field, sections)])  # type: ignore
+    return True
+
+
+def refresh_pending():
+    """Refresh every snapshot with a flagged section; returns how many were refreshed"""
+    stale = Q()
+    for section in STALE_SECTIONS:
+        stale |= Q(**{stale_field(section): True})
+    teacher_ids = TeacherDashboardSnapshot.objects.filter(stale).values_list('teacher_id', flat=True)
+    return sum(refresh(teacher_id) for teacher_id in list(teacher_ids))
+
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def start():
+    """Start this process's refresh thread unless REFRESH_INTERVAL is None"""
+    global _thread
+    interval = get_setting('REFRESH_INTERVAL')
+    if interval is None or (_thread is not None and _thread.is_alive()):
+        return
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=run, args=(interval,), name='dashboard-refresh', daemon=True)
+            _thread.start()
+
+
+def run(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_pending()
+        except Exception:
+            # The flags stay set and are retried on the next pass
+            logger.exception('Refreshing teacher dashboards failed')
+        finally:
+            connection.close()
+
+
+def course_changed(course_id):
+    """A course's title or counters changed; its row may also be new"""
+    transaction.on_commit(lambda: mark(['courses'], courses=[course_id]), robust=True)
+
+
+def course_removed(course_id, teacher_id):
+    transaction.on_commit(lambda: mark(STALE_SECTIONS, teachers=[teacher_id]), robust=True)
+
+
+def enrollments_changed(course_id):
+    transaction.on_commit(lambda: mark(['enrollments'], courses=[course_id]), robust=True)
+
+
+def activity_changed(quiz_ids):
+    quiz_ids = list(quiz_ids)
+    transaction.on_commit(lambda: mark(['activity'], quizzes=quiz_ids), robust=True)
@@ -0,0 +1,128 @@
+"""
+Compiled quiz answer keys.
+
+An `AnswerKey` holds a quiz's question ids, correct option indices and
+points in flat arrays, built once from the database and cached under the
+quiz's version token. Question and quiz receivers in `signals` bump the
+token, so submissions grade without reading any question rows.
+"""
+import operator
+import uuid
+from array import array
+from collections import namedtuple
+from itertools import compress
+
+from django.core.cache import cache
+
+from . import caching
+from .models import Quiz
+
+NAMESPACE = 'quiz'
+# Bump when AnswerKey's layout changes so stale pickles are never loaded
+KEY_FORMAT = 1
+
+Grade = namedtuple('Grade', 'score passed correct_answers total_questions earned_points total_points')
+
+
+class AnswerKey:
+    __slots__ = ('quiz_id', 'course_id', 'passing_score', 'positions', 'correct', 'points',
+                 'total_points')
+
+    def __init__(self, quiz_id, course_id, passing_score, questions):
+        """`questions` is an iterable of (id, correct_answer, points) rows"""
+        self.quiz_id = quiz_id
+        self.course_id = course_id
+        self.passing_score = passing_score
+        self.positions = {}
+        self.correct = array('i')
+        self.points = array('i')
+        for position, (question_id, correct_answer, points) in enumerate(questions):
+            self.positions[str(question_id)] = position
+            self.correct.append(correct_answer)
+            self.points.append(points)
+        self.total_points = sum(self.points)
+
+    def __len__(self):
+        return len(self.correct)
+
+    def responses(self, answers):
+        """Lay the submitted answers out against the key; unanswered or invalid entries are -1"""
+        responses = array('i', [-1]) * len(self)
+        for question_id, answer in answers.items():
+            position = self.positions.get(str(question_id))
+            if position is None:
+                continue
+            try:
+                responses[position] = int(answer)
+            except (TypeError, ValueError, OverflowError):
+                pass
+        return responses
+
+    def grade(self, answers):
+        hits = list(map(operator.eq, self.correct, self.responses(answers)))
+        earned_points = sum(compress(self.points, hits))
+        score = earned_points / self.total_points * 100 if self.total_points > 0 else 0
+        return Grade(
+            score=score,
+            passed=score >= self.passing_score,
+            correct_answers=sum(hits),
+            total_questions=len(self),
+            earned_points=earned_points,
+            total_points=self.total_points,
+        )
+
+
+def compile_keys(quiz_ids):
+    """Compile keys for the quizzes with a single query"""
+    rows = Quiz.objects.filter(pk__in=quiz_ids).order_by('pk', 'questions__order').values_list(
+        'pk', 'course_id', 'passing_score',
+        'questions__id', 'questions__correct_answer', 'questions__points')
+    quizzes = {}
+    for quiz_id, course_id, passing_score, *question in rows:
+        quiz = quizzes.setdefault(quiz_id, (course_id, passing_score, []))
+        if question[0] is not None:
+            quiz[2].append(question)
+    return {
+        quiz_id: AnswerKey(quiz_id, course_id, passing_score, questions)
+        for quiz_id, (course_id, passing_score, questions) in quizzes.items()
+    }
+
+
+def get_answer_keys(quiz_ids):
+    """
+    Compiled keys for the quizzes, keyed by the string form of the ids
+    passed in. Unknown or malformed ids are left out.
+    """
+    parsed = {}
+    for quiz_id in quiz_ids:
+        try:
+            parsed[str(quiz_id)] = quiz_id if isinstance(quiz_id, uuid.UUID) else uuid.UUID(quiz_id)
+        except (TypeError, ValueError, AttributeError):
+            continue
+    if not parsed:
+        return {}
+
+    versions = caching.get_versions(parsed, namespace=NAMESPACE)
+    keys = {
+        quiz_id: f'{caching.KEY_PREFIX}:answer-key:{KEY_FORMAT}:{quiz_id}:{versions[quiz_id]}'
+        for quiz_id in parsed
+    }
+    cached = cache.get_many(keys.values())
+    found = {quiz_id: cached[key] for quiz_id, key in keys.items() if key in cached}
+
+    missing = {parsed[quiz_id]: quiz_id for quiz_id in keys if quiz_id not in found}
+    if missing:
+        compiled = {missing[quiz_id]: key for quiz_id, key in compile_keys(missing).items()}
+        cache.set_many({keys[quiz_id]: key for quiz_id, key in compiled.items()},
+                       timeout=caching.timeout())
+        found.update(compiled)
+    return found
+
+
+def get_answer_key(quiz_id):
+    """The quiz's compiled key, or None if the quiz does not exist"""
+    return get_answer_keys([quiz_id]).get(str(quiz_id))
+
+
+def invalidate(quiz_id):
+    caching.invalidate(str(quiz_id), namespace=NAMESPACE)
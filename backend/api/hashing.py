@@ -0,0 +1,130 @@
+"""
+Password hashing on a bounded worker pool.
+
+PBKDF2 holds a core for a large fraction of a second. When every request
+thread hashes at once, a login burst oversubscribes the CPU and every request
+slows down together. Login (through `api.backends.PooledModelBackend`) and
+registration (through `UserManager.create_user`) hand their hashes to a pool
+of WORKERS threads instead. hashlib releases the GIL while hashing, so the
+pool runs WORKERS hashes in parallel and queues the rest. Once MAX_QUEUE are
+waiting, further requests are turned away with a 503 instead of piling up.
+`stats()` reports the queue depth and waiting time.
+
+The pool does not make logins faster: hashing is bound by the cores either
+way, and with one worker per core the login-burst benchmarks run at the same
+rate pooled and unpooled. What it buys is a cap on how many cores hashing
+takes from the other requests, and a fast 503 instead of a timeout under
+overload.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+DEFAULTS = {
+    # Hashes run at once, one per core; 0 hashes on the request thread instead
+    'WORKERS': os.cpu_count() or 2,
+    # Hashes allowed to wait for a worker before logins get a 503
+    'MAX_QUEUE': 8 * (os.cpu_count() or 2),
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'PASSWORD_HASHING', {}).get(name, DEFAULTS[name])
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins in progress, please try again shortly.'
+    default_code = 'hashing_busy'
+
+
+class HashPool:
+    """A thread pool for password hashes that counts and caps what is waiting"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.workers = 0
+        self.pending = 0
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.peak_queued = self.completed = self.rejected = 0
+            self.wait_seconds = self.hash_seconds = 0.0
+
+    def get_executor(self, workers):
+        # Rebuilt if WORKERS changes, as it does under override_settings
+        if self.executor is None or self.workers != workers:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hashing')
+            self.workers = workers
+        return self.executor
+
+    def run(self, func, *args):
+        workers = get_setting('WORKERS')
+        if workers < 1:
+            return func(*args)
+
+        with self.lock:
+            if self.pending >= workers + get_setting('MAX_QUEUE'):
+                self.rejected += 1
+                raise HashingBusy()
+            self.pending += 1
+            self.peak_queued = max(self.peak_queued, self.pending - workers)
+            executor = self.get_executor(workers)
+        return executor.submit(self.call, func, args, time.perf_counter()).result()
+
+    def call(self, func, args, queued_at):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            finished = time.perf_counter()
+            with self.lock:
+                self.pending -= 1
+                self.completed += 1
+                self.wait_seconds += started - queued_at
+                self.hash_seconds += finished - started
+
+    def stats(self):
+        with self.lock:
+            workers = get_setting('WORKERS')
+            return {
+                'workers': workers,
+                'max_queue': get_setting('MAX_QUEUE'),
+                'running': min(self.pending, workers),
+                'queued': max(0, self.pending - workers),
+                'peak_queued': self.peak_queued,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(self.wait_seconds / self.completed * 1000, 3) if self.completed else 0,
+                'avg_hash_ms': round(self.hash_seconds / self.completed * 1000, 3) if self.completed else 0,
+            }
+
+
+pool = HashPool()
+
+
+def stats():
+    return pool.stats()
+
+
+def make_password(password):
+    if password is None:
+        # An unusable password needs no hashing
+        return hashers.make_password(None)
+    return pool.run(hashers.make_password, password)
+
+
+def verify_password(password, encoded):
+    """(is_correct, must_update) for `password` against a stored hash"""
+    return pool.run(hashers.verify_password, password, encoded)
+
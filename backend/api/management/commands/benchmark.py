@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api import benchmarks
+
+BENCHMARK_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot API endpoints against a seeded database and compare with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=['small', 'medium', 'large'], default='small')
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--repeats', type=int, default=3,
+                            help='Runs per scenario; timings are the median across runs')
+        parser.add_argument('--scenario', action='append', choices=sorted(benchmarks.SCENARIOS),
+                            help='Only run the given scenario; repeatable')
+        parser.add_argument('--use-existing', action='store_true',
+                            help='Benchmark the configured database instead of a freshly seeded one')
+        parser.add_argument('--output', help='Where to write results (default benchmarks/results-<scale>.json)')
+        parser.add_argument('--baseline', help='Baseline to compare with (default benchmarks/baseline-<scale>.json)')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Store these results as the new baseline')
+        parser.add_argument('--max-latency-regression', type=float, default=0.5,
+                            help='Allowed relative p95 slowdown; burst and contention scenarios are not gated')
+        parser.add_argument('--latency-floor-ms', type=float, default=2.0,
+                            help='Ignore p95 slowdowns smaller than this')
+        parser.add_argument('--max-query-increase', type=int, default=0)
+        parser.add_argument('--max-bytes-regression', type=float, default=0.10)
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        output = Path(options['output'] or BENCHMARK_DIR / f'results-{scale}.json')
+        baseline_path = Path(options['baseline'] or BENCHMARK_DIR / f'baseline-{scale}.json')
+
+        setup_test_environment()
+        test_db = None
+        try:
+            if not options['use_existing']:
+                test_db = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                self.stdout.write(f'Seeding a {scale} dataset...')
+                call_command('seed_scale', scale=scale, stdout=self.stdout)
+            results = benchmarks.run(options['scenario'], options['iterations'], scale, options['repeats'])
+        finally:
+            if test_db:
+                connection.creation.destroy_test_db(test_db, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2) + '\n')
+        self.stdout.write(f'Wrote {output}')
+
+        if options['save_baseline']:
+            baseline_path.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}; skipping comparison'))
+            return
+
+        regressions = benchmarks.compare(
+            results, json.loads(baseline_path.read_text()),
+            max_latency_regression=options['max_latency_regression'],
+            latency_floor_ms=options['latency_floor_ms'],
+            max_query_increase=options['max_query_increase'],
+            max_bytes_regression=options['max_bytes_regression'])
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(f'REGRESSION {regression}')
+            raise CommandError(f'{len(regressions)} performance regressions against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}'))
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'endpoint':<38}{'status':>7}{'queries':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'bytes':>10}{'req/s':>10}")
+        for name, row in results['results'].items():
+            # Throughput is only measured for burst scenarios
+            throughput = f"{row['requests_per_sec']:>10.2f}" if 'requests_per_sec' in row else ''
+            self.stdout.write(
+                f"{name:<38}{row['status']:>7}{row['queries']:>9}{row['p50_ms']:>10.2f}"
+                f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['bytes']:>10}{throughput}")
@@ -0,0 +1,38 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from api import exports
+from api.models import Course
+
+
+class Command(BaseCommand):
+    help = "Write a course's student performance as CSV or JSON lines without loading it into memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', help='Course to export')
+        parser.add_argument(
+            '--format', dest='export_format', choices=sorted(exports.FORMATS), default='csv',
+            help='Output format (default csv)')
+        parser.add_argument('--output', '-o', help='File to write (default stdout)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=exports.CHUNK_SIZE,
+            help='Rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(pk=options['course_id'])
+        except (Course.DoesNotExist, ValidationError):
+            raise CommandError(f'Course {options["course_id"]} not found')
+
+        lines = exports.lines(course, options['export_format'], options['chunk_size'])
+        written = 0
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for line in lines:
+                    output.write(line)
+                    written += 1
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+                written += 1
+        self.stderr.write(f'Wrote {written} lines for {course.title}')
@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import profiling
+
+
+class Command(BaseCommand):
+    help = 'Print request timings merged from every process that dumped profiling histograms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Dump directory (default PROFILING["DUMP_DIR"])')
+        parser.add_argument('--max-age', type=int,
+                            help='Ignore dumps older than this many seconds (default: the window)')
+        parser.add_argument('--json', action='store_true', help='Print machine-readable JSON')
+        parser.add_argument('--sort', default='p95_ms',
+                            help='Summary column to sort by, descending')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or profiling.get_setting('DUMP_DIR')
+        if not directory:
+            raise CommandError('No dump directory configured; set PROFILING["DUMP_DIR"] or pass --dir')
+        max_age = options['max_age'] or profiling.get_setting('WINDOW_SECONDS')
+        routes = profiling.report(profiling.load_dumps(directory, max_age=max_age))
+
+        if options['json']:
+            self.stdout.write(json.dumps(routes, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'route':<32}{'count':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'sql':>9}{'queries':>9}{'render':>9}")
+        ordered = sorted(routes.items(), key=lambda item: item[1].get(options['sort'], 0), reverse=True)
+        for route, row in ordered:
+            self.stdout.write(
+                f"{route:<32}{row['count']:>8}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+                f"{row['p99_ms']:>9.1f}{row['mean_sql_ms']:>9.1f}{row['mean_queries']:>9.1f}"
+                f"{row['mean_render_ms']:>9.1f}")
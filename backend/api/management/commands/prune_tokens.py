@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding refresh tokens and their blacklist entries in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Tokens deleted per transaction')
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help='Seconds to pause between batches, leaving the tables to other writers')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        now = timezone.now()
+        outstanding_deleted = blacklisted_deleted = 0
+        last_pk = 0
+        while True:
+            # expires_at is not indexed, but tokens expire roughly in insertion
+            # order, so walking the primary key finds each batch near the start
+            ids = list(OutstandingToken.objects.filter(pk__gt=last_pk, expires_at__lte=now).order_by(
+                'pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                blacklisted_deleted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+                outstanding_deleted += OutstandingToken.objects.filter(pk__in=ids).delete()[0]
+            last_pk = ids[-1]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {outstanding_deleted} outstanding and {blacklisted_deleted} blacklisted tokens'))
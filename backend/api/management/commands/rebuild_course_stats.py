@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import Course, CourseStats, StudentProgress, course_stats_changed
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized course statistics and progress chapter counters, or check them for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Report drifted counters without writing; exit non-zero on drift')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of courses recomputed per batch')
+
+    def handle(self, *args, **options):
+        check = options['check']
+        batch_size = options['batch_size']
+        course_ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+
+        drifted = 0
+        for start in range(0, len(course_ids), batch_size):
+            batch = course_ids[start:start + batch_size]
+            expected = CourseStats.compute(batch)
+            current = {
+                stats.course_id: stats  # type: ignore
+                for stats in CourseStats.objects.filter(course_id__in=batch)
+            }
+
+            stale = []
+            for course_id, values in expected.items():
+                stats = current.get(course_id)
+                actual = {name: getattr(stats, name) for name in CourseStats.COUNTERS} if stats else None
+                if actual == values:
+                    continue
+                drifted += 1
+                self.stdout.write(f'{course_id}: stored {actual}, expected {values}')
+                stale.append(CourseStats(course_id=course_id, **values))
+
+            if stale and not check:
+                with transaction.atomic():
+                    CourseStats.objects.bulk_create(
+                        stale,
+                        update_conflicts=True,
+                        unique_fields=['course'],
+                        update_fields=[*CourseStats.COUNTERS, 'updated_at'])
+                    # Cached course bodies and dashboards show the old counters
+                    for stats in stale:
+                        course_stats_changed.send(sender=CourseStats, course_id=stats.course_id)
+
+            drifted_progress = StudentProgress.objects.filter(
+                course_id__in=batch).with_drifted_chapter_counts()
+            progress_ids = list(drifted_progress.values_list('pk', flat=True))
+            if progress_ids:
+                drifted += len(progress_ids)
+                self.stdout.write(f'{len(progress_ids)} progress rows have drifted chapter counters')
+                if not check:
+                    StudentProgress.objects.filter(pk__in=progress_ids).recount_chapters()
+
+        if check and drifted:
+            raise CommandError(f'{drifted} rows have drifted counters across {len(course_ids)} courses')
+
+        verb = 'found drifted' if check else 'rebuilt'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {len(course_ids)} courses, {verb} {drifted} rows'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from api import dashboard
+from api.models import TeacherDashboardSnapshot, User
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored teacher dashboard snapshots, catching up writes that skipped model signals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale', action='store_true',
+            help='Only recompute the sections writes have flagged, as the background refresh does')
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Also build snapshots for teachers who have never opened their dashboard')
+        parser.add_argument(
+            '--teacher', action='append', default=[], metavar='EMAIL',
+            help='Only refresh this teacher; may be repeated')
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of snapshots written per batch')
+
+    def handle(self, *args, **options):
+        if options['stale']:
+            refreshed = dashboard.refresh_pending()
+            self.stdout.write(self.style.SUCCESS(f'Refreshed {refreshed} stale dashboards'))
+            return
+
+        if options['all'] or options['teacher']:
+            teachers = User.objects.filter(role='teacher')
+            if options['teacher']:
+                teachers = teachers.filter(email__in=options['teacher'])
+            teacher_ids = list(teachers.order_by('pk').values_list('pk', flat=True))
+        else:
+            teacher_ids = list(TeacherDashboardSnapshot.objects.order_by('pk').values_list(
+                'teacher_id', flat=True))
+
+        batch_size = options['batch_size']
+        for start in range(0, len(teacher_ids), batch_size):
+            dashboard.rebuild(teacher_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {len(teacher_ids)} dashboards'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api import attempts
+
+
+class Command(BaseCommand):
+    help = 'Insert journaled quiz attempts that have not been flushed to the database yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Journal directory (default QUIZ_ATTEMPTS["JOURNAL_DIR"])')
+        parser.add_argument('--all', action='store_true',
+                            help='Also replay segments of processes that look alive; '
+                                 'only use this while the server is stopped')
+
+    def handle(self, *args, **options):
+        journal = attempts.Journal(options['dir']) if options['dir'] else attempts.get_journal()
+        segments = journal.pending_segments(include_active=options['all'])
+        written = journal.flush(include_active=options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {written} attempts from {len(segments)} journal segments'))
@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import rollups
+
+
+class Command(BaseCommand):
+    help = 'Roll raw course activity up into daily analytics rows, from the stored watermark onwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Recompute every day from the first recorded activity, ignoring the watermark')
+        parser.add_argument(
+            '--lookback', type=int, default=rollups.LOOKBACK_DAYS,
+            help='Already rolled-up days to recompute for late writes')
+        parser.add_argument(
+            '--through', metavar='YYYY-MM-DD',
+            help='Last day to roll up (default yesterday)')
+
+    def handle(self, *args, **options):
+        through = None
+        if options['through']:
+            try:
+                through = date.fromisoformat(options['through'])
+            except ValueError:
+                raise CommandError(f'Invalid --through date: {options["through"]}')
+        if options['lookback'] < 0:
+            raise CommandError('--lookback cannot be negative')
+
+        first_day, last_day, written = rollups.run(
+            backfill=options['backfill'], lookback=options['lookback'], through=through)
+        if first_day is None:
+            self.stdout.write(self.style.SUCCESS('Rollups are up to date'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {first_day} to {last_day}: {written} course-day rows'))
@@ -0,0 +1,343 @@
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api.models import (
+    User,
+    Course,
+    CourseStats,
+    Chapter,
+    Quiz,
+    Question,
+    CourseRating,
+    StudentProgress,
+    ChapterScore,
+    QuizAttempt,
+    EnrollmentRequest
+)
+
+SEED_EMAIL_DOMAIN = 'seed.questify.local'
+
+SCALES = {
+    'small': {
+        'teachers': 5, 'courses_per_teacher': 4, 'chapters': 6, 'questions': 5,
+        'students': 200, 'enrollments_per_student': 3,
+    },
+    'medium': {
+        'teachers': 50, 'courses_per_teacher': 5, 'chapters': 8, 'questions': 8,
+        'students': 5000, 'enrollments_per_student': 4,
+    },
+    'large': {
+        'teachers': 200, 'courses_per_teacher': 10, 'chapters': 10, 'questions': 10,
+        'students': 50000, 'enrollments_per_student': 5,
+    },
+}
+
+DIFFICULTIES = ('beginner', 'intermediate', 'advanced')
+TAGS = ('python', 'math', 'history', 'science', 'design', 'writing', 'data', 'music')
+# Ratings skew towards 4 and 5 stars, as they do on most course platforms
+RATING_WEIGHTS = (1, 2, 5, 15, 20)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep generated timestamps instead of auto_now/auto_now_add"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class BulkBuffer:
+    """Collects unsaved rows per model and inserts them in batches"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, obj):
+        model = type(obj)
+        rows = self.pending.setdefault(model, [])
+        rows.append(obj)
+        if len(rows) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        models = [model] if model else list(self.pending)
+        for model in models:
+            rows = self.pending.pop(model, [])
+            if rows:
+                model.objects.bulk_create(rows, batch_size=self.batch_size)
+                self.counts[model] = self.counts.get(model, 0) + len(rows)
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible, realistically skewed dataset for load tests and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+        parser.add_argument('--teachers', type=int)
+        parser.add_argument('--courses-per-teacher', type=int)
+        parser.add_argument('--chapters', type=int, help='Mean chapters per course')
+        parser.add_argument('--questions', type=int, help='Mean questions per quiz')
+        parser.add_argument('--students', type=int)
+        parser.add_argument('--enrollments-per-student', type=float)
+        parser.add_argument('--days', type=int, default=180,
+                            help='Spread activity over this many past days')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--password', default='questify-seed',
+                            help='Password shared by every generated user')
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete previously seeded data first')
+
+    def handle(self, *args, **options):
+        config = dict(SCALES[options['scale']])
+        for name in config:
+            if options.get(name) is not None:
+                config[name] = options[name]
+        if min(config.values()) <= 0:
+            raise CommandError('All population sizes must be positive')
+
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.days = options['days']
+        self.buffer = BulkBuffer(options['batch_size'])
+        started = time.monotonic()
+
+        seeded = User.objects.filter(email__endswith='@' + SEED_EMAIL_DOMAIN)
+        if options['clear']:
+            deleted, _ = seeded.delete()
+            self.stdout.write(f'Deleted {deleted} previously seeded rows')
+        elif seeded.exists():
+            raise CommandError('The database already holds seeded data; pass --clear to replace it')
+
+        # Hash once with the configured hasher and share it: every seeded user
+        # can log in, and seeding does not pay for one PBKDF2 run per user.
+        # The salt is long enough that a first login does not rehash it, which
+        # would skew whichever login benchmark runs first.
+        self.password = make_password(options['password'], salt='seedscale' * 3)
+
+        models = (User, Course, Chapter, Quiz, Question, CourseRating,
+                  StudentProgress, QuizAttempt, EnrollmentRequest)
+        with explicit_timestamps(*models), transaction.atomic():
+            teachers = self.create_users('teacher', config['teachers'])
+            students = self.create_users('student', config['students'])
+            courses = self.create_courses(teachers, config)
+            self.enroll_students(courses, students, config)
+            self.buffer.flush()
+            self.rebuild_stats([course['id'] for course in courses])
+
+        elapsed = time.monotonic() - started
+        total = sum(self.buffer.counts.values())
+        for model, count in self.buffer.counts.items():
+            self.stdout.write(f'  {model._meta.label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {total} rows in {elapsed:.1f}s ({total / max(elapsed, 0.001):.0f} rows/s)'))
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def past(self, days=None, skew=1.0):
+        """A timestamp in the past window, biased towards the present when skew > 1"""
+        days = self.days if days is None else days
+        return self.now - timedelta(seconds=days * 86400 * self.rng.random() ** skew)
+
+    def create_users(self, role, count):
+        ids = []
+        for i in range(count):
+            user_id = self.uuid()
+            joined = self.past(skew=0.7)
+            self.buffer.add(User(
+                id=user_id,
+                email=f'{role}{i}@{SEED_EMAIL_DOMAIN}',
+                password=self.password,
+                first_name=role.title(),
+                last_name=str(i),
+                role=role,
+                total_xp=int(self.rng.paretovariate(1.5) * 100) if role == 'student' else 0,
+                created_at=joined,
+                updated_at=joined,
+            ))
+            ids.append(user_id)
+        self.buffer.flush(User)
+        return ids
+
+    def create_courses(self, teachers, config):
+        courses = []
+        for teacher_id in teachers:
+            for _ in range(config['courses_per_teacher']):
+                created = self.past(skew=0.8)
+                course = Course(
+                    id=self.uuid(),
+                    title=f'Course {len(courses) + 1}',
+                    description='Generated course for load testing. ' * self.rng.randint(1, 6),
+                    teacher_id=teacher_id,
+                    difficulty=self.rng.choice(DIFFICULTIES),
+                    estimated_hours=self.rng.randint(2, 120),
+                    tags=self.rng.sample(TAGS, self.rng.randint(1, 3)),
+                    created_at=created,
+                    updated_at=created,
+                )
+                self.buffer.add(course)
+                courses.append({'id': course.id, 'created_at': created})
+        self.buffer.flush(Course)
+
+        for course in courses:
+            course['chapters'] = []
+            chapter_count = max(1, int(self.rng.gauss(config['chapters'], config['chapters'] / 4)))
+            for order in range(1, chapter_count + 1):
+                chapter = Chapter(
+                    id=self.uuid(), course_id=course['id'], title=f'Chapter {order}',
+                    content='Lorem ipsum dolor sit amet. ' * self.rng.randint(20, 200),
+                    order=order, estimated_minutes=self.rng.randint(10, 90),
+                    created_at=course['created_at'], updated_at=course['created_at'],
+                )
+                self.buffer.add(chapter)
+                quiz_id = self.create_quiz(course, config, chapter_id=chapter.id)
+                course['chapters'].append((chapter.id, quiz_id))
+            course['final_quiz'] = self.create_quiz(course, config, quiz_type='final')
+        for model in (Chapter, Quiz, Question):
+            self.buffer.flush(model)
+        return courses
+
+    def create_quiz(self, course, config, chapter_id=None, quiz_type='chapter'):
+        quiz = Quiz(
+            id=self.uuid(), course_id=course['id'], chapter_id=chapter_id,
+            title='Final Exam' if quiz_type == 'final' else 'Chapter Quiz',
+            type=quiz_type, passing_score=70,
+            created_at=course['created_at'], updated_at=course['created_at'],
+        )
+        self.buffer.add(quiz)
+        count = max(1, int(self.rng.gauss(config['questions'], config['questions'] / 4)))
+        if quiz_type == 'final':
+            count *= 2
+        for order in range(count):
+            self.buffer.add(Question(
+                id=self.uuid(), quiz_id=quiz.id, question=f'Question {order + 1}?',
+                options=['A', 'B', 'C', 'D'], correct_answer=self.rng.randrange(4),
+                points=self.rng.choice((1, 1, 1, 2, 5)), order=order,
+                created_at=course['created_at'], updated_at=course['created_at'],
+            ))
+        return quiz.id
+
+    def enroll_students(self, courses, students, config):
+        # Course popularity follows a Zipf-like distribution: a few courses
+        # attract most of the students.
+        weights = [1 / (rank ** 1.1) for rank in range(1, len(courses) + 1)]
+        self.rng.shuffle(weights)
+        total_enrollments = int(len(students) * config['enrollments_per_student'])
+        scale = total_enrollments / sum(weights)
+
+        through = Course.enrolled_students.through
+        progress_id = (StudentProgress.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+
+        for course, weight in zip(courses, weights):
+            enrolled_count = min(len(students), max(1, round(weight * scale)))
+            sampled = self.rng.sample(students, min(len(students), enrolled_count + enrolled_count // 10 + 1))
+            enrolled, waiting = sampled[:enrolled_count], sampled[enrolled_count:]
+
+            for student_id in enrolled:
+                enrolled_at = self.past(skew=1.5)
+                if enrolled_at < course['created_at']:
+                    enrolled_at = course['created_at'] + (self.now - course['created_at']) * self.rng.random()
+                self.buffer.add(through(course_id=course['id'], user_id=student_id))
+                self.buffer.add(EnrollmentRequest(
+                    student_id=student_id, course_id=course['id'], status='approved',
+                    requested_at=enrolled_at - timedelta(hours=self.rng.randint(1, 72)),
+                    reviewed_at=enrolled_at,
+                ))
+                self.create_progress(progress_id, student_id, course, enrolled_at)
+                progress_id += 1
+
+            for student_id in waiting:
+                self.buffer.add(EnrollmentRequest(
+                    student_id=student_id, course_id=course['id'],
+                    status=self.rng.choice(('pending', 'pending', 'rejected')),
+                    requested_at=self.past(days=30),
+                ))
+
+    def create_progress(self, progress_id, student_id, course, enrolled_at):
+        chapters = course['chapters']
+        # Most students drop off early; completion is a minority outcome
+        completed_count = min(len(chapters), int(len(chapters) * self.rng.betavariate(1.2, 1.6) * 1.3))
+        completed = completed_count == len(chapters)
+        elapsed = self.now - enrolled_at
+
+        quiz_scores = {}
+        for index, (chapter_id, quiz_id) in enumerate(chapters[:completed_count]):
+            finished_at = enrolled_at + elapsed * ((index + 1) / (len(chapters) + 1))
+            score = self.create_attempts(student_id, quiz_id, finished_at)
+            quiz_scores[str(quiz_id)] = score
+            self.buffer.add(ChapterScore(
+                progress_id=progress_id, chapter_id=chapter_id,
+                score=score, completed_at=finished_at))
+
+        final_exam_score = None
+        final_attempts = 0
+        completed_at = None
+        if completed:
+            completed_at = enrolled_at + elapsed * self.rng.uniform(0.8, 1.0)
+            final_attempts = self.rng.choice((1, 1, 1, 2, 3))
+            for _ in range(final_attempts):
+                final_exam_score = self.create_attempts(
+                    student_id, course['final_quiz'], completed_at, tries=1)
+
+        self.buffer.add(StudentProgress(
+            id=progress_id, student_id=student_id, course_id=course['id'],
+            enrolled_at=enrolled_at, last_accessed_at=completed_at or enrolled_at + elapsed * self.rng.random(),
+            quiz_scores=quiz_scores,
+            completed_chapter_count=completed_count, total_chapter_count=len(chapters),
+            final_exam_score=final_exam_score, final_exam_attempts=final_attempts,
+            total_time_spent=completed_count * self.rng.randint(15, 60),
+            completed=completed, completed_at=completed_at,
+        ))
+
+        if self.rng.random() < (0.6 if completed else 0.15):
+            self.buffer.add(CourseRating(
+                id=self.uuid(), course_id=course['id'], student_id=student_id,
+                rating=self.rng.choices(range(1, 6), RATING_WEIGHTS)[0],
+                created_at=completed_at or enrolled_at,
+            ))
+
+    def create_attempts(self, student_id, quiz_id, finished_at, tries=None):
+        """Record one or more quiz attempts and return the last score"""
+        tries = tries or self.rng.choice((1, 1, 1, 2, 2, 3))
+        score = 0
+        for attempt in range(tries):
+            score = min(100, int(self.rng.betavariate(5, 2) * 100) + attempt * 5)
+            taken = self.rng.randint(2, 45)
+            completed_at = finished_at - timedelta(minutes=(tries - attempt) * 60)
+            self.buffer.add(QuizAttempt(
+                id=self.uuid(), student_id=student_id, quiz_id=quiz_id,
+                answers={}, score=score, time_taken=taken,
+                started_at=completed_at - timedelta(minutes=taken),
+                completed_at=completed_at,
+            ))
+        return score
+
+    def rebuild_stats(self, course_ids):
+        for start in range(0, len(course_ids), 500):
+            batch = course_ids[start:start + 500]
+            self.buffer.pending[CourseStats] = [
+                CourseStats(course_id=course_id, **values)
+                for course_id, values in CourseStats.compute(batch).items()
+            ]
+            self.buffer.flush(CourseStats)
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api import routing
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into the replica file, standing in for replication'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Keep copying every this many seconds (default: copy once)')
+        parser.add_argument(
+            '--pages', type=int, default=-1,
+            help='Pages copied per step, letting writers in between; -1 copies in one step')
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        replica = connections[routing.REPLICA_DB_ALIAS].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3' or replica['ENGINE'] != primary['ENGINE']:
+            raise CommandError('sync_replica copies SQLite files; use the database\'s own replication instead')
+        if str(replica['NAME']) == str(primary['NAME']):
+            raise CommandError('The replica is the primary database; set DATABASE_REPLICA_NAME')
+        if options['pages'] == 0 or options['pages'] < -1:
+            raise CommandError('--pages must be positive or -1')
+
+        while True:
+            started = time.perf_counter()
+            routing.copy_database(str(primary['NAME']), str(replica['NAME']), options['pages'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Copied {primary['NAME']} to {replica['NAME']} in {time.perf_counter() - started:.2f}s"))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_course_stats(apps, schema_editor):
+    Course = apps.get_model('api', 'Course')
+    CourseStats = apps.get_model('api', 'CourseStats')
+    CourseRating = apps.get_model('api', 'CourseRating')
+    StudentProgress = apps.get_model('api', 'StudentProgress')
+
+    stats = {pk: CourseStats(course_id=pk) for pk in Course.objects.values_list('pk', flat=True)}
+
+    enrollments = Course.enrolled_students.through.objects.values(
+        'course_id').annotate(total=models.Count('id'))
+    for row in enrollments:
+        stats[row['course_id']].enrollment_count = row['total']
+
+    ratings = CourseRating.objects.values('course_id').annotate(
+        total=models.Sum('rating'), count=models.Count('id'))
+    for row in ratings:
+        stats[row['course_id']].rating_sum = row['total'] or 0
+        stats[row['course_id']].rating_count = row['count']
+
+    progress = StudentProgress.objects.values('course_id').annotate(
+        total=models.Count('id'),
+        completed=models.Count('id', filter=models.Q(completed=True)))
+    for row in progress:
+        stats[row['course_id']].progress_count = row['total']
+        stats[row['course_id']].completion_count = row['completed']
+
+    CourseStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='api.course')),
+                ('enrollment_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('completion_count', models.PositiveIntegerField(default=0)),
+                ('progress_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'course stats',
+            },
+        ),
+        migrations.RunPython(backfill_course_stats, migrations.RunPython.noop),
+    ]
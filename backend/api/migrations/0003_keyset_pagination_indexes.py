@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_coursestats'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['created_at', 'id'], name='chapter_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['created_at', 'id'], name='course_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollmentrequest',
+            index=models.Index(fields=['requested_at', 'id'], name='enrollment_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollmentrequest',
+            index=models.Index(fields=['course', 'requested_at'], name='enrollment_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['created_at', 'id'], name='question_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['created_at', 'id'], name='quiz_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentprogress',
+            index=models.Index(fields=['enrolled_at', 'id'], name='progress_enrolled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at', 'id'], name='user_created_idx'),
+        ),
+    ]
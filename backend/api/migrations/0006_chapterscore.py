@@ -0,0 +1,110 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def parse_score(value):
+    try:
+        return min(max(int(float(value)), 0), 100)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def copy_chapter_scores(apps, schema_editor):
+    """Move completed_chapters rows and chapter_scores entries into ChapterScore"""
+    StudentProgress = apps.get_model('api', 'StudentProgress')
+    Chapter = apps.get_model('api', 'Chapter')
+    ChapterScore = apps.get_model('api', 'ChapterScore')
+    Completed = StudentProgress.completed_chapters.through
+
+    completed = {}
+    for progress_id, chapter_id in Completed.objects.values_list('studentprogress_id', 'chapter_id').iterator():
+        completed.setdefault(progress_id, set()).add(chapter_id)
+
+    rows = []
+    progress_rows = StudentProgress.objects.only(
+        'id', 'course_id', 'chapter_scores', 'last_accessed_at', 'completed_at')
+    course_chapters = {}
+    for progress in progress_rows.iterator(chunk_size=2000):
+        if progress.course_id not in course_chapters:
+            course_chapters[progress.course_id] = {
+                str(chapter_id): chapter_id
+                for chapter_id in Chapter.objects.filter(course_id=progress.course_id).values_list('id', flat=True)
+            }
+        chapters = course_chapters[progress.course_id]
+        scores = {
+            chapters[key]: parse_score(value)
+            for key, value in (progress.chapter_scores or {}).items() if key in chapters
+        }
+        completed_at = progress.completed_at or progress.last_accessed_at
+        for chapter_id in completed.get(progress.id, set()) | set(scores):
+            rows.append(ChapterScore(
+                progress_id=progress.id, chapter_id=chapter_id,
+                score=scores.get(chapter_id), completed_at=completed_at))
+        if len(rows) >= 2000:
+            ChapterScore.objects.bulk_create(rows)
+            rows = []
+    ChapterScore.objects.bulk_create(rows)
+
+
+def restore_chapter_scores(apps, schema_editor):
+    """Rebuild completed_chapters rows and chapter_scores entries from ChapterScore"""
+    StudentProgress = apps.get_model('api', 'StudentProgress')
+    ChapterScore = apps.get_model('api', 'ChapterScore')
+    Completed = StudentProgress.completed_chapters.through
+
+    scores = {}
+    rows = []
+    results = ChapterScore.objects.values_list('progress_id', 'chapter_id', 'score')
+    for progress_id, chapter_id, score in results.iterator(chunk_size=2000):
+        rows.append(Completed(studentprogress_id=progress_id, chapter_id=chapter_id))
+        if score is not None:
+            scores.setdefault(progress_id, {})[str(chapter_id)] = score
+        if len(rows) >= 2000:
+            Completed.objects.bulk_create(rows)
+            rows = []
+    Completed.objects.bulk_create(rows)
+
+    StudentProgress.objects.bulk_update(
+        [StudentProgress(id=progress_id, chapter_scores=values) for progress_id, values in scores.items()],
+        ['chapter_scores'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_quizattempt_started_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChapterScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scores', to='api.chapter')),
+                ('progress', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chapter_results', to='api.studentprogress')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['chapter', 'score'], name='chapter_score_idx')],
+                'unique_together': {('progress', 'chapter')},
+            },
+        ),
+        migrations.RunPython(copy_chapter_scores, restore_chapter_scores),
+        migrations.RemoveField(
+            model_name='studentprogress',
+            name='completed_chapters',
+        ),
+        migrations.RemoveField(
+            model_name='studentprogress',
+            name='chapter_scores',
+        ),
+        migrations.AddField(
+            model_name='studentprogress',
+            name='completed_chapters',
+            field=models.ManyToManyField(blank=True, related_name='completed_by', through='api.ChapterScore', to='api.chapter'),
+        ),
+    ]
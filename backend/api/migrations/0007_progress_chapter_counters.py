@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:02
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_chapters(apps, schema_editor):
+    StudentProgress = apps.get_model('api', 'StudentProgress')
+    Chapter = apps.get_model('api', 'Chapter')
+    ChapterScore = apps.get_model('api', 'ChapterScore')
+    total = Chapter.objects.filter(course=models.OuterRef('course')).order_by().values(
+        'course').annotate(total=models.Count('id')).values('total')
+    completed = ChapterScore.objects.filter(progress=models.OuterRef('pk')).order_by().values(
+        'progress').annotate(total=models.Count('id')).values('total')
+    StudentProgress.objects.update(
+        total_chapter_count=Coalesce(models.Subquery(total), 0),
+        completed_chapter_count=Coalesce(models.Subquery(completed), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_chapterscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentprogress',
+            name='completed_chapter_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentprogress',
+            name='total_chapter_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_chapters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_progress_chapter_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherDashboardSnapshot',
+            fields=[
+                ('teacher', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard_snapshot', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('data', models.JSONField(default=dict)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
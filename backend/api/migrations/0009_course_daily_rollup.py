@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_teacherdashboardsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('enrollments', models.PositiveIntegerField(default=0)),
+                ('completions', models.PositiveIntegerField(default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('passed_attempts', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('active_students', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('rolled_up_to', models.DateField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['started_at'], name='attempt_started_idx'),
+        ),
+        migrations.AddField(
+            model_name='coursedailyrollup',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='api.course'),
+        ),
+        migrations.AddIndex(
+            model_name='coursedailyrollup',
+            index=models.Index(fields=['day'], name='rollup_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='coursedailyrollup',
+            unique_together={('course', 'day')},
+        ),
+    ]
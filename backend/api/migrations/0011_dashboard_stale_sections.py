@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacherdashboardsnapshot',
+            name='activity_stale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='teacherdashboardsnapshot',
+            name='courses_stale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='teacherdashboardsnapshot',
+            name='enrollments_stale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
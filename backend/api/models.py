@@ -1,9 +1,14 @@
 import uuid
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
+from . import hashing
+
 
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -11,7 +16,7 @@ class UserManager(BaseUserManager):
             raise ValueError('The Email field must be set')
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
-        user.set_password(password)
+        user.password = hashing.make_password(password)
         user.save(using=self._db)
         return user
 
@@ -44,14 +49,43 @@ class User(AbstractBaseUser, PermissionsMixin):
     streak_days = models.IntegerField(default=0)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Bumped when a field tokens carry or depend on changes, invalidating them
+    token_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     objects = UserManager()
 
+    TOKEN_FIELDS = ('role', 'is_active')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='user_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._token_state = {
+            name: getattr(instance, name) for name in cls.TOKEN_FIELDS
+            if name in instance.__dict__}
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_token_state', {})
+        self._token_version_bumped = any(
+            getattr(self, name) != value for name, value in loaded.items())
+        if self._token_version_bumped:
+            self.token_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+        super().save(*args, **kwargs)
+        self._token_state = {name: getattr(self, name) for name in self.TOKEN_FIELDS}
+
     @property
     def name(self):
         return f"{self.first_name} {self.last_name}".strip() or self.email
@@ -84,6 +118,11 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='course_created_idx'),
+        ]
+
     @property
     def teacher_id(self):
         return str(self.teacher.id)
@@ -92,16 +131,23 @@ class Course(models.Model):
     def teacher_name(self):
         return self.teacher.name
 
+    @property
+    def course_stats(self):
+        try:
+            return self.stats  # type: ignore
+        except CourseStats.DoesNotExist:
+            # The row is created with the course; if it is missing, compute
+            # the counters rather than write from a read
+            self.stats = CourseStats(course=self, **CourseStats.compute([self.pk])[self.pk])
+            return self.stats
+
     @property
     def enrollment_count(self):
-        return self.enrolled_students.count()
+        return self.course_stats.enrollment_count
 
     @property
     def average_rating(self):
-        ratings = self.ratings.all()  # type: ignore
-        if ratings.exists():
-            return ratings.aggregate(models.Avg('rating'))['rating__avg']
-        return 0.0
+        return self.course_stats.average_rating
 
     @property
     def final_exam(self):
@@ -114,6 +160,86 @@ class Course(models.Model):
         return self.title
 
 
+# Sent after CourseStats.increment changes a course's counters
+course_stats_changed = Signal()
+
+
+class CourseStats(models.Model):
+    """Denormalized per-course counters, maintained by receivers in `api.signals`"""
+    COUNTERS = (
+        'enrollment_count', 'rating_sum', 'rating_count',
+        'completion_count', 'progress_count')
+
+    course = models.OneToOneField(
+        Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    enrollment_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    completion_count = models.PositiveIntegerField(default=0)
+    progress_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'course stats'
+
+    @property
+    def average_rating(self):
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
+        return 0.0
+
+    @classmethod
+    def increment(cls, course_id, **deltas):
+        """Apply counter deltas with a single UPDATE, creating the row on first use"""
+        changes = {name: F(name) + delta for name, delta in deltas.items() if delta}
+        if not changes:
+            return
+        updated = cls.objects.filter(course_id=course_id).update(
+            updated_at=timezone.now(), **changes)
+        if not updated:
+            cls.rebuild(Course(pk=course_id))
+        course_stats_changed.send(sender=cls, course_id=course_id)
+
+    @classmethod
+    def compute(cls, course_ids):
+        """Compute the true counters for the given courses with grouped queries"""
+        values = {course_id: dict.fromkeys(cls.COUNTERS, 0)
+                  for course_id in course_ids}
+
+        enrollments = Course.enrolled_students.through.objects.filter(
+            course_id__in=values).values('course_id').annotate(
+                total=models.Count('id'))
+        for row in enrollments:
+            values[row['course_id']]['enrollment_count'] = row['total']
+
+        ratings = CourseRating.objects.filter(course_id__in=values).values(
+            'course_id').annotate(
+                total=models.Sum('rating'), count=models.Count('id'))
+        for row in ratings:
+            values[row['course_id']]['rating_sum'] = row['total'] or 0
+            values[row['course_id']]['rating_count'] = row['count']
+
+        progress = StudentProgress.objects.filter(course_id__in=values).values(
+            'course_id').annotate(
+                total=models.Count('id'),
+                completed=models.Count('id', filter=models.Q(completed=True)))
+        for row in progress:
+            values[row['course_id']]['progress_count'] = row['total']
+            values[row['course_id']]['completion_count'] = row['completed']
+
+        return values
+
+    @classmethod
+    def rebuild(cls, course):
+        """Recompute and store the counters for a single course"""
+        values = cls.compute([course.pk])[course.pk]
+        stats, _ = cls.objects.update_or_create(course_id=course.pk, defaults=values)
+        return stats
+
+    def __str__(self):
+        return f"Stats for {self.course_id}"  # type: ignore
+
+
 class Chapter(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     course = models.ForeignKey(
@@ -128,6 +254,9 @@ class Chapter(models.Model):
     class Meta:
         ordering = ['order']
         unique_together = ('course', 'order')
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='chapter_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.course.title} - {self.title}"
@@ -155,6 +284,11 @@ class Quiz(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='quiz_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.course.title} - {self.title}"
 
@@ -177,10 +311,14 @@ class Question(models.Model):
     points = models.IntegerField(default=1)
     order = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['order']
         unique_together = ('quiz', 'order')
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='question_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.quiz.title} - Question {self.order + 1}"
@@ -200,10 +338,42 @@ class CourseRating(models.Model):
     class Meta:
         unique_together = ('course', 'student')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What CourseStats counts for this row, so a save can apply the difference
+        if 'rating' in instance.__dict__:
+            instance._counted = (instance.course_id, instance.rating)  # type: ignore
+        return instance
+
     def __str__(self):
         return f"{self.course.title} - {self.rating} stars"
 
 
+class StudentProgressQuerySet(models.QuerySet):
+    @staticmethod
+    def expected_chapter_counts():
+        total = Chapter.objects.filter(course=models.OuterRef('course')).order_by().values(
+            'course').annotate(total=models.Count('id')).values('total')
+        completed = ChapterScore.objects.filter(progress=models.OuterRef('pk')).order_by().values(
+            'progress').annotate(total=models.Count('id')).values('total')
+        return {
+            'total_chapter_count': Coalesce(models.Subquery(total), 0),
+            'completed_chapter_count': Coalesce(models.Subquery(completed), 0),
+        }
+
+    def with_drifted_chapter_counts(self):
+        """Rows whose stored chapter counters disagree with the chapter and score tables"""
+        expected = {f'expected_{name}': value for name, value in self.expected_chapter_counts().items()}
+        return self.annotate(**expected).exclude(
+            total_chapter_count=F('expected_total_chapter_count'),
+            completed_chapter_count=F('expected_completed_chapter_count'))
+
+    def recount_chapters(self):
+        """Recompute the stored chapter counters with one UPDATE; returns the rows updated"""
+        return self.update(**self.expected_chapter_counts())
+
+
 class StudentProgress(models.Model):
     student = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='progress')
@@ -211,8 +381,11 @@ class StudentProgress(models.Model):
         Course, on_delete=models.CASCADE, related_name='student_progress')
     enrolled_at = models.DateTimeField(auto_now_add=True)
     completed_chapters = models.ManyToManyField(
-        Chapter, related_name='completed_by', blank=True)
-    chapter_scores = models.JSONField(default=dict)
+        Chapter, through='ChapterScore', related_name='completed_by', blank=True)
+    # Kept in step with ChapterScore rows and the course's chapters so that
+    # progress_percentage needs no queries
+    completed_chapter_count = models.PositiveIntegerField(default=0)
+    total_chapter_count = models.PositiveIntegerField(default=0)
     quiz_scores = models.JSONField(default=dict)  # quiz_id -> score percentage
     final_exam_score = models.IntegerField(null=True, blank=True)
     final_exam_attempts = models.IntegerField(default=0)
@@ -222,21 +395,50 @@ class StudentProgress(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     certificate_url = models.URLField(blank=True)
 
+    objects = StudentProgressQuerySet.as_manager()
+
     class Meta:
         unique_together = ('student', 'course')
+        indexes = [
+            models.Index(fields=['enrolled_at', 'id'], name='progress_enrolled_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What CourseStats counts for this row, so a save can apply the difference
+        if 'completed' in instance.__dict__:
+            instance._counted = (instance.course_id, instance.completed)  # type: ignore
+        return instance
 
     @property
     def progress_percentage(self):
-        if not self.course.chapters.exists():  # type: ignore
-            return 0
-        completed_count = self.completed_chapters.count()
-        total_count = self.course.chapters.count()  # type: ignore
-        return (completed_count / total_count) * 100 if total_count > 0 else 0
+        total_count = self.total_chapter_count
+        return (self.completed_chapter_count / total_count) * 100 if total_count > 0 else 0
 
     def __str__(self):
         return f"{self.student.name} - {self.course.title}"
 
 
+class ChapterScore(models.Model):
+    """A chapter a student has completed, with the score they got for it"""
+    progress = models.ForeignKey(
+        StudentProgress, on_delete=models.CASCADE, related_name='chapter_results')
+    chapter = models.ForeignKey(
+        Chapter, on_delete=models.CASCADE, related_name='scores')
+    score = models.PositiveSmallIntegerField(null=True, blank=True)  # percentage
+    completed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('progress', 'chapter')
+        indexes = [
+            models.Index(fields=['chapter', 'score'], name='chapter_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.progress} - {self.chapter.title}: {self.score}"
+
+
 class QuizAttempt(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     student = models.ForeignKey(
@@ -246,9 +448,15 @@ class QuizAttempt(models.Model):
     answers = models.JSONField(default=dict)
     score = models.IntegerField()  # percentage
     time_taken = models.IntegerField()  # in minutes
-    started_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add so journaled attempts keep their submit time
+    started_at = models.DateTimeField(default=timezone.now, editable=False)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['started_at'], name='attempt_started_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student.name} - {self.quiz.title} - {self.score}%"
 
@@ -274,19 +482,24 @@ class EnrollmentRequest(models.Model):
 
     class Meta:
         unique_together = ['student', 'course']
+        indexes = [
+            models.Index(fields=['requested_at', 'id'], name='enrollment_requested_idx'),
+            models.Index(fields=['course', 'requested_at'], name='enrollment_course_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.name} - {self.course.title} ({self.status})"
 
     def approve(self, reviewer):
         """Approve the enrollment request"""
-        self.status = 'approved'
-        self.reviewed_at = timezone.now()
-        self.reviewed_by = reviewer
-        self.save()
-        self.course.enrolled_students.add(self.student)
-        StudentProgress.objects.get_or_create(
-            student=self.student, course=self.course)
+        with transaction.atomic():
+            self.status = 'approved'
+            self.reviewed_at = timezone.now()
+            self.reviewed_by = reviewer
+            self.save()
+            self.course.enrolled_students.add(self.student_id)  # type: ignore
+            StudentProgress.objects.get_or_create(
+                student_id=self.student_id, course_id=self.course_id)  # type: ignore
 
     def reject(self, reviewer):
         """Reject the enrollment request"""
@@ -294,3 +507,61 @@ class EnrollmentRequest(models.Model):
         self.reviewed_at = timezone.now()
         self.reviewed_by = reviewer
         self.save()
+
+
+class TeacherDashboardSnapshot(models.Model):
+    """A teacher's materialized dashboard, maintained by `api.dashboard`"""
+    teacher = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='dashboard_snapshot')
+    data = models.JSONField(default=dict)
+    # Last full recompute; updated_at also moves when sections are refreshed
+    refreshed_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Sections writes have made out of date, until the next refresh
+    courses_stale = models.BooleanField(default=False)
+    enrollments_stale = models.BooleanField(default=False)
+    activity_stale = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Dashboard for {self.teacher_id}"  # type: ignore
+
+
+class CourseDailyRollup(models.Model):
+    """One course's activity on one local day, written by `api.rollups`"""
+    COUNTERS = (
+        'enrollments', 'completions', 'attempts', 'passed_attempts', 'score_sum',
+        'active_students')
+
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    enrollments = models.PositiveIntegerField(default=0)
+    completions = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    passed_attempts = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)  # mean score is score_sum / attempts
+    # Distinct students who attempted a quiz or completed a chapter that day
+    active_students = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('course', 'day')
+        indexes = [
+            models.Index(fields=['day'], name='rollup_day_idx'),
+        ]
+
+    @property
+    def average_score(self):
+        return self.score_sum / self.attempts if self.attempts else 0.0
+
+    def __str__(self):
+        return f"{self.course_id} on {self.day}"  # type: ignore
+
+
+class RollupWatermark(models.Model):
+    """The last local day a rollup has been computed through"""
+    name = models.CharField(max_length=50, primary_key=True)
+    rolled_up_to = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} through {self.rolled_up_to}"
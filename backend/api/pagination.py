@@ -0,0 +1,42 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over an indexed timestamp. The primary key breaks ties
+    so cursors stay stable when several rows share a timestamp, and every
+    page is a range scan on the index no matter how deep it is.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+
+
+class SequenceCursorPagination(CreatedAtCursorPagination):
+    """
+    The author's order, for chapters and questions. A cursor is placed on
+    the first ordering field alone, and `order` is only unique within one
+    course or quiz, so the author's order is used when the list is filtered
+    by the view's `sequence_parent` query parameter; the unique (parent,
+    order) index then serves each page. Unfiltered lists page oldest first.
+    """
+    ordering = ('order', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        parent = getattr(view, 'sequence_parent', None)
+        if parent is None or parent not in request.query_params:
+            return OldestFirstCursorPagination.ordering
+        return super().get_ordering(request, queryset, view)
+
+
+class OldestFirstCursorPagination(CreatedAtCursorPagination):
+    ordering = ('created_at', 'id')
+
+
+class EnrolledAtCursorPagination(CreatedAtCursorPagination):
+    ordering = ('-enrolled_at', '-id')
+
+
+class RequestedAtCursorPagination(CreatedAtCursorPagination):
+    ordering = ('-requested_at', '-id')
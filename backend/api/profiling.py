@@ -0,0 +1,264 @@
+"""
+Per-request profiling.
+
+`RequestProfilingMiddleware` measures SQL, view, render and total time for
+a sample of requests, reports them in a `Server-Timing` header and
+folds them into rolling per-route histograms held in process memory. Each
+process periodically dumps its histograms to `PROFILING['DUMP_DIR']` so the
+`profiling_stats` command can merge every worker's view.
+
+Queries that `concurrency.run_sections()` runs on its pool are charged to
+the request too, so SQL time sums every thread's queries and can exceed the
+wall-clock time of a request whose sections overlapped.
+"""
+import json
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.renderers import JSONRenderer
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'WINDOW_SECONDS': 3600,
+    'SLOT_SECONDS': 60,
+    'DUMP_DIR': None,
+    'DUMP_INTERVAL': 60,
+}
+
+# Upper bounds of the latency buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf'))
+METRICS = ('total_ms', 'view_ms', 'sql_ms', 'render_ms', 'queries')
+
+_current = ContextVar('request_profile', default=None)
+
+
+def get_setting(name):
+    return getattr(settings, 'PROFILING', {}).get(name, DEFAULTS[name])
+
+
+class RequestProfile:
+    __slots__ = ('route', 'started', 'view_started', 'queries', 'sql_ms', 'render_ms', 'lock')
+
+    def __init__(self):
+        # Pool threads running the request's sections record into it as well
+        self.lock = threading.Lock()
+        self.route = None
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.render_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self.lock:
+                self.queries += 1
+                self.sql_ms += elapsed
+
+
+@contextmanager
+def profiled_connections(profile=None):
+    """Charge queries on this thread's connections to `profile`, or the current context's"""
+    profile = profile or _current.get()
+    with ExitStack() as stack:
+        if profile is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+        yield profile
+
+
+def empty_route():
+    return {
+        'count': 0,
+        'sums': dict.fromkeys(METRICS, 0.0),
+        'histogram': [0] * len(BUCKETS_MS),
+        'max_ms': 0.0,
+    }
+
+
+def merge_route(into, other):
+    into['count'] += other['count']
+    for name in METRICS:
+        # Dumps written before a metric existed simply lack it
+        into['sums'][name] += other['sums'].get(name, 0.0)
+    into['histogram'] = [a + b for a, b in zip(into['histogram'], other['histogram'])]
+    into['max_ms'] = max(into['max_ms'], other['max_ms'])
+    return into
+
+
+def summarize(route):
+    """Means and histogram-estimated percentiles for a merged route entry"""
+    count = route['count']
+    summary = {'count': count, 'max_ms': round(route['max_ms'], 3)}
+    for name in METRICS:
+        summary[f'mean_{name}'] = round(route['sums'][name] / count, 3) if count else 0
+    for pct in (50, 95, 99):
+        target = pct / 100 * count
+        seen = 0
+        for bound, bucket in zip(BUCKETS_MS, route['histogram']):
+            seen += bucket
+            if seen >= target:
+                summary[f'p{pct}_ms'] = min(bound, route['max_ms'])
+                break
+        else:
+            summary[f'p{pct}_ms'] = 0
+    return summary
+
+
+class RollingStats:
+    """Per-route histograms kept in fixed time slots; slots older than the window are dropped"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = {}
+
+    def record(self, route, values):
+        slot = int(time.time() // get_setting('SLOT_SECONDS'))
+        with self.lock:
+            entry = self.slots.setdefault(slot, {}).setdefault(route, empty_route())
+            entry['count'] += 1
+            for name in METRICS:
+                entry['sums'][name] += values[name]
+            for index, bound in enumerate(BUCKETS_MS):
+                if values['total_ms'] <= bound:
+                    entry['histogram'][index] += 1
+                    break
+            entry['max_ms'] = max(entry['max_ms'], values['total_ms'])
+            self.expire(slot)
+
+    def expire(self, slot):
+        oldest = slot - get_setting('WINDOW_SECONDS') // get_setting('SLOT_SECONDS')
+        for stale in [key for key in self.slots if key <= oldest]:
+            del self.slots[stale]
+
+    def snapshot(self):
+        """Raw merged histograms for the window, suitable for merging across processes"""
+        with self.lock:
+            self.expire(int(time.time() // get_setting('SLOT_SECONDS')))
+            merged = {}
+            for routes in self.slots.values():
+                for route, entry in routes.items():
+                    merge_route(merged.setdefault(route, empty_route()), entry)
+        return merged
+
+    def reset(self):
+        with self.lock:
+            self.slots.clear()
+
+
+stats = RollingStats()
+_last_dump = [time.monotonic()]
+
+
+def report(snapshot):
+    return {route: summarize(entry) for route, entry in sorted(snapshot.items())}
+
+
+def dump(directory=None):
+    """Write this process's snapshot to the dump directory"""
+    directory = directory or get_setting('DUMP_DIR')
+    if not directory:
+        return None
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'profile-{os.getpid()}.json'
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps({'written_at': time.time(), 'routes': stats.snapshot()}))
+    temporary.replace(path)
+    return path
+
+
+def load_dumps(directory, max_age=None):
+    """Merge every process dump in the directory, skipping ones older than max_age seconds"""
+    merged = {}
+    for path in Path(directory).glob('profile-*.json'):
+        data = json.loads(path.read_text())
+        if max_age is not None and time.time() - data['written_at'] > max_age:
+            continue
+        for route, entry in data['routes'].items():
+            merge_route(merged.setdefault(route, empty_route()), entry)
+    return merged
+
+
+class ProfiledJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that charges its time to the current request's render
+    total. Building `serializer.data` happens in the view and counts there.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            profile.render_ms += (time.perf_counter() - started) * 1000
+
+
+class RequestProfilingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_setting('ENABLED') or random.random() >= get_setting('SAMPLE_RATE'):
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with profiled_connections(profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        finished = time.perf_counter()
+        total_ms = (finished - profile.started) * 1000
+        view_ms = (finished - profile.view_started) * 1000 if profile.view_started else 0.0
+        # The view figure is Python time, serializers included: SQL and
+        # rendering are reported separately
+        view_ms = max(view_ms - profile.sql_ms - profile.render_ms, 0.0)
+        values = {
+            'total_ms': total_ms,
+            'view_ms': view_ms,
+            'sql_ms': profile.sql_ms,
+            'render_ms': profile.render_ms,
+            'queries': profile.queries,
+        }
+
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={profile.sql_ms:.2f};desc="{profile.queries} queries"',
+            f'view;dur={view_ms:.2f}',
+            f'render;dur={profile.render_ms:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ))
+        if profile.route:
+            stats.record(profile.route, values)
+            self.maybe_dump()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is not None:
+            profile.route = request.resolver_match.url_name or request.resolver_match.view_name
+            profile.view_started = time.perf_counter()
+
+    def maybe_dump(self):
+        now = time.monotonic()
+        if now - _last_dump[0] >= get_setting('DUMP_INTERVAL'):
+            _last_dump[0] = now
+            dump()
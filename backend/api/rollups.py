@@ -0,0 +1,195 @@
+"""
+Daily per-course analytics rollups.
+
+`rollup()` recomputes whole local days from the raw progress, attempt and
+chapter score rows with a handful of grouped queries and replaces their
+`CourseDailyRollup` rows, so rerunning a day is always safe. `run()` moves a
+`RollupWatermark` forward through yesterday, recomputing a few already
+rolled-up days as well to pick up late writes such as offline batch
+submissions or journaled attempts. `series()` answers analytics from the
+rollups through the watermark plus a live count of the days after it.
+"""
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import timeseries
+from .models import ChapterScore, CourseDailyRollup, QuizAttempt, RollupWatermark, StudentProgress
+
+WATERMARK = 'course_daily'
+# Days already rolled up that each incremental run recomputes
+LOOKBACK_DAYS = 2
+# Days computed and written per transaction while backfilling
+CHUNK_DAYS = 31
+
+
+def day_range(first_day, last_day):
+    """Aware datetimes spanning local days first_day through last_day"""
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(first_day, datetime.min.time(), tzinfo=tz)
+    end = datetime.combine(last_day + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+    return start, end
+
+
+def compute(first_day, last_day, course_ids=None):
+    """
+    Counters for every course and local day with activity between
+    first_day and last_day, keyed by (course id, day)
+    """
+    tz = timezone.get_current_timezone()
+    start, end = day_range(first_day, last_day)
+    scope = {} if course_ids is None else {'course_id__in': course_ids}
+    attempt_scope = {} if course_ids is None else {'quiz__course_id__in': course_ids}
+    rows = {}
+
+    def counters(course_id, day):
+        return rows.setdefault((course_id, day), dict.fromkeys(CourseDailyRollup.COUNTERS, 0))
+
+    enrollments = StudentProgress.objects.filter(
+        enrolled_at__gte=start, enrolled_at__lt=end, **scope
+    ).annotate(day=TruncDate('enrolled_at', tzinfo=tz)).order_by().values(
+        'course_id', 'day').annotate(total=Count('pk'))
+    for row in enrollments:
+        counters(row['course_id'], row['day'])['enrollments'] = row['total']
+
+    completions = StudentProgress.objects.filter(
+        completed=True, completed_at__gte=start, completed_at__lt=end, **scope
+    ).annotate(day=TruncDate('completed_at', tzinfo=tz)).order_by().values(
+        'course_id', 'day').annotate(total=Count('pk'))
+    for row in completions:
+        counters(row['course_id'], row['day'])['completions'] = row['total']
+
+    attempts = QuizAttempt.objects.filter(
+        started_at__gte=start, started_at__lt=end, **attempt_scope
+    ).annotate(day=TruncDate('started_at', tzinfo=tz), course_id=F('quiz__course_id')).order_by().values(
+        'course_id', 'day').annotate(
+            total=Count('pk'),
+            passed=Count('pk', filter=Q(score__gte=F('quiz__passing_score'))),
+            score_sum=Sum('score'))
+    for row in attempts:
+        values = counters(row['course_id'], row['day'])
+        values['attempts'] = row['total']
+        values['passed_attempts'] = row['passed']
+        values['score_sum'] = row['score_sum'] or 0
+
+    # UNION drops students active both ways on the same day
+    attempt_students = QuizAttempt.objects.filter(
+        started_at__gte=start, started_at__lt=end, **attempt_scope
+    ).annotate(day=TruncDate('started_at', tzinfo=tz), course_id=F('quiz__course_id')).order_by().values_list(
+        'course_id', 'day', 'student_id')
+    chapter_students = ChapterScore.objects.filter(
+        completed_at__gte=start, completed_at__lt=end,
+        **{f'progress__{lookup}': value for lookup, value in scope.items()}
+    ).annotate(
+        day=TruncDate('completed_at', tzinfo=tz), course_id=F('progress__course_id'),
+        student_id=F('progress__student_id')
+    ).order_by().values_list('course_id', 'day', 'student_id')
+    for course_id, day, _ in attempt_students.union(chapter_students):
+        counters(course_id, day)['active_students'] += 1
+
+    return rows
+
+
+def rollup(first_day, last_day):
+    """Replace the rollup rows of first_day through last_day; returns the rows written"""
+    rows = [
+        CourseDailyRollup(course_id=course_id, day=day, **values)
+        for (course_id, day), values in compute(first_day, last_day).items()
+    ]
+    with transaction.atomic():
+        CourseDailyRollup.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+        CourseDailyRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def watermark():
+    return RollupWatermark.objects.filter(name=WATERMARK).values_list(
+        'rolled_up_to', flat=True).first()
+
+
+def earliest_day():
+    """The first local day with any activity, or None"""
+    tz = timezone.get_current_timezone()
+    firsts = [
+        StudentProgress.objects.aggregate(first=Min('enrolled_at'))['first'],
+        QuizAttempt.objects.aggregate(first=Min('started_at'))['first'],
+        ChapterScore.objects.aggregate(first=Min('completed_at'))['first'],
+    ]
+    firsts = [first for first in firsts if first is not None]
+    return timezone.localtime(min(firsts), tz).date() if firsts else None
+
+
+def run(backfill=False, lookback=LOOKBACK_DAYS, through=None):
+    """
+    Roll up every complete day not yet covered, through yesterday unless
+    `through` is given. Returns (first day, last day, rows written); the
+    days are None when there was nothing to do.
+    """
+    last_day = through or timezone.localdate() - timedelta(days=1)
+    rolled_up_to = None if backfill else watermark()
+    if rolled_up_to is None:
+        first_day = earliest_day()
+    else:
+        first_day = rolled_up_to + timedelta(days=1 - lookback)
+    if first_day is None or first_day > last_day:
+        return None, None, 0
+
+    written = 0
+    chunk_start = first_day
+    while chunk_start <= last_day:
+        chunk_end = min(chunk_start + timedelta(days=CHUNK_DAYS - 1), last_day)
+        written += rollup(chunk_start, chunk_end)
+        # Moving the mark after each chunk lets an interrupted backfill resume
+        RollupWatermark.objects.update_or_create(
+            name=WATERMARK, defaults={'rolled_up_to': max(chunk_end, rolled_up_to or chunk_end)})
+        chunk_start = chunk_end + timedelta(days=1)
+    return first_day, last_day, written
+
+
+def series(course, period='week', buckets=None, now=None):
+    """
+    Bucketed analytics for one course: rolled-up days through the watermark
+    and a live count of the days after it. The live part covers today plus
+    any days the rollup job has not reached yet.
+    """
+    edges = timeseries.bucket_starts(period, buckets, now)
+    edge_days = [edge.date() for edge in edges]
+    first_day, today = edge_days[0], timezone.localdate(now)
+    totals = [dict.fromkeys(CourseDailyRollup.COUNTERS, 0) for _ in edges[:-1]]
+
+    def add(day, values):
+        for name in CourseDailyRollup.COUNTERS:
+            totals[bisect_right(edge_days, day) - 1][name] += values[name]
+
+    rolled_up_to = watermark()
+    live_from = first_day
+    if rolled_up_to is not None and rolled_up_to >= first_day:
+        history = CourseDailyRollup.objects.filter(
+            course=course, day__gte=first_day, day__lte=rolled_up_to).values('day', *CourseDailyRollup.COUNTERS)
+        for row in history:
+            add(row['day'], row)
+        live_from = rolled_up_to + timedelta(days=1)
+    if live_from <= today:
+        for (_, day), values in compute(live_from, today, [course.pk]).items():
+            add(day, values)
+
+    return {
+        'period': period,
+        'buckets': [
+            {
+                'period_start': start,
+                'enrollments': values['enrollments'],
+                'completions': values['completions'],
+                'quiz_attempts': values['attempts'],
+                'passed_attempts': values['passed_attempts'],
+                'average_score': values['score_sum'] / values['attempts'] if values['attempts'] else 0,
+                # Summed per day, so a student active on three days counts three times
+                'active_student_days': values['active_students'],
+            }
+            for start, values in zip(edges, totals)
+        ],
+    }
@@ -0,0 +1,153 @@
+"""
+Primary/replica database routing.
+
+Writes always go to `default`. Reads go to `replica` only when the view
+handling the request opted in with `ReplicaReadsMixin`. Analytics, the
+dashboard and catalog reads do. Everything else, including authentication
+and anything inside a transaction, reads from the primary.
+
+After a user sends a write request, their reads stay on the primary for
+STICKY_SECONDS so they see their own changes despite replication lag. The
+marker is kept in the Django cache, so other workers honour it if the cache
+is shared.
+
+Locally the replica is a second SQLite file. `sync_replica` copies the
+primary into it with SQLite's online backup API, standing in for real
+replication.
+"""
+import sqlite3
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+DEFAULTS = {
+    'ENABLED': False,
+    'STICKY_SECONDS': 10,
+}
+
+_database = ContextVar('database', default=DEFAULT_DB_ALIAS)
+
+
+def get_setting(name):
+    return getattr(settings, 'DATABASE_REPLICA', {}).get(name, DEFAULTS[name])
+
+
+def sticky_key(user_id):
+    return f'routing:sticky:{user_id}'
+
+
+def stick(user_id):
+    cache.set(sticky_key(user_id), True, timeout=get_setting('STICKY_SECONDS'))
+
+
+def is_sticky(user_id):
+    return bool(cache.get(sticky_key(user_id)))
+
+
+def use_replica():
+    """Send this context's reads to the replica; returns a token for `reset`"""
+    return _database.set(REPLICA_DB_ALIAS)
+
+
+def reset(token):
+    _database.reset(token)
+
+
+def read_database():
+    if _database.get() != REPLICA_DB_ALIAS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return REPLICA_DB_ALIAS
+
+
+def pinned(iterable):
+    """
+    Iterate `iterable` with reads routed as they are now. Streaming responses
+    are consumed after the view has returned.
+    """
+    database = _database.get()
+    iterator = iter(iterable)
+    while True:
+        token = _database.set(database)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _database.reset(token)
+        yield item
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return read_database()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Start every request reading from the primary, and keep a user's reads
+    there for a while after they write.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _database.set(DEFAULT_DB_ALIAS)
+        try:
+            response = self.get_response(request)
+        finally:
+            _database.reset(token)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and get_setting('ENABLED'):
+            # Set by DRF once it has authenticated the request
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                stick(user.pk)
+        return response
+
+
+class ReplicaReadsMixin:
+    """
+    Read from the replica for the GET actions in `replica_actions`: viewset
+    action names, or 'get' for plain API views. The choice is made once the
+    user is known, so a user who just wrote keeps reading from the primary.
+    """
+    replica_actions = ('list', 'retrieve', 'get')
+
+    def reads_from_replica(self, request):
+        action = getattr(self, 'action', None) or request.method.lower()
+        return (
+            get_setting('ENABLED')
+            and request.method in ('GET', 'HEAD')
+            and action in self.replica_actions
+            and not (request.user.is_authenticated and is_sticky(request.user.pk))
+        )
+
+    def perform_authentication(self, request):
+        super().perform_authentication(request)
+        if self.reads_from_replica(request):
+            # ReplicaRoutingMiddleware restores the primary afterwards
+            use_replica()
+
+
+def copy_database(source, target, pages=-1):
+    """Copy the SQLite database at `source` over `target`, `pages` at a time"""
+    with sqlite3.connect(source) as source_connection, sqlite3.connect(target) as target_connection:
+        source_connection.backup(target_connection, pages=pages)
+    source_connection.close()
+    target_connection.close()
@@ -1,8 +1,8 @@
 from rest_framework import serializers
 
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
 
 from .models import (
     User,
@@ -15,6 +15,7 @@ from .models import (
     QuizAttempt,
     EnrollmentRequest
 )
+from .tokens import RefreshToken
 
 
 class LoginSerializer(serializers.Serializer):
@@ -68,6 +69,10 @@ class LogoutSerializer(serializers.Serializer):
             raise serializers.ValidationError('Invalid or expired token')
 
 
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    token_class = RefreshToken
+
+
 class UserSerializer(serializers.ModelSerializer):
     name = serializers.ReadOnlyField()
 
@@ -105,6 +110,66 @@ class ChapterSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ChapterContentSerializer(ChapterSerializer):
+    """Chapter with its content but without the nested quiz"""
+    quiz = None
+
+
+def format_course_duration(estimated_hours):
+    if estimated_hours:
+        weeks = estimated_hours // 40  # Assuming 40 hours per week
+        if weeks == 0:
+            return f"{estimated_hours} hours"
+        elif weeks == 1:
+            return "1 week"
+        else:
+            return f"{weeks} weeks"
+    return None
+
+
+class CourseSummarySerializer(serializers.ModelSerializer):
+    """
+    Catalog representation of a course. The chapter and quiz tree is only
+    included when requested through the `expand` context entry.
+    """
+    EXPANDABLE = ('chapters', 'quizzes')
+
+    teacher_id = serializers.ReadOnlyField()
+    teacher_name = serializers.ReadOnlyField()
+    instructor = serializers.ReadOnlyField(
+        source='teacher_name')  # For frontend compatibility
+    enrollment_count = serializers.ReadOnlyField()
+    chapter_count = serializers.SerializerMethodField()
+    rating = serializers.ReadOnlyField(source='average_rating')
+    duration = serializers.SerializerMethodField()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = self.context.get('expand', ())
+        if 'chapters' in expand:
+            fields['chapters'] = ChapterContentSerializer(many=True, read_only=True)
+        if 'quizzes' in expand:
+            fields['quizzes'] = QuizSerializer(many=True, read_only=True)
+        return fields
+
+    def get_chapter_count(self, obj):
+        if hasattr(obj, 'chapter_count'):
+            return obj.chapter_count
+        return obj.chapters.count()
+
+    def get_duration(self, obj):
+        return format_course_duration(obj.estimated_hours)
+
+    class Meta:
+        model = Course
+        fields = [
+            'id', 'title', 'description', 'thumbnail', 'color', 'difficulty',
+            'estimated_hours', 'tags', 'created_at', 'updated_at',
+            'teacher_id', 'teacher_name', 'instructor', 'enrollment_count',
+            'chapter_count', 'rating', 'duration'
+        ]
+
+
 class CourseSerializer(serializers.ModelSerializer):
     chapters = ChapterSerializer(many=True, read_only=True)
     final_exam = QuizSerializer(read_only=True)
@@ -120,15 +185,7 @@ class CourseSerializer(serializers.ModelSerializer):
         many=True, read_only=True)
 
     def get_duration(self, obj):
-        if obj.estimated_hours:
-            weeks = obj.estimated_hours // 40  # Assuming 40 hours per week
-            if weeks == 0:
-                return f"{obj.estimated_hours} hours"
-            elif weeks == 1:
-                return "1 week"
-            else:
-                return f"{weeks} weeks"
-        return None
+        return format_course_duration(obj.estimated_hours)
 
     class Meta:
         model = Course
@@ -141,9 +198,20 @@ class CourseSerializer(serializers.ModelSerializer):
 
 
 class StudentProgressSerializer(serializers.ModelSerializer):
-    student_id = serializers.ReadOnlyField(source='student.id')
-    course_id = serializers.ReadOnlyField(source='course.id')
+    student_id = serializers.ReadOnlyField()
+    course_id = serializers.ReadOnlyField()
     progress_percentage = serializers.ReadOnlyField()
+    completed_chapters = serializers.SerializerMethodField()
+    chapter_scores = serializers.SerializerMethodField()
+
+    def get_completed_chapters(self, obj):
+        return [str(result.chapter_id) for result in obj.chapter_results.all()]
+
+    def get_chapter_scores(self, obj):
+        return {
+            str(result.chapter_id): result.score
+            for result in obj.chapter_results.all() if result.score is not None
+        }
 
     class Meta:
         model = StudentProgress
@@ -167,6 +235,21 @@ class QuizAttemptSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class QuizSubmitSerializer(serializers.Serializer):
+    """The body of a single quiz submission"""
+    answers = serializers.DictField(default=dict)
+    time_taken = serializers.IntegerField(min_value=0, default=0)
+
+
+class QuizSubmissionSerializer(serializers.Serializer):
+    """One item of an offline batch submission"""
+    id = serializers.UUIDField(required=False)
+    quiz_id = serializers.UUIDField()
+    answers = serializers.DictField()
+    time_taken = serializers.IntegerField(min_value=0, default=0)
+    client_timestamp = serializers.DateTimeField(required=False)
+
+
 class EnrollmentRequestSerializer(serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.name', read_only=True)
     student_email = serializers.CharField(
@@ -0,0 +1,330 @@
+from contextvars import ContextVar
+
+from django.db.models import Case, Count, Exists, F, OuterRef, When
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import authentication, caching, dashboard, grading, tokens
+from .serializers import UserSerializer
+from .models import (
+    User,
+    Course,
+    CourseStats,
+    Chapter,
+    Quiz,
+    Question,
+    CourseRating,
+    StudentProgress,
+    ChapterScore,
+    QuizAttempt,
+    course_stats_changed
+)
+
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CourseStats.objects.get_or_create(course=instance)
+
+
+# Catalog cache invalidation
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course(sender, instance, **kwargs):
+    caching.invalidate_course(instance.pk)
+
+
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+@receiver(post_save, sender=CourseRating)
+@receiver(post_delete, sender=CourseRating)
+def invalidate_parent_course(sender, instance, **kwargs):
+    caching.invalidate_course(instance.course_id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_course(sender, instance, **kwargs):
+    course_id = Quiz.objects.filter(pk=instance.quiz_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        caching.invalidate_course(course_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_taught_courses(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Course bodies embed the teacher; saves such as last_login updates leave it as it was
+    if created or raw or (update_fields is not None and not set(update_fields) & set(UserSerializer.Meta.fields)):
+        return
+    for course_id in Course.objects.filter(teacher_id=instance.pk).values_list('pk', flat=True):
+        caching.invalidate_course(course_id)
+
+
+@receiver(m2m_changed, sender=Course.enrolled_students.through)
+def invalidate_enrollments(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            caching.invalidate_course(instance.pk)
+        return
+    # Changed from the student's side, where pk_set holds course ids. A clear
+    # carries no ids, so collect them before the rows are gone.
+    if action == 'pre_clear':
+        pk_set = instance.enrolled_courses.values_list('id', flat=True)
+    elif action not in ('post_add', 'post_remove'):
+        return
+    for course_id in pk_set:
+        caching.invalidate_course(course_id)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def invalidate_quiz_answer_key(sender, instance, **kwargs):
+    grading.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_answer_key(sender, instance, **kwargs):
+    grading.invalidate(instance.quiz_id)
+
+
+@receiver(course_stats_changed)
+def invalidate_course_stats(sender, course_id, **kwargs):
+    caching.invalidate_course(course_id)
+
+
+# Deleting a child leaves no newer timestamp behind, so move the parents'
+# forward to keep Last-Modified validators honest
+
+@receiver(post_delete, sender=Chapter)
+def touch_chapter_parents(sender, instance, **kwargs):
+    Course.objects.filter(pk=instance.course_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Quiz)
+def touch_quiz_parents(sender, instance, **kwargs):
+    Course.objects.filter(pk=instance.course_id).update(updated_at=timezone.now())
+    if instance.chapter_id:
+        Chapter.objects.filter(pk=instance.chapter_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Question)
+def touch_question_parents(sender, instance, **kwargs):
+    Quiz.objects.filter(pk=instance.quiz_id).update(updated_at=timezone.now())
+
+
+# Chapter counters on StudentProgress
+
+# Rows being cascade-deleted whose dependents need no counter updates
+_deleting = ContextVar('deleting', default=frozenset())
+
+
+@receiver(pre_save, sender=StudentProgress)
+def count_course_chapters(sender, instance, raw=False, **kwargs):
+    if instance._state.adding and not raw and not instance.total_chapter_count:
+        instance.total_chapter_count = Chapter.objects.filter(course_id=instance.course_id).count()
+
+
+@receiver(post_save, sender=Chapter)
+def count_added_chapter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        StudentProgress.objects.filter(course_id=instance.course_id).update(
+            total_chapter_count=F('total_chapter_count') + 1)
+
+
+@receiver(pre_delete, sender=Chapter)
+def uncount_deleted_chapter(sender, instance, **kwargs):
+    # One UPDATE for every enrolled student; the cascaded ChapterScore
+    # deletes are then skipped below
+    completed = ChapterScore.objects.filter(progress=OuterRef('pk'), chapter=instance)
+    StudentProgress.objects.filter(course_id=instance.course_id).update(
+        total_chapter_count=F('total_chapter_count') - 1,
+        completed_chapter_count=F('completed_chapter_count') - Case(
+            When(Exists(completed), then=1), default=0))
+    _deleting.set(_deleting.get() | {('chapter', instance.pk)})
+
+
+@receiver(pre_delete, sender=StudentProgress)
+def skip_deleted_progress(sender, instance, **kwargs):
+    _deleting.set(_deleting.get() | {('progress', instance.pk)})
+
+
+@receiver(pre_delete, sender=Course)
+def skip_deleted_course(sender, instance, **kwargs):
+    _deleting.set(_deleting.get() | {('course', instance.pk)})
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Chapter)
+@receiver(post_delete, sender=StudentProgress)
+def forget_deleted(sender, instance, **kwargs):
+    name = {Course: 'course', Chapter: 'chapter', StudentProgress: 'progress'}[sender]
+    _deleting.set(_deleting.get() - {(name, instance.pk)})
+
+
+@receiver(post_save, sender=ChapterScore)
+def count_completed_chapter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        StudentProgress.objects.filter(pk=instance.progress_id).update(
+            completed_chapter_count=F('completed_chapter_count') + 1)
+
+
+@receiver(post_delete, sender=ChapterScore)
+def uncount_completed_chapter(sender, instance, **kwargs):
+    deleting = _deleting.get()
+    if ('chapter', instance.chapter_id) in deleting or ('progress', instance.progress_id) in deleting:
+        return
+    StudentProgress.objects.filter(pk=instance.progress_id).update(
+        completed_chapter_count=F('completed_chapter_count') - 1)
+
+
+@receiver(m2m_changed, sender=StudentProgress.completed_chapters.through)
+def recount_completed_chapters(sender, instance, action, reverse, pk_set, **kwargs):
+    """completed_chapters.add()/remove()/clear() write ChapterScore rows without save signals"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        progress = StudentProgress.objects.filter(pk=instance.pk)
+    elif pk_set is not None:
+        progress = StudentProgress.objects.filter(pk__in=pk_set)
+    else:
+        progress = StudentProgress.objects.filter(course_id=instance.course_id)
+    progress.recount_chapters()
+
+
+# Course statistics, kept here so admin edits, cascades and the API all count
+
+def count(course_id, **deltas):
+    if ('course', course_id) not in _deleting.get():
+        CourseStats.increment(course_id, **deltas)
+
+
+def counted_change(instance, created, update_fields, field, value):
+    """
+    Move `value` (a dict of counter deltas for the row) from what was counted
+    for `instance` to what it holds now, following a change of course too.
+    """
+    current = (instance.course_id, getattr(instance, field))
+    if created:
+        count(current[0], **value(current[1], 1))
+    elif update_fields is not None and not {'course', 'course_id', field} & set(update_fields):
+        return
+    else:
+        counted = getattr(instance, '_counted', None)
+        if counted is None or counted == current:
+            return
+        count(counted[0], **value(counted[1], -1))
+        count(current[0], **value(current[1], 1))
+    instance._counted = current
+
+
+@receiver(post_save, sender=CourseRating)
+def count_rating(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        counted_change(instance, created, update_fields, 'rating',
+                       lambda rating, sign: {'rating_sum': sign * rating, 'rating_count': sign})
+
+
+@receiver(post_delete, sender=CourseRating)
+def uncount_rating(sender, instance, **kwargs):
+    count(instance.course_id, rating_sum=-instance.rating, rating_count=-1)
+
+
+@receiver(post_save, sender=StudentProgress)
+def count_progress(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        counted_change(instance, created, update_fields, 'completed',
+                       lambda completed, sign: {'progress_count': sign, 'completion_count': sign * completed})
+
+
+@receiver(post_delete, sender=StudentProgress)
+def uncount_progress(sender, instance, **kwargs):
+    count(instance.course_id, progress_count=-1, completion_count=-int(instance.completed))
+
+
+def uncount_enrollments(rows):
+    for row in rows.values('course_id').annotate(total=Count('id')):
+        count(row['course_id'], enrollment_count=-row['total'])
+
+
+@receiver(m2m_changed, sender=Course.enrolled_students.through)
+def count_enrollments(sender, instance, action, reverse, pk_set, **kwargs):
+    """add(), remove() and clear() write enrollment rows without save or delete signals"""
+    if action == 'post_add' and pk_set:
+        if reverse:
+            for course_id in pk_set:
+                count(course_id, enrollment_count=1)
+        else:
+            count(instance.pk, enrollment_count=len(pk_set))
+    elif action in ('pre_remove', 'pre_clear'):
+        # Counted before the delete, while the rows that will go can be seen
+        owner, other = ('user_id', 'course_id') if reverse else ('course_id', 'user_id')
+        rows = Course.enrolled_students.through.objects.filter(**{owner: instance.pk})
+        if pk_set is not None:
+            rows = rows.filter(**{f'{other}__in': pk_set})
+        uncount_enrollments(rows)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_user_enrollments(sender, instance, **kwargs):
+    # The cascade deletes the user's enrollment rows without any signal
+    uncount_enrollments(Course.enrolled_students.through.objects.filter(user_id=instance.pk))
+
+
+# Teacher dashboard snapshots
+
+@receiver(post_save, sender=Course)
+def update_dashboard_course(sender, instance, raw=False, **kwargs):
+    if not raw:
+        dashboard.course_changed(instance.pk)
+
+
+@receiver(course_stats_changed)
+def update_dashboard_course_stats(sender, course_id, **kwargs):
+    dashboard.course_changed(course_id)
+
+
+@receiver(post_delete, sender=Course)
+def remove_dashboard_course(sender, instance, **kwargs):
+    dashboard.course_removed(instance.pk, instance.teacher_id)
+
+
+@receiver(post_save, sender=StudentProgress)
+@receiver(post_delete, sender=StudentProgress)
+def update_dashboard_enrollments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        dashboard.enrollments_changed(instance.course_id)
+
+
+@receiver(post_save, sender=QuizAttempt)
+def update_dashboard_activity(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        dashboard.activity_changed([instance.quiz_id])
+
+
+# Token versions
+
+@receiver(post_save, sender=User)
+def publish_token_version(sender, instance, raw=False, **kwargs):
+    if not raw and getattr(instance, '_token_version_bumped', False):
+        pk, token_version, is_active = instance.pk, instance.token_version, instance.is_active
+        transaction.on_commit(lambda: authentication.set_version(pk, token_version, is_active))
+
+
+@receiver(post_delete, sender=User)
+def forget_token_version(sender, instance, **kwargs):
+    authentication.forget_version(instance.pk)
+
+
+# Refresh token blacklist filter
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, created, raw=False, **kwargs):
+    # Not deferred to commit: a rolled back entry only costs a false positive
+    if created and not raw and tokens.enabled():
+        tokens.blacklist_filter.add(instance.token.jti)
@@ -1,7 +1,30 @@
+import csv
+import json
+import re
+import sqlite3
+import tempfile
+import threading
+import unittest
+import uuid
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Sum
 from django.urls import reverse
+from django.utils import timezone
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import (
     User,
@@ -10,10 +33,39 @@ from .models import (
     Quiz,
     Question,
     StudentProgress,
-    EnrollmentRequest
+    CourseRating,
+    CourseStats,
+    ChapterScore,
+    QuizAttempt,
+    EnrollmentRequest,
+    TeacherDashboardSnapshot,
+    CourseDailyRollup
+)
+from . import (
+    attempts, authentication, benchmarks, caching, concurrency, dashboard, exports, grading, hashing, profiling,
+    rollups, routing, timeseries, tokens)
+from .views import (
+    CourseViewSet,
+    StudentProgressViewSet,
+    EnrollmentRequestViewSet,
+    TeacherDashboardAPI,
+    CourseAnalyticsAPI
 )
 
 
+def setUpModule():
+    # Keep the suite's profile dumps out of the source tree
+    directory = tempfile.TemporaryDirectory()
+    profiling_settings = override_settings(PROFILING={**settings.PROFILING, 'DUMP_DIR': directory.name})
+    profiling_settings.enable()
+    unittest.addModuleCleanup(directory.cleanup)
+    unittest.addModuleCleanup(profiling_settings.disable)
+    # Dashboard refreshes are run by the tests rather than a background thread
+    dashboard_settings = override_settings(DASHBOARD_SNAPSHOTS={'REFRESH_INTERVAL': None})
+    dashboard_settings.enable()
+    unittest.addModuleCleanup(dashboard_settings.disable)
+
+
 class AuthTests(APITestCase):
 
     def setUp(self):
@@ -127,6 +179,289 @@ class AuthTests(APITestCase):
                       status.HTTP_200_OK, status.HTTP_204_NO_CONTENT])
 
 
+@override_settings(CACHE_SHARED=True)
+class ClaimsAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(# type: ignore
+            email='student@example.com', password='password', role='student')
+        response = self.client.post(
+            reverse('login'), {'email': 'student@example.com', 'password': 'password'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])# type: ignore
+
+    def user_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in queries if 'FROM "api_user"' in query['sql']]
+
+    def test_scoped_reads_skip_the_user_lookup(self):
+        self.user_queries(reverse('progress-list'))
+        self.assertEqual(self.user_queries(reverse('progress-list')), [])
+        self.assertEqual(self.user_queries(reverse('enrollment-requests-list')), [])
+
+    def test_submit_records_the_attempt_from_the_claims(self):
+        course = Course.objects.create(
+            title='Course', teacher=User.objects.create(email='t@example.com', role='teacher'), estimated_hours=1)
+        quiz = Quiz.objects.create(course=course, title='Quiz')
+        url = reverse('quizzes-submit', kwargs={'pk': quiz.pk})
+        self.client.post(url, {'answers': {}}, format='json')
+        authentication.user_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'answers': {}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries if 'FROM "api_user"' in query['sql']])
+        self.assertEqual(QuizAttempt.objects.filter(student=self.user).count(), 2)
+
+    def test_full_user_is_cached_by_version(self):
+        # The version check loads the row itself, then neither is needed
+        self.assertEqual(len(self.user_queries(reverse('user'))), 1)
+        response = self.client.get(reverse('user'))
+        self.assertEqual(response.data['email'], 'student@example.com')# type: ignore
+        self.assertEqual(self.user_queries(reverse('user')), [])
+
+    def test_role_change_and_deactivation_revoke_tokens(self):
+        self.client.get(reverse('progress-list'))
+        self.user.first_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get(reverse('progress-list')).status_code, status.HTTP_200_OK)
+
+        self.user.role = 'teacher'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.user.token_version, 1)
+        self.assertEqual(self.client.get(reverse('progress-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials()# type: ignore
+        response = self.client.post(
+            reverse('login'), {'email': 'student@example.com', 'password': 'password'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])# type: ignore
+        self.assertEqual(self.client.get(reverse('teacher_dashboard')).status_code, status.HTTP_200_OK)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['is_active'])
+        self.assertEqual(self.client.get(reverse('progress-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_per_process_versions_expire_quickly(self):
+        with override_settings(CACHE_SHARED=False):
+            self.client.get(reverse('progress-list'))
+            self.assertEqual(self.user_queries(reverse('progress-list')), [])
+
+            # Revoked by another worker, whose cache this process cannot see
+            User.objects.filter(pk=self.user.pk).update(token_version=1)
+            self.assertEqual(self.client.get(reverse('progress-list')).status_code, status.HTTP_200_OK)
+            with override_settings(AUTH_USER_CACHE={**settings.AUTH_USER_CACHE, 'LOCAL_VERSION_TIMEOUT': 0}):
+                self.assertEqual(
+                    self.client.get(reverse('progress-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_per_process_versions_follow_saves_at_once(self):
+        with override_settings(CACHE_SHARED=False):
+            self.client.get(reverse('progress-list'))
+            self.user.is_active = False
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.save()
+            self.assertEqual(self.client.get(reverse('progress-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tokens_without_claims_fall_back_to_the_lookup(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')# type: ignore
+        self.assertEqual(len(self.user_queries(reverse('progress-list'))), 1)
+
+
+@override_settings(CACHE_SHARED=True)
+class TokenBlacklistTests(APITestCase):
+
+    def setUp(self):
+        tokens.blacklist_filter.clear()
+        self.user = User.objects.create_user(# type: ignore
+            email='student@example.com', password='password', role='student')
+        response = self.client.post(
+            reverse('login'), {'email': 'student@example.com', 'password': 'password'}, format='json')
+        self.refresh = response.data['refresh']# type: ignore
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])# type: ignore
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = tokens.BloomFilter(1000, 0.01)
+        values = [uuid.uuid4().hex for _ in range(1000)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(2000))
+        self.assertLess(false_positives, 100)
+
+    def test_clean_refresh_tokens_skip_the_blacklist_query(self):
+        tokens.blacklist_filter.current()
+        with self.assertNumQueries(0):
+            tokens.RefreshToken(self.refresh)
+
+    def test_per_process_filter_skips_the_query_too(self):
+        with override_settings(CACHE_SHARED=False):
+            tokens.blacklist_filter.current()
+            with self.assertNumQueries(0):
+                tokens.RefreshToken(self.refresh)
+
+    def test_per_process_filter_catches_up_with_other_workers(self):
+        with override_settings(CACHE_SHARED=False):
+            tokens.blacklist_filter.current()
+            # Blacklisted by another worker: no signal reaches this process
+            token = OutstandingToken.objects.get(jti=RefreshToken(self.refresh, verify=False)['jti'])
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token)])
+            self.assertTrue(tokens.blacklist_filter.excludes(token.jti))
+            with override_settings(TOKEN_BLACKLIST_FILTER={**settings.TOKEN_BLACKLIST_FILTER, 'CATCH_UP_INTERVAL': 0}):
+                response = self.client.post(reverse('token_refresh'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rotated_and_logged_out_tokens_are_rejected(self):
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rotated = response.data['refresh']# type: ignore
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.post(reverse('logout'), {'refresh': rotated}, format='json')
+        response = self.client.post(reverse('token_refresh'), {'refresh': rotated}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rebuilt_filter_includes_existing_blacklist(self):
+        RefreshToken(self.refresh).blacklist()
+        tokens.blacklist_filter.clear()
+        cache.clear()
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_prune_command_removes_only_expired_tokens(self):
+        expired = [RefreshToken.for_user(self.user) for _ in range(3)]
+        for token in expired[:2]:
+            token.blacklist()
+        OutstandingToken.objects.filter(jti__in=[token['jti'] for token in expired]).update(
+            expires_at=timezone.now() - timedelta(days=1))
+        RefreshToken(self.refresh).blacklist()
+
+        out = StringIO()
+        call_command('prune_tokens', batch_size=2, stdout=out)
+        self.assertIn('Pruned 3 outstanding and 2 blacklisted tokens', out.getvalue())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertEqual(BlacklistedToken.objects.get().token.jti, RefreshToken(self.refresh, verify=False)['jti'])
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+        **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates}})
+
+
+class LoginThrottleTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        hashing.pool.reset()
+        User.objects.create_user(# type: ignore
+            email='student@example.com', password='password', role='student')
+
+    def login(self, password='password', email='student@example.com'):
+        return self.client.post(reverse('login'), {'email': email, 'password': password}, format='json')
+
+    def test_email_bucket_is_spent_by_failures_before_hashing(self):
+        with throttle_rates(login_email='2/min'):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+            self.assertEqual(self.login('wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(self.login('wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+            hashed = hashing.stats()['completed']
+            response = self.login()
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(hashing.stats()['completed'], hashed)
+            self.assertIn('Retry-After', response)
+            # Other accounts are unaffected
+            self.assertEqual(self.login(email='other@example.com').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_ip_bucket_is_spent_by_every_attempt(self):
+        with throttle_rates(login_ip='3/min'):
+            for _ in range(3):
+                self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+            self.assertEqual(self.login().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_full_hashing_queue_sheds_logins(self):
+        release = threading.Event()
+        with override_settings(PASSWORD_HASHING={'WORKERS': 1, 'MAX_QUEUE': 0}):
+            busy = threading.Thread(target=hashing.pool.run, args=(release.wait,))
+            busy.start()
+            try:
+                while hashing.stats()['running'] < 1:
+                    time.sleep(0.01)
+                response = self.login()
+            finally:
+                release.set()
+                busy.join()
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(hashing.stats()['rejected'], 1)
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+
+class ReplicaRoutingTests(APITransactionTestCase):
+    """The replica mirrors the test database; queries are told apart by connection"""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.course = Course.objects.create(title='Course', teacher=self.teacher, estimated_hours=1)
+        self.client.force_authenticate(user=self.teacher)# type: ignore
+        self.analytics_url = reverse('course_analytics', kwargs={'course_id': self.course.pk})
+
+    def replica_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def test_replica_is_off_by_default(self):
+        self.assertEqual(self.replica_queries('get', self.analytics_url), 0)
+
+    @override_settings(DATABASE_REPLICA={'ENABLED': True, 'STICKY_SECONDS': 10})
+    def test_annotated_reads_use_the_replica_until_the_user_writes(self):
+        self.assertGreater(self.replica_queries('get', self.analytics_url), 0)
+        self.assertGreater(self.replica_queries('get', reverse('courses-list')), 0)
+        self.assertEqual(self.replica_queries('get', reverse('progress-list')), 0)
+        self.assertEqual(self.replica_queries('get', reverse('teacher_dashboard') + '?refresh=true'), 0)
+
+        self.assertEqual(self.replica_queries('post', reverse('courses-list'), {
+            'title': 'Another', 'description': '...', 'estimated_hours': 2}), 0)
+        self.assertEqual(self.replica_queries('get', self.analytics_url), 0)
+
+        student = User.objects.create(email='student@example.com', role='student')
+        self.client.force_authenticate(user=student)# type: ignore
+        self.assertGreater(self.replica_queries('get', reverse('courses-list')), 0)
+
+    def test_reads_in_transactions_stay_on_the_primary(self):
+        router = routing.PrimaryReplicaRouter()
+        token = routing.use_replica()
+        try:
+            self.assertEqual(router.db_for_read(Course), 'replica')
+            self.assertEqual(router.db_for_write(Course), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Course), 'default')
+            self.assertEqual(list(routing.pinned(iter([1]))), [1])
+        finally:
+            routing.reset(token)
+        self.assertEqual(router.db_for_read(Course), 'default')
+
+    def test_copy_database_and_sync_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source, target = Path(directory) / 'primary.sqlite3', Path(directory) / 'replica.sqlite3'
+            with sqlite3.connect(source) as db:
+                db.execute('CREATE TABLE t (value INTEGER)')
+                db.executemany('INSERT INTO t VALUES (?)', [(i,) for i in range(100)])
+            routing.copy_database(str(source), str(target), pages=1)
+            with sqlite3.connect(target) as db:
+                self.assertEqual(db.execute('SELECT COUNT(*) FROM t').fetchone()[0], 100)
+        # Under test the replica mirrors the primary
+        with self.assertRaises(CommandError):
+            call_command('sync_replica', stdout=StringIO())
+
+
 class CourseTests(APITestCase):
 
     def setUp(self):
@@ -163,7 +498,7 @@ class CourseTests(APITestCase):
         self.client.force_authenticate(user=self.student)# type: ignore
         response = self.client.get(self.course_list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)# type: ignore
+        self.assertEqual(len(response.data['results']), 1)# type: ignore
 
     def test_retrieve_course(self):
         response = self.client.get(self.course_detail_url)
@@ -250,7 +585,7 @@ class ChapterTests(APITestCase):
     def test_list_chapters(self):
         response = self.client.get(self.chapter_list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)# type: ignore
+        self.assertEqual(len(response.data['results']), 1)# type: ignore
 
     def test_retrieve_chapter(self):
         response = self.client.get(self.chapter_detail_url)
@@ -373,13 +708,13 @@ class StudentProgressTests(APITestCase):
         self.client.force_authenticate(user=self.student)# type: ignore
         response = self.client.get(reverse('progress-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)# type: ignore
+        self.assertEqual(len(response.data['results']), 1)# type: ignore
 
     def test_list_progress_as_teacher(self):
         self.client.force_authenticate(user=self.teacher)# type: ignore
         response = self.client.get(reverse('progress-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)# type: ignore
+        self.assertEqual(len(response.data['results']), 1)# type: ignore
 
     def test_complete_chapter(self):
         self.client.force_authenticate(user=self.student)# type: ignore
@@ -412,6 +747,82 @@ class TeacherAPITests(APITestCase):
         response = self.client.get(reverse('teacher_dashboard'))
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_teacher_dashboard_totals(self):
+        other = Course.objects.create(title='Other', teacher=self.teacher, estimated_hours=1)
+        for course in (self.course, other):
+            EnrollmentRequest.objects.create(
+                student=self.student, course=course).approve(self.teacher)
+        StudentProgress.objects.filter(course=other).update(completed=True)
+        CourseStats.objects.filter(course=other).delete()
+        quiz = Quiz.objects.create(course=other, title='Quiz')
+        QuizAttempt.objects.create(
+            student=self.student, quiz=quiz, answers={}, score=75, time_taken=30)
+
+        self.client.force_authenticate(user=self.teacher)# type: ignore
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(response.data['statistics']['total_courses'], 2)# type: ignore
+        self.assertEqual(response.data['statistics']['total_students'], 1)# type: ignore
+        self.assertEqual(response.data['statistics']['completion_rate'], 50)# type: ignore
+        performance = {c['course_title']: c for c in response.data['course_performance']}# type: ignore
+        self.assertEqual(performance['Other']['completion_rate'], 100)
+        self.assertEqual(performance['Test Course']['enrollment_count'], 1)
+        activity = response.data['recent_activity']# type: ignore
+        self.assertEqual([(a['quiz_title'], a['score']) for a in activity], [('Quiz', 75)])
+
+    def test_dashboard_snapshot_follows_events(self):
+        self.client.force_authenticate(user=self.teacher)# type: ignore
+        first = self.client.get(reverse('teacher_dashboard')).data# type: ignore
+        self.assertEqual(first['statistics']['total_students'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            EnrollmentRequest.objects.create(
+                student=self.student, course=self.course).approve(self.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            quiz = Quiz.objects.create(course=self.course, title='Quiz')
+        # Writes only flag the dashboard, without rebuilding the snapshot
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            QuizAttempt.objects.create(
+                student=self.student, quiz=quiz, answers={}, score=90, time_taken=30)
+        self.assertEqual(
+            [q['sql'].split()[0] for q in queries if 'dashboardsnapshot' in q['sql']], ['UPDATE'])
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Course.objects.create(title='Other', teacher=self.teacher, estimated_hours=1)
+        snapshot = TeacherDashboardSnapshot.objects.get(teacher=self.teacher)
+        self.assertEqual(snapshot.data['statistics']['total_students'], 0)
+
+        self.assertEqual(dashboard.refresh_pending(), 1)
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.data['statistics']['total_students'], 1)
+        self.assertEqual(snapshot.data['statistics']['total_courses'], 2)
+        self.assertEqual(
+            [row['enrollment_count'] for row in snapshot.data['course_performance']], [1, 0])
+        self.assertEqual(snapshot.data['recent_activity'][0]['score'], 90)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(dashboard.refresh_pending(), 1)
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(response.data['statistics']['total_courses'], 1)# type: ignore
+        self.assertNotIn('counters', response.data['course_performance'][0])# type: ignore
+        self.assertEqual(dashboard.refresh_pending(), 0)
+
+    def test_dashboard_refresh_recomputes(self):
+        self.client.force_authenticate(user=self.teacher)# type: ignore
+        self.client.get(reverse('teacher_dashboard'))
+        # Bulk writes skip the signals that keep snapshots current
+        Course.objects.bulk_create([Course(title='Bulk', teacher=self.teacher, estimated_hours=1)])
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(response.data['statistics']['total_courses'], 1)# type: ignore
+        response = self.client.get(reverse('teacher_dashboard') + '?refresh=true')
+        self.assertEqual(response.data['statistics']['total_courses'], 2)# type: ignore
+
+        Course.objects.bulk_create([Course(title='Later', teacher=self.teacher, estimated_hours=1)])
+        out = StringIO()
+        call_command('refresh_dashboards', stdout=out)
+        self.assertIn('Refreshed 1 dashboards', out.getvalue())
+        snapshot = TeacherDashboardSnapshot.objects.get(teacher=self.teacher)
+        self.assertEqual(snapshot.data['statistics']['total_courses'], 3)
+
     def test_course_analytics_access_teacher(self):
         self.client.force_authenticate(user=self.teacher)# type: ignore
         response = self.client.get(
@@ -423,3 +834,1172 @@ class TeacherAPITests(APITestCase):
         response = self.client.get(
             reverse('course_analytics', kwargs={'course_id': self.course.pk}))
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CourseStatsTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(# type: ignore
+            email='teacher@example.com', password='password', role='teacher')
+        self.student = User.objects.create_user(# type: ignore
+            email='student@example.com', password='password', role='student')
+        self.course = Course.objects.create(
+            title='Test Course', teacher=self.teacher, estimated_hours=1)
+        self.chapter = Chapter.objects.create(
+            course=self.course, title='Test Chapter', order=1, content='...')
+
+    def enroll(self):
+        EnrollmentRequest.objects.create(
+            student=self.student, course=self.course).approve(self.teacher)
+        return StudentProgress.objects.get(student=self.student, course=self.course)
+
+    def test_stats_created_with_course(self):
+        self.assertTrue(CourseStats.objects.filter(course=self.course).exists())
+
+    def test_approve_updates_counts(self):
+        self.enroll()
+        stats = CourseStats.objects.get(course=self.course)
+        self.assertEqual(stats.enrollment_count, 1)
+        self.assertEqual(stats.progress_count, 1)
+
+    def test_rate_updates_sum_and_count(self):
+        self.client.force_authenticate(user=self.student)# type: ignore
+        url = reverse('courses-rate', kwargs={'pk': self.course.pk})
+        self.client.post(url, {'rating': 2}, format='json')
+        self.client.post(url, {'rating': 4}, format='json')
+        stats = CourseStats.objects.get(course=self.course)
+        self.assertEqual((stats.rating_sum, stats.rating_count), (4, 1))
+        self.assertEqual(Course.objects.get(pk=self.course.pk).average_rating, 4)
+
+    def test_complete_and_dismiss_update_counts(self):
+        progress = self.enroll()
+        self.client.force_authenticate(user=self.student)# type: ignore
+        self.client.post(
+            reverse('progress-complete-chapter', kwargs={'pk': progress.pk}),
+            {'chapter_id': self.chapter.pk}, format='json')
+        self.assertEqual(CourseStats.objects.get(course=self.course).completion_count, 1)
+
+        self.client.force_authenticate(user=self.teacher)# type: ignore
+        self.client.post(
+            reverse('courses-dismiss-student', kwargs={'pk': self.course.pk}),
+            {'student_id': str(self.student.pk)}, format='json')
+        stats = CourseStats.objects.get(course=self.course)
+        self.assertEqual(
+            (stats.enrollment_count, stats.progress_count, stats.completion_count), (0, 0, 0))
+
+    def test_writes_outside_the_api_update_counts(self):
+        # As the admin does them, without the views
+        self.course.enrolled_students.add(self.student)
+        rating = CourseRating.objects.create(course=self.course, student=self.student, rating=4)
+        course = Course.objects.get(pk=self.course.pk)
+        self.assertEqual((course.enrollment_count, course.average_rating), (1, 4))
+
+        rating.rating = 2
+        rating.save()
+        self.student.enrolled_courses.clear()
+        stats = CourseStats.objects.get(course=self.course)
+        self.assertEqual((stats.enrollment_count, stats.rating_sum, stats.rating_count), (0, 2, 1))
+
+        self.enroll()
+        self.student.delete()
+        stats = CourseStats.objects.get(course=self.course)
+        self.assertEqual(
+            [getattr(stats, name) for name in CourseStats.COUNTERS], [0] * len(CourseStats.COUNTERS))
+
+    def test_missing_stats_are_computed_on_read(self):
+        self.enroll()
+        CourseStats.objects.filter(course=self.course).delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(Course.objects.get(pk=self.course.pk).enrollment_count, 1)
+        self.assertFalse(any(query['sql'].startswith(('INSERT', 'UPDATE')) for query in queries))
+        self.assertFalse(CourseStats.objects.filter(course=self.course).exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        self.enroll()
+        CourseStats.objects.filter(course=self.course).update(enrollment_count=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_course_stats', '--check', stdout=StringIO())
+        call_command('rebuild_course_stats', stdout=StringIO())
+        call_command('rebuild_course_stats', '--check', stdout=StringIO())
+        self.assertEqual(CourseStats.objects.get(course=self.course).enrollment_count, 1)
+
+
+class CourseCatalogTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(# type: ignore
+            email='teacher@example.com', password='password', role='teacher')
+        self.student = User.objects.create_user(# type: ignore
+            email='student@example.com', password='password', role='student')
+        self.course = Course.objects.create(
+            title='Test Course', teacher=self.teacher, estimated_hours=1)
+        self.chapter = Chapter.objects.create(
+            course=self.course, title='Test Chapter', order=1, content='Long content')
+        self.quiz = Quiz.objects.create(
+            course=self.course, chapter=self.chapter, title='Chapter Quiz')
+        Question.objects.create(
+            quiz=self.quiz, question='1+1=', correct_answer=1, options=['1', '2'])
+        self.client.force_authenticate(user=self.student)# type: ignore
+
+    def test_list_returns_summary(self):
+        response = self.client.get(reverse('courses-list'))
+        course = response.data['results'][0]# type: ignore
+        self.assertEqual(course['chapter_count'], 1)
+        self.assertEqual(course['teacher_name'], self.teacher.name)
+        self.assertNotIn('chapters', course)
+        self.assertNotIn('enrolled_students', course)
+
+    def test_list_expand_chapters_and_quizzes(self):
+        response = self.client.get(
+            reverse('courses-list'), {'expand': 'chapters,quizzes'})
+        course = response.data['results'][0]# type: ignore
+        self.assertEqual(course['chapters'][0]['content'], 'Long content')
+        self.assertNotIn('quiz', course['chapters'][0])
+        self.assertEqual(len(course['quizzes'][0]['questions']), 1)
+
+    def test_retrieve_returns_full_tree(self):
+        response = self.client.get(
+            reverse('courses-detail', kwargs={'pk': self.course.pk}))
+        chapter = response.data['chapters'][0]# type: ignore
+        self.assertEqual(len(chapter['quiz']['questions']), 1)
+
+
+class CatalogCacheTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.student = User.objects.create(email='student@example.com', role='student')
+        self.course = Course.objects.create(
+            title='Cached Course', teacher=self.teacher, estimated_hours=1)
+        self.chapter = Chapter.objects.create(
+            course=self.course, title='Chapter', order=1, content='...')
+        self.quiz = Quiz.objects.create(
+            course=self.course, chapter=self.chapter, title='Quiz')
+        self.question = Question.objects.create(
+            quiz=self.quiz, question='1+1=', correct_answer=1, options=['1', '2'])
+        self.client.force_authenticate(user=self.student)# type: ignore
+        self.detail_url = reverse('courses-detail', kwargs={'pk': self.course.pk})
+
+    def test_warm_reads_skip_the_tree(self):
+        self.client.get(reverse('courses-list'))
+        self.client.get(self.detail_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('courses-list'))
+            self.client.get(self.detail_url)
+        self.assertEqual(response.data['results'][0]['title'], 'Cached Course')# type: ignore
+        # The list's page query carries its validators; the detail needs a
+        # validator query and an id lookup
+        self.assertEqual(len(queries), 3)
+
+    def test_writes_invalidate_cached_course(self):
+        self.client.get(reverse('courses-list'))
+        self.client.get(self.detail_url)
+
+        self.question.question = '2+2='
+        self.question.save()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(
+            response.data['chapters'][0]['quiz']['questions'][0]['question'], '2+2=')# type: ignore
+
+        Chapter.objects.create(course=self.course, title='Second', order=2, content='...')
+        response = self.client.get(reverse('courses-list'))
+        self.assertEqual(response.data['results'][0]['chapter_count'], 2)# type: ignore
+
+        self.course.enrolled_students.add(self.student)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(len(response.data['enrolled_students']), 1)# type: ignore
+
+        self.student.enrolled_courses.clear()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['enrolled_students'], [])# type: ignore
+
+    def test_teacher_and_stats_changes_invalidate_cached_course(self):
+        self.client.get(reverse('courses-list'))
+        self.client.get(self.detail_url)
+
+        self.teacher.first_name = 'Ada'
+        self.teacher.save()
+        response = self.client.get(reverse('courses-list'))
+        self.assertEqual(response.data['results'][0]['teacher_name'], 'Ada')# type: ignore
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['teacher']['first_name'], 'Ada')# type: ignore
+
+        before = caching.stats()['invalidations']
+        self.teacher.last_login = timezone.now()
+        self.teacher.save(update_fields=['last_login'])
+        self.assertEqual(caching.stats()['invalidations'], before)
+
+        CourseStats.objects.filter(course=self.course).update(enrollment_count=5)
+        caching.invalidate_course(self.course.pk)
+        self.assertEqual(self.client.get(self.detail_url).data['enrollment_count'], 5)# type: ignore
+        call_command('rebuild_course_stats', stdout=StringIO())
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['enrollment_count'], 0)# type: ignore
+
+    def test_stats_count_hits_and_misses(self):
+        before = caching.stats()
+        self.client.get(self.detail_url)
+        self.client.get(self.detail_url)
+        after = caching.stats()
+        self.assertEqual(after['detail']['misses'] - before['detail']['misses'], 1)
+        self.assertEqual(after['detail']['hits'] - before['detail']['hits'], 1)
+
+        admin = User.objects.create(email='admin@example.com', is_staff=True)
+        self.client.force_authenticate(user=admin)# type: ignore
+        response = self.client.get(reverse('cache_stats'))
+        self.assertIn('hit_rate', response.data['summary'])# type: ignore
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.student = User.objects.create(email='student@example.com', role='student')
+        self.course = Course.objects.create(
+            title='Course', teacher=self.teacher, estimated_hours=1)
+        self.chapter = Chapter.objects.create(
+            course=self.course, title='Chapter', order=1, content='...')
+        self.quiz = Quiz.objects.create(
+            course=self.course, chapter=self.chapter, title='Quiz')
+        self.question = Question.objects.create(
+            quiz=self.quiz, question='1+1=', correct_answer=1, options=['1', '2'])
+        self.client.force_authenticate(user=self.student)# type: ignore
+
+    def assertRevalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        return etag
+
+    def test_resources_answer_304_when_unchanged(self):
+        for url in (
+            reverse('courses-list'),
+            reverse('courses-detail', kwargs={'pk': self.course.pk}),
+            reverse('chapters-detail', kwargs={'pk': self.chapter.pk}),
+            reverse('quizzes-list'),
+            reverse('quizzes-detail', kwargs={'pk': self.quiz.pk}),
+            reverse('questions-detail', kwargs={'pk': self.question.pk}),
+        ):
+            with self.subTest(url=url):
+                self.assertRevalidates(url)
+
+    def test_304_skips_serialization(self):
+        url = reverse('courses-detail', kwargs={'pk': self.course.pk})
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(queries), 1)
+
+    def test_nested_changes_change_the_etag(self):
+        url = reverse('courses-detail', kwargs={'pk': self.course.pk})
+        chapter_url = reverse('chapters-detail', kwargs={'pk': self.chapter.pk})
+        etag = self.assertRevalidates(url)
+        chapter_etag = self.assertRevalidates(chapter_url)
+
+        self.question.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.get(chapter_url, HTTP_IF_NONE_MATCH=chapter_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_validators_come_with_the_page(self):
+        url = reverse('quizzes-list')
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 1)
+
+        Question.objects.create(
+            quiz=self.quiz, question='2+2=', correct_answer=0, options=['4'], order=2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_missing_object_is_not_found(self):
+        response = self.client.get(
+            reverse('quizzes-detail', kwargs={'pk': self.chapter.pk}),
+            HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class GradingTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.student = User.objects.create(email='student@example.com', role='student')
+        course = Course.objects.create(title='Course', teacher=self.teacher, estimated_hours=1)
+        self.quiz = Quiz.objects.create(course=course, title='Final', passing_score=50)
+        self.questions = [
+            Question.objects.create(
+                quiz=self.quiz, question=f'Q{i}', correct_answer=i % 2,
+                options=['a', 'b'], points=i + 1, order=i)
+            for i in range(4)
+        ]
+        self.url = reverse('quizzes-submit', kwargs={'pk': self.quiz.pk})
+        self.client.force_authenticate(user=self.student)# type: ignore
+
+    def test_answer_key_grades_weighted_points(self):
+        answer_key = grading.get_answer_key(self.quiz.pk)
+        answers = {str(q.id): q.correct_answer for q in self.questions[2:]}
+        answers[str(self.questions[0].id)] = 'not a number'
+        grade = answer_key.grade(answers)
+        self.assertEqual(grade.correct_answers, 2)
+        self.assertEqual(grade.total_questions, 4)
+        self.assertEqual(grade.score, 7 / 10 * 100)
+        self.assertTrue(grade.passed)
+
+    def test_submit_reads_no_questions_once_compiled(self):
+        answers = {str(q.id): q.correct_answer for q in self.questions}
+        self.client.post(self.url, {'answers': answers}, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'answers': answers}, format='json')
+        self.assertEqual(response.data['score'], 100)# type: ignore
+        self.assertFalse([q for q in queries.captured_queries if 'api_question' in q['sql']])
+        self.assertEqual(QuizAttempt.objects.filter(quiz=self.quiz).count(), 2)
+
+    def test_question_changes_rebuild_the_key(self):
+        answers = {str(q.id): q.correct_answer for q in self.questions}
+        self.client.post(self.url, {'answers': answers}, format='json')
+        self.questions[3].correct_answer = 0
+        self.questions[3].save()
+        response = self.client.post(self.url, {'answers': answers}, format='json')
+        self.assertEqual(response.data['correct_answers'], 3)# type: ignore
+        self.questions[0].delete()
+        response = self.client.post(self.url, {'answers': answers}, format='json')
+        self.assertEqual(response.data['total_questions'], 3)# type: ignore
+
+    def test_unknown_quiz_is_not_found(self):
+        for pk in (self.teacher.pk, 'not-a-uuid'):
+            response = self.client.post(
+                reverse('quizzes-submit', kwargs={'pk': pk}), {'answers': {}}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BatchSubmitTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.student = User.objects.create(email='student@example.com', role='student')
+        self.course = Course.objects.create(title='Course', teacher=self.teacher, estimated_hours=1)
+        self.quizzes = []
+        for i in range(3):
+            quiz = Quiz.objects.create(course=self.course, title=f'Quiz {i}')
+            Question.objects.create(
+                quiz=quiz, question='1+1=', correct_answer=1, options=['1', '2'])
+            self.quizzes.append(quiz)
+        EnrollmentRequest.objects.create(
+            student=self.student, course=self.course).approve(self.teacher)
+        self.url = reverse('quizzes-submit-batch')
+        self.client.force_authenticate(user=self.student)# type: ignore
+
+    def submission(self, quiz, answer, **extra):
+        question = quiz.questions.get()
+        return {'quiz_id': str(quiz.pk), 'answers': {str(question.pk): answer},
+                'time_taken': 5, **extra}
+
+    def test_batch_grades_valid_items_and_reports_failures(self):
+        submissions = [
+            self.submission(self.quizzes[0], 1, client_timestamp='2026-01-05T10:00:00Z'),
+            self.submission(self.quizzes[1], 0),
+            {'quiz_id': str(uuid.uuid4()), 'answers': {}},
+            {'answers': 'nope'},
+            self.submission(self.quizzes[0], 0),
+        ]
+        response = self.client.post(self.url, {'submissions': submissions}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']# type: ignore
+        self.assertEqual(response.data['submitted'], 3)# type: ignore
+        self.assertEqual([r['status'] for r in results], ['ok', 'ok', 'error', 'error', 'ok'])
+        self.assertEqual(results[0]['score'], 100)
+        self.assertIn('quiz_id', results[2]['errors'])
+
+        self.assertEqual(QuizAttempt.objects.filter(student=self.student).count(), 3)
+        first = QuizAttempt.objects.get(quiz=self.quizzes[0], score=100)
+        self.assertEqual(first.started_at.isoformat(), '2026-01-05T10:00:00+00:00')
+        progress = StudentProgress.objects.get(student=self.student, course=self.course)
+        self.assertEqual(progress.quiz_scores, {
+            str(self.quizzes[0].pk): 100, str(self.quizzes[1].pk): 0})
+
+    def test_batch_uses_constant_queries_and_is_idempotent(self):
+        attempt_ids = [str(uuid.uuid4()) for _ in self.quizzes]
+        submissions = [
+            self.submission(quiz, 1, id=attempt_id)
+            for quiz, attempt_id in zip(self.quizzes, attempt_ids)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'submissions': submissions}, format='json')
+        # Answer keys, existing ids, the attempt insert, progress read and
+        # update, plus the transaction
+        self.assertLessEqual(len(queries), 7)
+        response = self.client.post(self.url, {'submissions': submissions}, format='json')
+        self.assertEqual(QuizAttempt.objects.count(), 3)
+        self.assertEqual((response.data['submitted'], response.data['duplicates']), (0, 3))# type: ignore
+        self.assertEqual({r['status'] for r in response.data['results']}, {'duplicate'})# type: ignore
+
+    def test_ids_of_other_students_attempts_conflict(self):
+        other = User.objects.create(email='other@example.com', role='student')
+        taken = QuizAttempt.objects.create(
+            student=other, quiz=self.quizzes[0], answers={}, score=0, time_taken=1)
+        fresh = str(uuid.uuid4())
+        submissions = [
+            self.submission(self.quizzes[0], 1, id=str(taken.pk)),
+            self.submission(self.quizzes[1], 1, id=fresh),
+            self.submission(self.quizzes[1], 1, id=fresh),
+        ]
+        response = self.client.post(self.url, {'submissions': submissions}, format='json')
+        self.assertEqual(
+            [r['status'] for r in response.data['results']], ['conflict', 'ok', 'duplicate'])# type: ignore
+        self.assertEqual(
+            (response.data['submitted'], response.data['duplicates'], response.data['failed']), (1, 1, 1))# type: ignore
+        taken.refresh_from_db()
+        self.assertEqual(taken.student, other)
+        progress = StudentProgress.objects.get(student=self.student, course=self.course)
+        self.assertEqual(progress.quiz_scores, {str(self.quizzes[1].pk): 100})
+
+    def test_batch_size_is_limited(self):
+        submissions = [self.submission(self.quizzes[0], 1)] * 101
+        response = self.client.post(self.url, {'submissions': submissions}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AttemptJournalTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.student = User.objects.create(email='student@example.com', role='student')
+        course = Course.objects.create(title='Course', teacher=self.teacher, estimated_hours=1)
+        self.quiz = Quiz.objects.create(course=course, title='Final')
+        self.question = Question.objects.create(
+            quiz=self.quiz, question='1+1=', correct_answer=1, options=['1', '2'])
+        self.client.force_authenticate(user=self.student)# type: ignore
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        self.journal_dir = journal_dir.name
+        settings = override_settings(QUIZ_ATTEMPTS={
+            'WRITE_BEHIND': True, 'JOURNAL_DIR': self.journal_dir, 'FLUSH_INTERVAL': None})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def entry(self, **overrides):
+        entry = {
+            'id': str(uuid.uuid4()), 'student_id': str(self.student.pk),
+            'quiz_id': str(self.quiz.pk), 'answers': {}, 'score': 50,
+            'time_taken': 3, 'started_at': '2026-01-05T10:00:00+00:00',
+        }
+        entry.update(overrides)
+        return entry
+
+    def test_submit_is_journaled_then_flushed(self):
+        response = self.client.post(
+            reverse('quizzes-submit', kwargs={'pk': self.quiz.pk}),
+            {'answers': {str(self.question.pk): 1}, 'time_taken': 4}, format='json')
+        self.assertEqual(response.data['score'], 100)# type: ignore
+        self.assertFalse(QuizAttempt.objects.exists())
+
+        self.assertEqual(attempts.get_journal().flush(), 1)
+        attempt = QuizAttempt.objects.get()
+        self.assertEqual((attempt.score, attempt.time_taken), (100, 4))
+        self.assertLess(attempt.started_at, timezone.now())
+        self.assertEqual(attempts.get_journal().pending_segments(), [])
+
+    def test_replay_recovers_dead_process_segments_once(self):
+        path = Path(self.journal_dir) / 'attempts-999999999.jsonl'
+        first, orphan = self.entry(), self.entry(quiz_id=str(uuid.uuid4()))
+        lines = [json.dumps(first), json.dumps(orphan), '{"id": "torn']
+        path.write_text('\n'.join(lines))
+        copy = Path(self.journal_dir) / 'attempts-999999999-1.ready'
+        copy.write_text(json.dumps(first) + '\n')
+
+        out = StringIO()
+        with self.assertLogs('api.attempts', 'WARNING'):
+            call_command('replay_attempts', stdout=out)
+        self.assertIn('Replayed 2 attempts from 2 journal segments', out.getvalue())
+        attempt = QuizAttempt.objects.get()
+        self.assertEqual(str(attempt.pk), first['id'])
+        self.assertEqual(attempt.started_at.isoformat(), first['started_at'])
+        # Only the torn line is kept, set aside
+        quarantine = Path(self.journal_dir) / 'attempts-999999999.quarantine'
+        self.assertEqual(list(Path(self.journal_dir).iterdir()), [quarantine])
+        self.assertEqual(quarantine.read_text(), '{"id": "torn\n')
+
+    def test_submit_validates_before_journaling(self):
+        url = reverse('quizzes-submit', kwargs={'pk': self.quiz.pk})
+        for body in ({'time_taken': 'abc'}, {'time_taken': -1}, {'answers': ['1']}):
+            response = self.client.post(url, body, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Path(self.journal_dir).exists() and any(Path(self.journal_dir).iterdir()))
+
+    def test_flush_quarantines_refused_rows(self):
+        good, bad = self.entry(), self.entry(time_taken='abc')
+        stuck = Path(self.journal_dir) / 'attempts-999999999-1.ready'
+        stuck.write_text(json.dumps(bad) + '\n' + json.dumps(good) + '\n')
+        later = self.entry()
+        (Path(self.journal_dir) / 'attempts-999999999-2.ready').write_text(json.dumps(later) + '\n')
+
+        with self.assertLogs('api.attempts', 'WARNING'):
+            self.assertEqual(attempts.get_journal().flush(), 2)
+        self.assertEqual(
+            set(QuizAttempt.objects.values_list('pk', flat=True)), {uuid.UUID(good['id']), uuid.UUID(later['id'])})
+        self.assertEqual(attempts.get_journal().pending_segments(), [])
+        self.assertEqual(json.loads(attempts.quarantine_path(stuck).read_text()), bad)
+
+    def test_failed_segment_does_not_hold_up_later_ones(self):
+        # Unreadable as a file, so replaying it fails every time
+        broken = Path(self.journal_dir) / 'attempts-999999999-1.ready'
+        broken.mkdir()
+        (Path(self.journal_dir) / 'attempts-999999999-2.ready').write_text(json.dumps(self.entry()) + '\n')
+
+        with self.assertLogs('api.attempts', 'ERROR'):
+            self.assertEqual(attempts.get_journal().flush(), 1)
+        self.assertEqual(QuizAttempt.objects.count(), 1)
+        self.assertEqual(attempts.get_journal().pending_segments(), [broken])
+
+
+class CourseAnalyticsTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.course = Course.objects.create(title='Course', teacher=self.teacher, estimated_hours=1)
+        self.chapters = [
+            Chapter.objects.create(course=self.course, title=f'Chapter {i}', order=i, content='...')
+            for i in range(2)
+        ]
+        self.students = [
+            User.objects.create(email=f'student{i}@example.com', role='student') for i in range(3)
+        ]
+        for student in self.students:
+            EnrollmentRequest.objects.create(student=student, course=self.course).approve(self.teacher)
+        progress = StudentProgress.objects.filter(course=self.course).order_by('student__email')
+        ChapterScore.objects.create(progress=progress[0], chapter=self.chapters[0], score=80)
+        ChapterScore.objects.create(progress=progress[0], chapter=self.chapters[1], score=60)
+        ChapterScore.objects.create(progress=progress[1], chapter=self.chapters[0], score=100)
+        self.client.force_authenticate(user=self.teacher)# type: ignore
+
+    def test_performance_is_aggregated_from_chapter_scores(self):
+        response = self.client.get(
+            reverse('course_analytics', kwargs={'course_id': self.course.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        chapters = {c['chapter_title']: c for c in response.data['chapter_performance']}# type: ignore
+        self.assertEqual(chapters['Chapter 0']['average_score'], 90)
+        self.assertAlmostEqual(chapters['Chapter 0']['completion_rate'], 200 / 3)
+        self.assertEqual(chapters['Chapter 1']['average_score'], 60)
+
+        students = {s['student_name']: s for s in response.data['student_performance']}# type: ignore
+        first = students[self.students[0].name]
+        self.assertEqual((first['completed_chapters'], first['average_score']), (2, 70))
+        self.assertEqual(first['progress_percentage'], 100)
+        self.assertEqual(students[self.students[2].name]['average_score'], 0)
+        self.assertEqual(response.data['completion_rates']['in_progress'], 3)# type: ignore
+
+    def test_complete_chapter_records_a_score_row(self):
+        student = self.students[2]
+        progress = StudentProgress.objects.get(student=student, course=self.course)
+        self.client.force_authenticate(user=student)# type: ignore
+        url = reverse('progress-complete-chapter', kwargs={'pk': progress.pk})
+        self.client.post(url, {'chapter_id': str(self.chapters[1].pk), 'score': 40}, format='json')
+        self.client.post(url, {'chapter_id': str(self.chapters[1].pk), 'score': 55}, format='json')
+        self.assertEqual(
+            list(progress.chapter_results.values_list('score', flat=True)), [55])
+        response = self.client.post(
+            url, {'chapter_id': str(self.chapters[0].pk), 'score': 'lots'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('progress-detail', kwargs={'pk': progress.pk}))
+        self.assertEqual(response.data['completed_chapters'], [str(self.chapters[1].pk)])# type: ignore
+        self.assertEqual(response.data['chapter_scores'], {str(self.chapters[1].pk): 55})# type: ignore
+        progress.refresh_from_db()
+        self.assertEqual((progress.completed_chapter_count, progress.progress_percentage), (1, 50))
+
+    def counters(self):
+        return list(StudentProgress.objects.order_by('student__email').values_list(
+            'completed_chapter_count', 'total_chapter_count'))
+
+    def test_chapter_counters_follow_chapter_changes(self):
+        self.assertEqual(self.counters(), [(2, 2), (1, 2), (0, 2)])
+        with self.assertNumQueries(2):
+            Chapter.objects.create(course=self.course, title='Chapter 2', order=2, content='...')
+        self.assertEqual(self.counters(), [(2, 3), (1, 3), (0, 3)])
+        self.chapters[0].delete()
+        self.assertEqual(self.counters(), [(1, 2), (0, 2), (0, 2)])
+        progress = StudentProgress.objects.get(student=self.students[0])
+        progress.completed_chapters.clear()
+        self.assertEqual(self.counters(), [(0, 2), (0, 2), (0, 2)])
+
+        rows = list(StudentProgress.objects.all())
+        with self.assertNumQueries(0):
+            self.assertEqual([row.progress_percentage for row in rows], [0, 0, 0])
+
+    def test_rebuild_command_repairs_chapter_counters(self):
+        StudentProgress.objects.filter(student=self.students[0]).update(completed_chapter_count=9)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_course_stats', '--check', stdout=StringIO())
+        call_command('rebuild_course_stats', stdout=StringIO())
+        call_command('rebuild_course_stats', '--check', stdout=StringIO())
+        self.assertEqual(self.counters()[0], (2, 2))
+
+
+class TimeSeriesTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.course = Course.objects.create(title='Course', teacher=self.teacher, estimated_hours=1)
+        self.quiz = Quiz.objects.create(course=self.course, title='Quiz')
+        # Wednesday 2026-10-14 10:00 in Nairobi (UTC+3)
+        self.now = datetime(2026, 10, 14, 7, 0, tzinfo=dt_timezone.utc)
+
+    def enroll(self, email, enrolled_at, completed_at=None):
+        student = User.objects.create(email=email, role='student')
+        progress = StudentProgress.objects.create(student=student, course=self.course)
+        StudentProgress.objects.filter(pk=progress.pk).update(
+            enrolled_at=enrolled_at, completed=completed_at is not None, completed_at=completed_at)
+        return student
+
+    def test_bucket_edges_are_local_and_aligned(self):
+        weeks = timeseries.bucket_starts('week', 3, now=self.now)
+        self.assertEqual([str(start) for start in weeks], [
+            '2026-09-28 00:00:00+03:00', '2026-10-05 00:00:00+03:00',
+            '2026-10-12 00:00:00+03:00', '2026-10-19 00:00:00+03:00'])
+        months = timeseries.bucket_starts('month', 12, now=self.now)
+        self.assertEqual((months[0].date().isoformat(), months[-1].date().isoformat()),
+                         ('2025-11-01', '2026-11-01'))
+
+    def test_series_groups_each_metric_in_one_query(self):
+        # Sunday 23:30 in Nairobi, so the week starting 5 October
+        student = self.enroll('a@example.com', datetime(2026, 10, 11, 20, 30, tzinfo=dt_timezone.utc))
+        self.enroll('b@example.com', datetime(2026, 10, 12, 9, 0, tzinfo=dt_timezone.utc),
+                    completed_at=datetime(2026, 10, 13, 9, 0, tzinfo=dt_timezone.utc))
+        self.enroll('c@example.com', datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        QuizAttempt.objects.create(
+            student=student, quiz=self.quiz, answers={}, score=50, time_taken=10,
+            started_at=datetime(2026, 10, 13, tzinfo=dt_timezone.utc))
+
+        with self.assertNumQueries(3):
+            trends = timeseries.series(
+                Course.objects.filter(pk=self.course.pk), 'week', 3, now=self.now)
+        self.assertEqual(trends['period'], 'week')
+        self.assertEqual(
+            [(row['enrollments'], row['completions'], row['quiz_attempts']) for row in trends['buckets']],
+            [(0, 0, 0), (1, 0, 0), (1, 1, 1)])
+
+    def test_parse_window(self):
+        self.assertEqual(timeseries.parse_window({}), ('week', 12))
+        self.assertEqual(timeseries.parse_window({'period': 'day', 'buckets': '7'}), ('day', 7))
+        for params in ({'period': 'year'}, {'buckets': 'many'}, {'buckets': '0'}):
+            with self.assertRaises(ValueError):
+                timeseries.parse_window(params)
+
+    def test_course_analytics_window(self):
+        self.enroll('a@example.com', timezone.now())
+        self.client.force_authenticate(user=self.teacher)# type: ignore
+        url = reverse('course_analytics', kwargs={'course_id': self.course.pk})
+        response = self.client.get(url, {'period': 'day', 'buckets': 7})
+        trends = response.data['trends']# type: ignore
+        self.assertEqual((trends['period'], len(trends['buckets'])), ('day', 7))
+        self.assertEqual(trends['buckets'][-1]['enrollments'], 1)
+        # The original per-period list, newest first
+        self.assertEqual(response.data['enrollment_trends'][0], {'week': 'Day 7', 'enrollments': 1})# type: ignore
+        self.assertEqual(len(response.data['enrollment_trends']), 7)# type: ignore
+        response = self.client.get(url, {'period': 'fortnight'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(response.data['trends']['buckets'][-1]['enrollments'], 1)# type: ignore
+
+
+class RollupTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.course = Course.objects.create(title='Course', teacher=self.teacher, estimated_hours=1)
+        self.chapter = Chapter.objects.create(course=self.course, title='Chapter', order=1, content='...')
+        self.quiz = Quiz.objects.create(course=self.course, title='Quiz', passing_score=70)
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+
+    def at(self, day, hour=12):
+        return datetime.combine(day, time(hour), tzinfo=timezone.get_current_timezone())
+
+    def enroll(self, email, day):
+        student = User.objects.create(email=email, role='student')
+        progress = StudentProgress.objects.create(student=student, course=self.course)
+        StudentProgress.objects.filter(pk=progress.pk).update(enrolled_at=self.at(day))
+        return student, progress
+
+    def attempt(self, student, day, score):
+        QuizAttempt.objects.create(
+            student=student, quiz=self.quiz, answers={}, score=score, time_taken=5, started_at=self.at(day))
+
+    def test_backfill_and_incremental_runs(self):
+        three_days_ago = self.today - timedelta(days=3)
+        student, progress = self.enroll('a@example.com', three_days_ago)
+        self.attempt(student, three_days_ago, 90)
+        self.attempt(student, three_days_ago, 50)
+        ChapterScore.objects.create(
+            progress=progress, chapter=self.chapter, score=80, completed_at=self.at(three_days_ago, 18))
+        self.enroll('b@example.com', self.today)
+
+        first_day, last_day, written = rollups.run()
+        self.assertEqual((first_day, last_day, written), (three_days_ago, self.yesterday, 1))
+        row = CourseDailyRollup.objects.get()
+        self.assertEqual(
+            (row.day, row.enrollments, row.attempts, row.passed_attempts, row.average_score, row.active_students),
+            (three_days_ago, 1, 2, 1, 70, 1))
+        self.assertEqual(rollups.watermark(), self.yesterday)
+
+        # A late offline submission for an already rolled-up day
+        self.attempt(student, self.yesterday, 100)
+        self.assertEqual(rollups.run(), (self.yesterday - timedelta(days=1), self.yesterday, 1))
+        self.assertEqual(CourseDailyRollup.objects.get(day=self.yesterday).attempts, 1)
+        self.assertEqual(CourseDailyRollup.objects.count(), 2)
+
+        out = StringIO()
+        call_command('rollup_analytics', '--lookback', '0', stdout=out)
+        self.assertIn('up to date', out.getvalue())
+        call_command('rollup_analytics', '--backfill', stdout=out)
+        self.assertEqual(CourseDailyRollup.objects.count(), 2)
+
+    def test_series_merges_history_with_today(self):
+        student, _ = self.enroll('a@example.com', self.yesterday)
+        self.attempt(student, self.yesterday, 80)
+        rollups.run()
+        # Raw rows behind the watermark are no longer read
+        StudentProgress.objects.filter(student=student).update(enrolled_at=self.at(self.today))
+        other, _ = self.enroll('b@example.com', self.today)
+        self.attempt(other, self.today, 40)
+
+        with self.assertNumQueries(6):
+            trends = rollups.series(self.course, 'day', 2)
+        self.assertEqual(
+            [(row['enrollments'], row['quiz_attempts'], row['average_score'], row['active_student_days'])
+             for row in trends['buckets']],
+            [(1, 1, 80, 1), (2, 1, 40, 1)])
+
+        self.client.force_authenticate(user=self.teacher)# type: ignore
+        response = self.client.get(
+            reverse('course_analytics', kwargs={'course_id': self.course.pk}), {'period': 'day', 'buckets': 2})
+        self.assertEqual(response.data['trends']['buckets'][0]['passed_attempts'], 1)# type: ignore
+
+
+class ExportTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.course = Course.objects.create(title='Course', teacher=self.teacher, estimated_hours=1)
+        chapters = [
+            Chapter.objects.create(course=self.course, title=f'Chapter {i}', order=i, content='...')
+            for i in range(2)
+        ]
+        quiz = Quiz.objects.create(course=self.course, title='Quiz')
+        self.students = [
+            User.objects.create(email=f'student{i}@example.com', role='student', first_name=f'S{i}')
+            for i in range(3)
+        ]
+        for student in self.students:
+            EnrollmentRequest.objects.create(student=student, course=self.course).approve(self.teacher)
+        progress = StudentProgress.objects.get(student=self.students[0])
+        ChapterScore.objects.create(progress=progress, chapter=chapters[0], score=90)
+        ChapterScore.objects.create(progress=progress, chapter=chapters[1], score=70)
+        for score in (40, 80):
+            QuizAttempt.objects.create(
+                student=self.students[0], quiz=quiz, answers={}, score=score, time_taken=5)
+        self.url = reverse('student_performance_export', kwargs={'course_id': self.course.pk})
+
+    def test_rows_come_from_one_chunked_query(self):
+        with self.assertNumQueries(1):
+            rows = list(exports.performance_rows(self.course, chunk_size=1))
+        first = next(row for row in rows if row['student_email'] == 'student0@example.com')
+        self.assertEqual(
+            (first['student_name'], first['progress_percentage'], first['average_score'], first['quiz_attempts']),
+            ('S0', 100, 80, 2))
+        self.assertEqual(sorted(row['quiz_attempts'] for row in rows), [0, 0, 2])
+
+    def test_streams_csv_and_jsonl(self):
+        self.client.force_authenticate(user=self.teacher)# type: ignore
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()# type: ignore
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(list(rows[0]), list(exports.FIELDS))
+
+        response = self.client.get(self.url, {'export_format': 'jsonl'})
+        lines = b''.join(response.streaming_content).decode().splitlines()# type: ignore
+        self.assertEqual({json.loads(line)['student_email'] for line in lines},
+                         {student.email for student in self.students})
+
+        response = self.client.get(self.url, {'export_format': 'xlsx'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(user=self.students[0])# type: ignore
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'students.jsonl'
+            call_command(
+                'export_student_performance', str(self.course.pk), '--format', 'jsonl',
+                '--output', str(path), stderr=StringIO())
+            self.assertEqual(len(path.read_text().splitlines()), 3)
+        with self.assertRaises(CommandError):
+            call_command('export_student_performance', 'missing', stderr=StringIO())
+
+
+class ConcurrentSectionsTests(APITransactionTestCase):
+    """Worker connections only see committed rows, so these tests commit"""
+
+    def test_sections_use_the_pool_outside_transactions(self):
+        sections = {name: lambda: threading.current_thread().name for name in ('a', 'b')}
+        self.assertTrue(all(name.startswith('analytics') for name in concurrency.run_sections(sections).values()))
+        with transaction.atomic():
+            self.assertEqual(set(concurrency.run_sections(sections).values()), {threading.current_thread().name})
+        with override_settings(ANALYTICS_WORKERS=0):
+            self.assertEqual(set(concurrency.run_sections(sections).values()), {threading.current_thread().name})
+
+    def test_course_analytics_matches_sequential(self):
+        teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        course = Course.objects.create(title='Course', teacher=teacher, estimated_hours=1)
+        chapter = Chapter.objects.create(course=course, title='Chapter', order=1, content='...')
+        for i in range(3):
+            student = User.objects.create(email=f'student{i}@example.com', role='student')
+            EnrollmentRequest.objects.create(student=student, course=course).approve(teacher)
+            ChapterScore.objects.create(
+                progress=StudentProgress.objects.get(student=student), chapter=chapter, score=50 + i * 10)
+
+        self.client.force_authenticate(user=teacher)# type: ignore
+        url = reverse('course_analytics', kwargs={'course_id': course.pk})
+        concurrent = self.client.get(url)
+        with override_settings(ANALYTICS_WORKERS=0):
+            sequential = self.client.get(url)
+        self.assertEqual(concurrent.status_code, status.HTTP_200_OK)
+        self.assertEqual(concurrent.json(), sequential.json())
+        self.assertEqual(concurrent.json()['chapter_performance'][0]['average_score'], 60)
+
+    def test_pool_queries_count_towards_the_request_profile(self):
+        teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        course = Course.objects.create(title='Course', teacher=teacher, estimated_hours=1)
+        self.client.force_authenticate(user=teacher)# type: ignore
+        url = reverse('course_analytics', kwargs={'course_id': course.pk})
+
+        def queries(response):
+            return int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+
+        concurrent = self.client.get(url)
+        with override_settings(ANALYTICS_WORKERS=0):
+            sequential = self.client.get(url)
+        self.assertEqual(queries(concurrent), queries(sequential))
+
+
+class DashboardRefreshTests(APITransactionTestCase):
+    """Sections are only flagged once writes commit, so these tests commit"""
+
+    def test_stale_sections_are_flagged_and_refreshed(self):
+        teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        student = User.objects.create(email='student@example.com', role='student')
+        course = Course.objects.create(title='Course', teacher=teacher, estimated_hours=1)
+        quiz = Quiz.objects.create(course=course, title='Quiz')
+        self.client.force_authenticate(user=teacher)# type: ignore
+        self.client.get(reverse('teacher_dashboard'))
+        EnrollmentRequest.objects.create(student=student, course=course).approve(teacher)
+
+        # The flags are in the table, where every process sees them
+        snapshot = TeacherDashboardSnapshot.objects.get(teacher=teacher)
+        self.assertEqual((snapshot.courses_stale, snapshot.enrollments_stale, snapshot.activity_stale),
+                         (True, True, False))
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(response.json()['statistics']['total_students'], 0)
+
+        out = StringIO()
+        call_command('refresh_dashboards', '--stale', stdout=out)
+        self.assertIn('Refreshed 1 stale dashboards', out.getvalue())
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(response.json()['statistics']['total_students'], 1)
+
+        # Only the flagged section is recomputed
+        QuizAttempt.objects.create(student=student, quiz=quiz, answers={}, score=80, time_taken=5)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(dashboard.refresh_pending(), 1)
+        self.assertFalse([q for q in queries if 'api_studentprogress' in q['sql']])
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.data['recent_activity'][0]['score'], 80)
+        self.assertEqual(snapshot.data['statistics']['total_students'], 1)
+        self.assertFalse(snapshot.activity_stale)
+        self.assertEqual(dashboard.refresh_pending(), 0)
+
+
+class PaginationTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(# type: ignore
+            email='teacher@example.com', password='password', role='teacher')
+        self.course = Course.objects.create(
+            title='Test Course', teacher=self.teacher, estimated_hours=1)
+        for i in range(5):
+            student = User.objects.create(email=f'student{i}@example.com')
+            EnrollmentRequest.objects.create(student=student, course=self.course)
+        self.client.force_authenticate(user=self.teacher)# type: ignore
+
+    def collect(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)# type: ignore
+            seen.extend(item['id'] for item in response.data['results'])# type: ignore
+            url = response.data['next']# type: ignore
+        return seen
+
+    def test_enrollment_requests_walk_all_pages(self):
+        url = reverse('courses-enrollment-requests', kwargs={'pk': self.course.pk})
+        seen = self.collect(f'{url}?page_size=2')
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        latest = EnrollmentRequest.objects.order_by('-requested_at', '-id').first()
+        self.assertEqual(seen[0], latest.id)# type: ignore
+
+    def test_list_endpoint_is_paginated(self):
+        seen = self.collect(reverse('enrollment-requests-list') + '?page_size=2')
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_chapters_keep_the_authors_order(self):
+        chapters = {
+            order: Chapter.objects.create(course=self.course, title=f'Chapter {order}', order=order, content='...')
+            for order in (3, 1, 4, 2, 5)
+        }
+        seen = self.collect(reverse('chapters-list') + f'?course={self.course.pk}&page_size=2')
+        self.assertEqual(seen, [str(chapters[order].pk) for order in sorted(chapters)])
+
+    def test_questions_are_filtered_by_quiz(self):
+        quizzes = [Quiz.objects.create(course=self.course, title=f'Quiz {i}') for i in range(3)]
+        questions = {
+            (quiz.pk, order): Question.objects.create(
+                quiz=quiz, question='1+1=', correct_answer=1, options=['1', '2'], order=order)
+            for quiz in quizzes for order in (2, 0, 1)
+        }
+        seen = self.collect(reverse('questions-list') + f'?quiz={quizzes[1].pk}&page_size=2')
+        self.assertEqual(seen, [str(questions[quizzes[1].pk, order].pk) for order in range(3)])
+
+        # Orders repeat across quizzes, so the unfiltered list pages by creation
+        seen = self.collect(reverse('questions-list') + '?page_size=2')
+        self.assertEqual(sorted(seen), sorted(str(question.pk) for question in questions.values()))
+
+
+class QueryBudgetTests(APITestCase):
+    """Endpoints must stay within their declared query budget whatever the row count"""
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        self.student = User.objects.create(email='student@example.com', role='student')
+
+    def populate(self, count):
+        for i in range(count):
+            course = Course.objects.create(
+                title=f'Course {i}', teacher=self.teacher, estimated_hours=1)
+            chapter = Chapter.objects.create(
+                course=course, title='Chapter', order=1, content='...')
+            quiz = Quiz.objects.create(course=course, chapter=chapter, title='Quiz')
+            Question.objects.create(
+                quiz=quiz, question='1+1=', correct_answer=1, options=['1', '2'])
+            classmate = User.objects.create(
+                email=f'classmate{self.created}@example.com', role='student')
+            self.created += 1
+            for student in (self.student, classmate):
+                EnrollmentRequest.objects.create(
+                    student=student, course=course).approve(self.teacher)
+            StudentProgress.objects.get(
+                student=classmate, course=course).completed_chapters.add(chapter)
+            QuizAttempt.objects.create(
+                student=classmate, quiz=quiz, answers={}, score=50, time_taken=60)
+        return course
+
+    def assertWithinBudget(self, view, action, user, url):
+        budget = view.query_budgets[action]
+        self.client.force_authenticate(user=user)# type: ignore
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{view.__name__}.{action} ran {len(queries)} queries, budget is {budget}')
+
+    def check_budgets(self):
+        course = Course.objects.order_by('created_at').last()
+        self.assertWithinBudget(
+            CourseViewSet, 'list', self.student, reverse('courses-list'))
+        self.assertWithinBudget(
+            CourseViewSet, 'retrieve', self.student,
+            reverse('courses-detail', kwargs={'pk': course.pk}))# type: ignore
+        self.assertWithinBudget(
+            CourseViewSet, 'enrolled', self.student, reverse('courses-enrolled'))
+        self.assertWithinBudget(
+            CourseViewSet, 'students', self.teacher,
+            reverse('courses-students', kwargs={'pk': course.pk}))# type: ignore
+        self.assertWithinBudget(
+            CourseViewSet, 'enrollment_requests', self.teacher,
+            reverse('courses-enrollment-requests', kwargs={'pk': course.pk}))# type: ignore
+        self.assertWithinBudget(
+            StudentProgressViewSet, 'list', self.teacher, reverse('progress-list'))
+        self.assertWithinBudget(
+            EnrollmentRequestViewSet, 'list', self.teacher,
+            reverse('enrollment-requests-list'))
+        self.assertWithinBudget(
+            TeacherDashboardAPI, 'refresh', self.teacher, reverse('teacher_dashboard') + '?refresh=true')
+        self.assertWithinBudget(
+            TeacherDashboardAPI, 'get', self.teacher, reverse('teacher_dashboard'))
+        self.assertWithinBudget(
+            CourseAnalyticsAPI, 'get', self.teacher,
+            reverse('course_analytics', kwargs={'course_id': course.pk}))# type: ignore
+
+    def test_budgets_hold_as_rows_grow(self):
+        self.created = 0
+        self.populate(1)
+        self.check_budgets()
+        self.populate(4)
+        self.check_budgets()
+
+    def test_available_within_budget(self):
+        self.created = 0
+        self.populate(3)
+        Course.objects.create(title='Open', teacher=self.teacher, estimated_hours=1)
+        self.assertWithinBudget(
+            CourseViewSet, 'available', self.student, reverse('courses-available'))
+
+
+class SeedScaleTests(APITestCase):
+
+    def seed(self, *extra):
+        call_command(
+            'seed_scale', '--teachers', '2', '--courses-per-teacher', '2',
+            '--chapters', '3', '--questions', '2', '--students', '20',
+            '--enrollments-per-student', '2', *extra, stdout=StringIO())
+
+    def test_seed_is_reproducible_and_consistent(self):
+        self.seed()
+        first = sorted(Course.objects.values_list('id', flat=True))
+        self.assertEqual(Course.objects.count(), 4)
+        self.assertTrue(StudentProgress.objects.exists())
+        call_command('rebuild_course_stats', '--check', stdout=StringIO())
+
+        self.seed('--clear')
+        self.assertEqual(sorted(Course.objects.values_list('id', flat=True)), first)
+
+    def test_seed_refuses_to_duplicate(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+
+class BenchmarkTests(APITestCase):
+
+    def test_run_records_queries_latency_and_size(self):
+        call_command(
+            'seed_scale', '--teachers', '1', '--students', '5', '--chapters', '2',
+            '--questions', '2', '--courses-per-teacher', '2', stdout=StringIO())
+        results = benchmarks.run(['courses-list', 'quizzes-submit'], iterations=3, repeats=2)
+        row = results['results']['courses-list']
+        self.assertEqual(row['status'], status.HTTP_200_OK)
+        self.assertGreater(row['bytes'], 0)
+        self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+        self.assertLessEqual(row['queries'], CourseViewSet.query_budgets['list'])
+
+    def test_compare_flags_regressions(self):
+        baseline = {'results': {'courses-list': {
+            'status': 200, 'queries': 2, 'p95_ms': 10.0, 'bytes': 1000}}}
+        current = {'results': {'courses-list': {
+            'status': 200, 'queries': 3, 'p95_ms': 10.5, 'bytes': 1000}}}
+        self.assertEqual(
+            benchmarks.compare(current, baseline), ['courses-list: queries 2 -> 3'])
+        current['results']['courses-list'].update(queries=2, p95_ms=20.0)
+        self.assertEqual(len(benchmarks.compare(current, baseline)), 1)
+        self.assertEqual(benchmarks.percentile([5, 1, 4, 2, 3], 50), 3)
+
+        # Burst and contention latencies are reported, not gated
+        current['results']['courses-list']['requests_per_sec'] = 50.0
+        self.assertEqual(benchmarks.compare(current, baseline), [])
+
+    def test_repeated_runs_are_folded_into_medians(self):
+        row = benchmarks.combine([
+            {'status': 200, 'queries': 2, 'p95_ms': 9.0, 'bytes': 10},
+            {'status': 200, 'queries': 3, 'p95_ms': 90.0, 'bytes': 10, 'dashboard_refresh_ms': 4.0},
+            {'status': 500, 'queries': 2, 'p95_ms': 10.0, 'bytes': 12},
+        ])
+        self.assertEqual(row, {
+            'status': 500, 'queries': 3, 'p95_ms': 10.0, 'bytes': 12, 'dashboard_refresh_ms': 4.0})
+
+
+class ConcurrentBenchmarkTests(APITransactionTestCase):
+    """Benchmark threads use their own connections, so the seed is committed"""
+
+    def setUp(self):
+        call_command(
+            'seed_scale', '--teachers', '1', '--students', '3', '--chapters', '1',
+            '--questions', '1', '--courses-per-teacher', '1', stdout=StringIO())
+
+    def test_burst_reports_throughput(self):
+        row = benchmarks.run(['login-burst'], iterations=4)['results']['login-burst']
+        self.assertEqual(row['status'], status.HTTP_200_OK)
+        self.assertGreater(row['requests_per_sec'], 0)
+        self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+
+    def test_production_profile_has_no_locked_writes(self):
+        row = benchmarks.run(['sqlite-contention-production'], iterations=10)['results'][
+            'sqlite-contention-production']
+        self.assertEqual(row['locked_errors'], 0)
+        self.assertGreater(row['writes_per_sec'], 0)
+        # The workload runs on a copy
+        self.assertEqual(
+            StudentProgress.objects.aggregate(total=Sum('total_time_spent'))['total'], 0)
+
+    def test_production_profile_pragmas(self):
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('synchronous', 'busy_timeout', 'temp_store', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {'synchronous': 1, 'busy_timeout': 5000, 'temp_store': 2, 'cache_size': -64000})
+        self.assertEqual(connection.settings_dict['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+
+
+class ProfilingTests(APITestCase):
+
+    def setUp(self):
+        profiling.stats.reset()
+        self.staff = User.objects.create(email='staff@example.com', is_staff=True)
+        self.client.force_authenticate(user=self.staff)# type: ignore
+
+    def test_server_timing_header_and_stats(self):
+        response = self.client.get(reverse('courses-list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+        response = self.client.get(reverse('profiling_stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['routes']['courses-list']['count'], 1)# type: ignore
+
+    def test_stats_require_staff(self):
+        self.client.force_authenticate(user=User.objects.create(email='s@example.com'))# type: ignore
+        response = self.client.get(reverse('profiling_stats'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(PROFILING={'SAMPLE_RATE': 0.0})
+    def test_unsampled_requests_are_not_profiled(self):
+        response = self.client.get(reverse('courses-list'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_command_merges_process_dumps(self):
+        self.client.get(reverse('courses-list'))
+        with tempfile.TemporaryDirectory() as directory:
+            profiling.dump(directory)
+            out = StringIO()
+            call_command('profiling_stats', '--dir', directory, '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['courses-list']['count'], 1)
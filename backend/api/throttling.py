@@ -0,0 +1,91 @@
+"""
+Token-bucket throttles for the sign-in endpoints.
+
+A rate such as '600/min' describes a bucket of 600 tokens that refills evenly
+over a minute, so short bursts are allowed but the sustained rate is capped.
+Buckets live in the default cache. The per-process cache is shared by all of
+a worker's threads; point CACHE_BACKEND at a shared server to share buckets
+between workers too. Throttles run before the view, so rejected requests
+never reach the password hasher.
+
+The per-IP bucket is charged for every attempt. The per-email bucket is only
+charged for failed logins (see `charge`), so a busy classroom does not lock
+itself out while guessing at one account soon does.
+"""
+import hashlib
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    # Whether allow_request() spends a token, or only checks for one
+    charge_on_request = True
+    lock = threading.Lock()
+
+    def get_rate(self):
+        # Read at request time so override_settings reaches it
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        if self.scope not in rates:
+            raise ImproperlyConfigured(f"No default throttle rate set for '{self.scope}' scope")
+        return rates[self.scope]
+
+    def take(self, spend):
+        """Refill the bucket and spend a token if `spend`; False if it is empty"""
+        capacity, period = self.num_requests, self.duration
+        refill = capacity / period
+        with self.lock:
+            now = self.timer()
+            tokens, updated_at = self.cache.get(self.key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill)
+            allowed = tokens >= 1
+            if allowed and spend:
+                tokens -= 1
+            self.cache.set(self.key, (tokens, now), period)
+        self.wait_seconds = 0 if allowed else (1 - tokens) / refill
+        return allowed
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        return self.take(self.charge_on_request)
+
+    def charge(self, request, view):
+        """Spend a token after the fact"""
+        if self.rate is None:
+            return
+        self.key = self.get_cache_key(request, view)
+        if self.key is not None:
+            self.take(True)
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginEmailThrottle(TokenBucketThrottle):
+    scope = 'login_email'
+    charge_on_request = False
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email:
+            return None
+        # Hashed to keep arbitrary input out of cache keys
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class RegisterIPThrottle(LoginIPThrottle):
+    scope = 'register_ip'
@@ -0,0 +1,98 @@
+"""
+Time-bucketed course activity.
+
+Enrollments, completions and quiz attempts are counted per day, week or
+month with one `Trunc`-grouped query per metric. Bucket edges are computed
+once per call in the current time zone (`TIME_ZONE` unless activated
+otherwise), so every metric shares the same window and empty buckets are
+filled with zeros. Weeks start on Monday, as `TruncWeek` does.
+"""
+from datetime import datetime, timedelta
+
+from django.db.models import Count
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import QuizAttempt, StudentProgress
+
+PERIODS = ('day', 'week', 'month')
+DEFAULT_BUCKETS = {'day': 30, 'week': 12, 'month': 12}
+MAX_BUCKETS = 366
+
+# name -> (model, timestamp field, lookup to the course, extra filters)
+METRICS = {
+    'enrollments': (StudentProgress, 'enrolled_at', 'course', {}),
+    'completions': (StudentProgress, 'completed_at', 'course', {'completed': True}),
+    'quiz_attempts': (QuizAttempt, 'started_at', 'quiz__course', {}),
+}
+
+
+def parse_window(params):
+    """(period, buckets) from query parameters; raises ValueError on bad input"""
+    period = params.get('period', 'week')
+    if period not in PERIODS:
+        raise ValueError(f'period must be one of {", ".join(PERIODS)}')
+    buckets = params.get('buckets')
+    if buckets is None:
+        return period, DEFAULT_BUCKETS[period]
+    try:
+        buckets = int(buckets)
+    except (TypeError, ValueError):
+        raise ValueError('buckets must be an integer')
+    if not 1 <= buckets <= MAX_BUCKETS:
+        raise ValueError(f'buckets must be between 1 and {MAX_BUCKETS}')
+    return period, buckets
+
+
+def step(day, period, count):
+    """Move a local date by whole periods"""
+    if period == 'day':
+        return day + timedelta(days=count)
+    if period == 'week':
+        return day + timedelta(weeks=count)
+    month = day.year * 12 + day.month - 1 + count
+    return day.replace(year=month // 12, month=month % 12 + 1)
+
+
+def bucket_starts(period='week', buckets=None, now=None):
+    """
+    Start of each bucket, oldest first, ending with the one containing `now`,
+    followed by the end of that last bucket
+    """
+    buckets = buckets or DEFAULT_BUCKETS[period]
+    tz = timezone.get_current_timezone()
+    today = timezone.localtime(now or timezone.now(), tz).date()
+    if period == 'week':
+        today -= timedelta(days=today.weekday())
+    elif period == 'month':
+        today = today.replace(day=1)
+    # Stepping dates and then attaching the zone keeps edges at local midnight
+    # across DST changes
+    return [
+        datetime.combine(step(today, period, offset), datetime.min.time(), tzinfo=tz)
+        for offset in range(1 - buckets, 2)
+    ]
+
+
+def count_by_bucket(queryset, field, period, edges):
+    """Counts of `queryset` rows per bucket with a single grouped query"""
+    rows = queryset.filter(**{f'{field}__gte': edges[0], f'{field}__lt': edges[-1]}).annotate(
+        bucket=Trunc(field, period, tzinfo=edges[0].tzinfo)
+    ).order_by().values('bucket').annotate(count=Count('pk'))
+    counts = {row['bucket']: row['count'] for row in rows}
+    return [counts.get(start, 0) for start in edges[:-1]]
+
+
+def series(courses, period='week', buckets=None, metrics=None, now=None):
+    """
+    Bucketed counts for activity in `courses`, a Course queryset. Returns
+    the period and one row per bucket with a count for each metric.
+    """
+    edges = bucket_starts(period, buckets, now)
+    rows = [{'period_start': start} for start in edges[:-1]]
+    for name in metrics or METRICS:
+        model, field, course_path, filters = METRICS[name]
+        queryset = model.objects.filter(**{f'{course_path}__in': courses.values('pk')}, **filters)
+        for row, count in zip(rows, count_by_bucket(queryset, field, period, edges)):
+            row[name] = count
+    return {'period': period, 'buckets': rows}
@@ -0,0 +1,154 @@
+"""
+Refresh token blacklist checks that usually skip the database.
+
+Refresh tokens rotate and the old one is blacklisted, so every refresh used
+to join the outstanding and blacklisted token tables. Each process now keeps
+a Bloom filter of the jtis of unexpired blacklisted tokens, rebuilt from the
+table every REBUILD_INTERVAL seconds. A token the filter has never seen is
+accepted without a query. A possible match, roughly FALSE_POSITIVE_RATE of
+clean tokens, falls back to simplejwt's own lookup.
+
+Tokens blacklisted after a filter was built are added to this process's
+filter straight away. Other processes learn of them in one of two ways. With
+CACHE_SHARED the token is also marked in the Django cache for two rebuild
+intervals, where every process finds it at once. Otherwise each process
+catches up with rows added to the blacklist since it last looked, with one
+query on the primary key index every CATCH_UP_INTERVAL seconds, so a token
+revoked on one worker is refused by the others within that many seconds.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Seconds between rebuilds of a process's filter from the table
+    'REBUILD_INTERVAL': 300,
+    'FALSE_POSITIVE_RATE': 0.01,
+    # Room left for tokens blacklisted between rebuilds
+    'MIN_CAPACITY': 1024,
+    # Without a shared cache, seconds between catching up with tokens other
+    # processes blacklisted; 0 catches up on every check
+    'CATCH_UP_INTERVAL': 5,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'TOKEN_BLACKLIST_FILTER', {}).get(name, DEFAULTS[name])
+
+
+def enabled():
+    return get_setting('ENABLED')
+
+
+def cache_shared():
+    return getattr(settings, 'CACHE_SHARED', False)
+
+
+def marker_key(jti):
+    return f'tokens:blacklisted:{jti}'
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter of strings"""
+
+    def __init__(self, capacity, false_positive_rate):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, value):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+class BlacklistFilter:
+    """The process-wide filter of blacklisted jtis, rebuilt when it gets old"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.built_at = self.caught_up_at = 0.0
+        # The newest blacklist row the filter has seen
+        self.last_id = 0
+
+    def rebuild(self):
+        now = timezone.now()
+        # Read first, so rows added during the rebuild are caught up later
+        last_id = BlacklistedToken.objects.aggregate(last=Max('id'))['last'] or 0
+        blacklisted = BlacklistedToken.objects.filter(token__expires_at__gt=now)
+        count = blacklisted.count()
+        bloom = BloomFilter(
+            int(count * 1.25) + get_setting('MIN_CAPACITY'), get_setting('FALSE_POSITIVE_RATE'))
+        for jti in blacklisted.values_list('token__jti', flat=True).iterator(chunk_size=5000):
+            bloom.add(jti)
+        self.bloom = bloom
+        self.last_id = last_id
+        self.built_at = self.caught_up_at = time.monotonic()
+
+    def catch_up(self):
+        # SQLite may reuse the ids of pruned rows; those are expired tokens,
+        # and anything missed is picked up by the next rebuild
+        added = BlacklistedToken.objects.filter(id__gt=self.last_id).values_list('id', 'token__jti')
+        for row_id, jti in added:
+            self.bloom.add(jti)  # type: ignore
+            self.last_id = max(self.last_id, row_id)
+        self.caught_up_at = time.monotonic()
+
+    def current(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.bloom is None or now - self.built_at >= get_setting('REBUILD_INTERVAL'):
+                self.rebuild()
+            elif not cache_shared() and now - self.caught_up_at >= get_setting('CATCH_UP_INTERVAL'):
+                self.catch_up()
+            return self.bloom
+
+    def add(self, jti):
+        if cache_shared():
+            cache.set(marker_key(jti), True, timeout=2 * get_setting('REBUILD_INTERVAL'))
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def excludes(self, jti):
+        """True if `jti` is certainly not blacklisted"""
+        if jti in self.current():
+            return False
+        return not (cache_shared() and cache.get(marker_key(jti)))
+
+    def clear(self):
+        with self.lock:
+            self.bloom = None
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class RefreshToken(BaseRefreshToken):
+    """A refresh token that consults the blacklist filter before the table"""
+
+    def check_blacklist(self):
+        if enabled() and blacklist_filter.excludes(self.payload[api_settings.JTI_CLAIM]):
+            return
+        super().check_blacklist()
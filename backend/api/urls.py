@@ -19,8 +19,13 @@ from .views import (
     StudentProgressViewSet,
     TeacherDashboardAPI,
     CourseAnalyticsAPI,
-    EnrollmentRequestViewSet
+    StudentPerformanceExportAPI,
+    EnrollmentRequestViewSet,
+    ProfilingStatsAPI,
+    CacheStatsAPI,
+    HashingStatsAPI
 )
+from .throttling import LoginEmailThrottle, LoginIPThrottle
 
 router = DefaultRouter()
 router.register('courses', CourseViewSet, basename='courses')
@@ -39,7 +44,8 @@ urlpatterns = [
     path('auth/logout/', LogoutAPI.as_view(), name='logout'),
     path('auth/user/', UserAPI.as_view(), name='user'),
 
-    path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('auth/token/', TokenObtainPairView.as_view(
+        throttle_classes=[LoginIPThrottle, LoginEmailThrottle]), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
 
@@ -47,4 +53,11 @@ urlpatterns = [
         'teacher/dashboard/', TeacherDashboardAPI.as_view(), name='teacher_dashboard'),
     path(
         'teacher/analytics/<uuid:course_id>/', CourseAnalyticsAPI.as_view(), name='course_analytics'),
+    path(
+        'teacher/analytics/<uuid:course_id>/students/export/', StudentPerformanceExportAPI.as_view(),
+        name='student_performance_export'),
+
+    path('stats/profiling/', ProfilingStatsAPI.as_view(), name='profiling_stats'),
+    path('stats/cache/', CacheStatsAPI.as_view(), name='cache_stats'),
+    path('stats/hashing/', HashingStatsAPI.as_view(), name='hashing_stats'),
 ]
@@ -9,13 +9,16 @@ from rest_framework import (
 )
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.exceptions import NotFound
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+import uuid
 from datetime import timedelta
 from django.utils import timezone
-from django.db.models import Avg, Q
+from django.db import transaction
+from django.db.models import Avg, Count, Prefetch, Q
 from django.contrib.auth import authenticate
+from django.http import StreamingHttpResponse
 
 from .models import (
     User,
@@ -25,6 +28,7 @@ from .models import (
     Question,
     StudentProgress,
     CourseRating,
+    ChapterScore,
     QuizAttempt,
     EnrollmentRequest
 )
@@ -34,14 +38,27 @@ from .serializers import (
     LoginSerializer,
     LogoutSerializer,
     CourseSerializer,
+    CourseSummarySerializer,
     ChapterSerializer,
     QuizSerializer,
     QuestionSerializer,
     StudentProgressSerializer,
     CourseRatingSerializer,
+    QuizSubmitSerializer,
+    QuizSubmissionSerializer,
     EnrollmentRequestSerializer
 )
+from . import attempts, caching, concurrency, dashboard, exports, grading, hashing, profiling, rollups, timeseries
+from .conditional import ConditionalGetMixin
 from .permissions import IsTeacherOrReadOnly
+from .routing import ReplicaReadsMixin, pinned
+from .throttling import LoginEmailThrottle, LoginIPThrottle, RegisterIPThrottle
+from .pagination import (
+    SequenceCursorPagination,
+    OldestFirstCursorPagination,
+    EnrolledAtCursorPagination,
+    RequestedAtCursorPagination
+)
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -80,6 +97,8 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token = super().get_token(user)
         token['email'] = user.email
         token['role'] = user.role
+        # Lets authentication trust the claims until the account changes
+        token['ver'] = user.token_version
         return token
 
 
@@ -87,13 +106,14 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 class RegisterAPI(generics.GenericAPIView):
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegisterIPThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
 
-        refresh = RefreshToken.for_user(user)
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
 
         return Response({
             "user": UserSerializer(user, context=self.get_serializer_context()).data,
@@ -106,6 +126,7 @@ class RegisterAPI(generics.GenericAPIView):
 class LoginAPI(generics.GenericAPIView):
     serializer_class = LoginSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = CustomTokenObtainPairSerializer(data=request.data)
@@ -123,10 +144,16 @@ class LoginAPI(generics.GenericAPIView):
             }, status=status.HTTP_200_OK)
 
         except serializers.ValidationError as e:
+            LoginEmailThrottle().charge(request, self)
             return Response(
                 {"error": "Invalid credentials"},
                 status=status.HTTP_401_UNAUTHORIZED
             )
+        except hashing.HashingBusy as e:
+            return Response(
+                {"error": str(e.detail)},
+                status=e.status_code
+            )
         except Exception as e:
             return Response(
                 {"error": str(e)},
@@ -168,20 +195,116 @@ class LogoutAPI(generics.GenericAPIView):
 # Course Viewset
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(ReplicaReadsMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [IsTeacherOrReadOnly,]
+    validator_fields = ('stats__updated_at', 'teacher__updated_at')
+    # Catalog reads; a student's own enrollments stay on the primary
+    replica_actions = ('list', 'retrieve', 'available')
+
+    summary_actions = ('list', 'available', 'enrolled')
+
+    # Maximum SQL queries per request with a cold catalog cache, excluding
+    # authentication; enforced by the tests
+    query_budgets = {
+        'list': 2,
+        'retrieve': 8,
+        'available': 2,
+        'enrolled': 2,
+        'students': 3,
+        'enrollment_requests': 2,
+    }
 
     def perform_create(self, serializer):
         serializer.save(teacher=self.request.user)
 
-    def get_queryset(self): # type: ignore
+    def scoped_queryset(self):
+        """Courses the current user may read, without joins"""
         user = self.request.user
-        if user.role == 'teacher': # type: ignore
-            return Course.objects.filter(teacher=user)
+        if getattr(user, 'role', None) == 'teacher':
+            return Course.objects.filter(teacher_id=user.pk)
         return Course.objects.all()
 
+    def get_queryset(self): # type: ignore
+        queryset = self.scoped_queryset().select_related('teacher', 'stats')
+        if self.action == 'retrieve':
+            return queryset.prefetch_related('chapters__quiz__questions')
+        if self.action == 'list':
+            return self.summarize(queryset)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if self.get_expand():
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(self.scoped_queryset().only('id', 'created_at'))
+        return self.get_paginated_response(self.cached_summaries(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        course_id = self.scoped_queryset().filter(
+            pk=kwargs['pk']).values_list('pk', flat=True).first()
+        if course_id is None:
+            raise NotFound()
+        data = caching.get_detail(
+            course_id,
+            lambda: self.get_serializer(self.get_queryset().get(pk=course_id)).data,
+            variant=self.cache_variant())
+        return Response(data)
+
+    def get_validator_queryset(self):
+        queryset = self.scoped_queryset()
+        if self.action == 'retrieve':
+            queryset = queryset.filter(pk=self.kwargs['pk'])
+        return queryset
+
+    def get_validator_children(self):
+        if self.action == 'list' and not self.get_expand():
+            return ((Chapter, 'course'),)
+        return ((Chapter, 'course'), (Quiz, 'course'), (Question, 'quiz__course'))
+
+    def cache_variant(self):
+        # Thumbnail URLs are absolute, so representations depend on the host
+        return self.request.build_absolute_uri('/')
+
+    def cached_summaries(self, courses):
+        """Serialized summaries for a page of courses, built from the database only on a cache miss"""
+        def build(missing):
+            queryset = self.summarize(
+                Course.objects.select_related('teacher', 'stats').filter(id__in=missing))
+            return {
+                course.id: CourseSummarySerializer(course, context=self.get_serializer_context()).data
+                for course in queryset
+            }
+        return caching.get_summaries(
+            [course.id for course in courses], build, variant=self.cache_variant())
+
+    def get_serializer_class(self): # type: ignore
+        if self.action in self.summary_actions:
+            return CourseSummarySerializer
+        return CourseSerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+    def get_expand(self):
+        """Parse `?expand=chapters,quizzes` into the supported expansions"""
+        requested = self.request.query_params.get('expand', '') # type: ignore
+        return tuple(
+            name for name in CourseSummarySerializer.EXPANDABLE
+            if name in requested.split(','))
+
+    def summarize(self, queryset):
+        """Prepare a course queryset for the summary serializer"""
+        queryset = queryset.annotate(chapter_count=Count('chapters'))
+        expand = self.get_expand()
+        if 'chapters' in expand:
+            queryset = queryset.prefetch_related('chapters')
+        if 'quizzes' in expand:
+            queryset = queryset.prefetch_related('quizzes__questions')
+        return queryset
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def available(self, request):
         """Get courses available for enrollment (not already enrolled)"""
@@ -192,10 +315,15 @@ class CourseViewSet(viewsets.ModelViewSet):
 
         enrolled_course_ids = student.enrolled_courses.values_list(
             'id', flat=True)
-        available_courses = Course.objects.exclude(id__in=enrolled_course_ids)
+        available_courses = Course.objects.exclude(
+            id__in=enrolled_course_ids).only('id', 'created_at')
 
-        serializer = self.get_serializer(available_courses, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(available_courses)
+        if self.get_expand():
+            page = self.summarize(Course.objects.select_related('teacher', 'stats').filter(
+                id__in=[course.id for course in page])).order_by('-created_at', '-id')
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return self.get_paginated_response(self.cached_summaries(page))
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def enrolled(self, request):
@@ -205,35 +333,55 @@ class CourseViewSet(viewsets.ModelViewSet):
         if student.role != 'student':
             return Response({'error': 'Only students can view enrolled courses'}, status=status.HTTP_400_BAD_REQUEST)
 
-        enrolled_courses = student.enrolled_courses.all()
-        courses_data = []
-
-        for course in enrolled_courses:
-            progress_obj, created = StudentProgress.objects.get_or_create(
-                student=student, course=course
-            )
-            progress_percentage = progress_obj.progress_percentage
-
-            course_data = CourseSerializer(course).data
-            course_data['progress'] = progress_percentage # type: ignore
-            course_data['average_score'] = progress_obj.final_exam_score or 0 # type: ignore
-            courses_data.append(course_data)
-
-        return Response(courses_data)
+        student_progress = Prefetch(
+            'student_progress',
+            queryset=StudentProgress.objects.filter(student=student),
+            to_attr='own_progress')
+        enrolled_courses = self.summarize(
+            student.enrolled_courses.select_related('teacher', 'stats')
+        ).prefetch_related(student_progress)
+
+        page = self.paginate_queryset(enrolled_courses)
+        self.create_missing_progress(student, page)
+
+        courses_data = self.get_serializer(page, many=True).data
+        for course, course_data in zip(page, courses_data): # type: ignore
+            progress_obj = course.own_progress[0]
+            course_data['progress'] = progress_obj.progress_percentage
+            course_data['average_score'] = progress_obj.final_exam_score or 0
+
+        return self.get_paginated_response(courses_data)
+
+    def create_missing_progress(self, student, courses):
+        """Create progress rows for enrollments made without one, such as through the admin"""
+        missing = [course for course in courses if not course.own_progress]
+        if not missing:
+            return
+        with transaction.atomic():
+            for course in missing:
+                progress_obj, _ = StudentProgress.objects.get_or_create(
+                    student=student, course=course,
+                    defaults={'total_chapter_count': course.chapter_count})
+                course.own_progress = [progress_obj]
 
     @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def students(self, request, pk=None):
         """Get students enrolled in a specific course (for teachers only)"""
         course = self.get_object()
 
-        if course.teacher != request.user:
+        if course.teacher_id != request.user.pk:
             return Response({'error': 'Only the course teacher can view enrolled students'}, status=status.HTTP_403_FORBIDDEN)
 
         # Get students enrolled in this course with their progress
+        course_progress = Prefetch(
+            'progress',
+            queryset=StudentProgress.objects.filter(course=course),
+            to_attr='course_progress')
+        students = course.enrolled_students.prefetch_related(course_progress)
+
         enrolled_students = []
-        for student in course.enrolled_students.all():
-            progress_obj = StudentProgress.objects.filter(
-                student=student, course=course).first()
+        for student in self.paginate_queryset(students):
+            progress_obj = student.course_progress[0] if student.course_progress else None
             progress_percentage = progress_obj.progress_percentage if progress_obj else 0
 
             student_data = {
@@ -247,7 +395,7 @@ class CourseViewSet(viewsets.ModelViewSet):
             }
             enrolled_students.append(student_data)
 
-        return Response(enrolled_students)
+        return self.get_paginated_response(enrolled_students)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def dismiss_student(self, request, pk=None):
@@ -255,7 +403,7 @@ class CourseViewSet(viewsets.ModelViewSet):
         course = self.get_object()
         student_id = request.data.get('student_id')
 
-        if course.teacher != request.user:
+        if course.teacher_id != request.user.pk:
             return Response({'error': 'Only the course teacher can dismiss students'}, status=status.HTTP_403_FORBIDDEN)
 
         try:
@@ -263,14 +411,15 @@ class CourseViewSet(viewsets.ModelViewSet):
         except User.DoesNotExist:
             return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if student not in course.enrolled_students.all():
+        if not course.enrolled_students.filter(pk=student.pk).exists():
             return Response({'error': 'Student is not enrolled in this course'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Remove student from course
-        course.enrolled_students.remove(student)
+        with transaction.atomic():
+            # Remove student from course
+            course.enrolled_students.remove(student)
 
-        # Delete progress record
-        StudentProgress.objects.filter(student=student, course=course).delete()
+            # Delete progress record
+            StudentProgress.objects.filter(student=student, course=course).delete()
 
         return Response({'message': 'Student dismissed from course successfully'})
 
@@ -282,7 +431,7 @@ class CourseViewSet(viewsets.ModelViewSet):
         if student.role != 'student':
             return Response({'error': 'Only students can request enrollment in courses'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if student in course.enrolled_students.all():
+        if course.enrolled_students.filter(pk=student.pk).exists():
             return Response({'error': 'Already enrolled in this course'}, status=status.HTTP_400_BAD_REQUEST)
 
         existing_request = EnrollmentRequest.objects.filter(
@@ -318,7 +467,7 @@ class CourseViewSet(viewsets.ModelViewSet):
         if not rating_value or rating_value < 1 or rating_value > 5:
             return Response({'error': 'Rating must be between 1 and 5'}, status=status.HTTP_400_BAD_REQUEST)
 
-        rating, created = CourseRating.objects.update_or_create(
+        rating, _ = CourseRating.objects.update_or_create(
             course=course, student=student,
             defaults={'rating': rating_value, 'review': review_text}
         )
@@ -326,7 +475,8 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = CourseRatingSerializer(rating)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated],
+            pagination_class=RequestedAtCursorPagination)
     def enrollment_requests(self, request, pk=None):
         """Get enrollment requests for a course (teachers only)"""
         course = self.get_object()
@@ -335,9 +485,10 @@ class CourseViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Only the course teacher can view enrollment requests'}, status=status.HTTP_403_FORBIDDEN)
 
         requests = EnrollmentRequest.objects.filter(
-            course=course).order_by('-requested_at')
-        serializer = EnrollmentRequestSerializer(requests, many=True)
-        return Response(serializer.data)
+            course=course).select_related('student', 'course', 'reviewed_by')
+        page = self.paginate_queryset(requests)
+        serializer = EnrollmentRequestSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def approve_enrollment(self, request, pk=None):
@@ -377,10 +528,13 @@ class CourseViewSet(viewsets.ModelViewSet):
 
 
 
-class ChapterViewSet(viewsets.ModelViewSet):
+class ChapterViewSet(ReplicaReadsMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Chapter.objects.all()
     serializer_class = ChapterSerializer
     permission_classes = [IsTeacherOrReadOnly,]
+    pagination_class = SequenceCursorPagination
+    sequence_parent = 'course'
+    validator_children = ((Quiz, 'chapter'), (Question, 'quiz__chapter'))
 
     def get_queryset(self): # type: ignore
         queryset = Chapter.objects.all()
@@ -391,10 +545,12 @@ class ChapterViewSet(viewsets.ModelViewSet):
 
 
 
-class QuizViewSet(viewsets.ModelViewSet):
+class QuizViewSet(ReplicaReadsMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Quiz.objects.all()
     serializer_class = QuizSerializer
     permission_classes = [IsTeacherOrReadOnly,]
+    pagination_class = OldestFirstCursorPagination
+    validator_children = ((Question, 'quiz'),)
 
     def get_queryset(self): # type: ignore
         queryset = Quiz.objects.all()
@@ -405,46 +561,144 @@ class QuizViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def submit(self, request, pk=None):
-        quiz = self.get_object()
-        student = request.user
-        answers = request.data.get('answers', {})
-
-        # Calculate score
-        correct_answers = 0
-        total_points = 0
-        earned_points = 0
-
-        for question in quiz.questions.all():
-            total_points += question.points
-            user_answer = answers.get(str(question.id))
-            if user_answer is not None and int(user_answer) == question.correct_answer:
-                correct_answers += 1
-                earned_points += question.points
+        answer_key = grading.get_answer_key(pk)
+        if answer_key is None:
+            raise NotFound()
+        # Validated up front: the journal cannot reject a row once we have answered
+        serializer = QuizSubmitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        answers = serializer.validated_data['answers']
 
-        score_percentage = (earned_points / total_points *
-                            100) if total_points > 0 else 0
+        grade = answer_key.grade(answers)
 
-        attempt = QuizAttempt.objects.create(
-            student=student,
-            quiz=quiz,
+        # The id is in the token's claims; the user row is never loaded
+        attempts.record(
+            student_id=request.user.pk,
+            quiz_id=answer_key.quiz_id,
             answers=answers,
-            score=score_percentage,
-            time_taken=request.data.get('time_taken', 0)
+            score=grade.score,
+            time_taken=serializer.validated_data['time_taken']
         )
 
         return Response({
-            'score': score_percentage,
-            'passed': score_percentage >= quiz.passing_score,
-            'correct_answers': correct_answers,
-            'total_questions': quiz.questions.count()
+            'score': grade.score,
+            'passed': grade.passed,
+            'correct_answers': grade.correct_answers,
+            'total_questions': grade.total_questions
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='submit-batch',
+            permission_classes=[permissions.IsAuthenticated])
+    def submit_batch(self, request):
+        """Grade and store many quiz submissions at once, e.g. after working offline"""
+        items = request.data.get('submissions') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list):
+            return Response({'error': 'submissions must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        max_batch = attempts.get_setting('MAX_BATCH')
+        if len(items) > max_batch:
+            return Response({'error': f'At most {max_batch} submissions per batch'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        submissions = []
+        results = []
+        for index, item in enumerate(items):
+            serializer = QuizSubmissionSerializer(data=item)
+            if serializer.is_valid():
+                submissions.append((index, serializer.validated_data))
+                results.append(None)
+            else:
+                results.append({'index': index, 'status': 'error', 'errors': serializer.errors})
+
+        answer_keys = grading.get_answer_keys(
+            {submission['quiz_id'] for _, submission in submissions})
+
+        now = timezone.now()
+        graded = []
+        for index, submission in submissions:
+            answer_key = answer_keys.get(str(submission['quiz_id']))
+            if answer_key is None:
+                results[index] = {'index': index, 'status': 'error', 'errors': {'quiz_id': ['Quiz not found']}}
+                continue
+            grade = answer_key.grade(submission['answers'])
+            # Offline attempts keep when they were taken, but never a future time
+            taken_at = min(submission.get('client_timestamp') or now, now)
+            attempt = QuizAttempt(
+                id=submission.get('id') or uuid.uuid4(),
+                student_id=request.user.pk,
+                quiz_id=answer_key.quiz_id,
+                answers=submission['answers'],
+                score=grade.score,
+                time_taken=submission['time_taken'],
+                started_at=taken_at,
+                completed_at=taken_at,
+            )
+            graded.append((index, attempt, answer_key, grade))
+
+        with transaction.atomic():
+            # Resent items carry the same id and are reported rather than
+            # stored twice, so retrying a sync is safe
+            client_ids = [submission['id'] for _, submission in submissions if submission.get('id')]
+            owners = dict(QuizAttempt.objects.filter(pk__in=client_ids).values_list(
+                'pk', 'student_id')) if client_ids else {}
+            quiz_attempts = []
+            best_scores = {}
+            for index, attempt, answer_key, grade in graded:
+                owner = owners.get(attempt.pk)
+                if owner is not None and owner != request.user.pk:
+                    results[index] = {'index': index, 'status': 'conflict',
+                                      'errors': {'id': ['Attempt id is already in use']}}
+                    continue
+                results[index] = {
+                    'index': index,
+                    'status': 'ok' if owner is None else 'duplicate',
+                    'quiz_id': str(answer_key.quiz_id),
+                    'score': grade.score,
+                    'passed': grade.passed,
+                    'correct_answers': grade.correct_answers,
+                    'total_questions': grade.total_questions,
+                }
+                if owner is not None:
+                    continue
+                # A repeat within the batch counts as a duplicate too
+                owners[attempt.pk] = request.user.pk
+                quiz_attempts.append(attempt)
+                scores = best_scores.setdefault(answer_key.course_id, {})
+                scores[str(answer_key.quiz_id)] = max(grade.score, scores.get(str(answer_key.quiz_id), 0))
+
+            # Conflicts are only left to a resend racing this one
+            QuizAttempt.objects.bulk_create(quiz_attempts, ignore_conflicts=True)
+            progress_rows = list(StudentProgress.objects.filter(
+                student_id=request.user.pk, course_id__in=best_scores))
+            for progress in progress_rows:
+                for quiz_id, score in best_scores[progress.course_id].items():
+                    progress.quiz_scores[quiz_id] = max(score, progress.quiz_scores.get(quiz_id, 0))
+            StudentProgress.objects.bulk_update(progress_rows, ['quiz_scores'])
+            if quiz_attempts:
+                dashboard.activity_changed({attempt.quiz_id for attempt in quiz_attempts})
+
+        duplicates = sum(result['status'] == 'duplicate' for result in results)
+        return Response({
+            'submitted': len(quiz_attempts),
+            'duplicates': duplicates,
+            'failed': len(items) - len(quiz_attempts) - duplicates,
+            'results': results,
         }, status=status.HTTP_200_OK)
 
 
 
-class QuestionViewSet(viewsets.ModelViewSet):
+class QuestionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
     permission_classes = [IsTeacherOrReadOnly,]
+    pagination_class = SequenceCursorPagination
+    sequence_parent = 'quiz'
+
+    def get_queryset(self): # type: ignore
+        queryset = Question.objects.all()
+        quiz_id = self.request.query_params.get('quiz', None) # type: ignore
+        if quiz_id is not None:
+            queryset = queryset.filter(quiz_id=quiz_id)
+        return queryset
 
 
 
@@ -452,154 +706,149 @@ class StudentProgressViewSet(viewsets.ModelViewSet):
     queryset = StudentProgress.objects.all()
     serializer_class = StudentProgressSerializer
     permission_classes = [permissions.IsAuthenticated,]
+    pagination_class = EnrolledAtCursorPagination
+
+    query_budgets = {
+        'list': 2,
+        'retrieve': 2,
+    }
 
     def get_queryset(self): # type: ignore
         user = self.request.user
+        queryset = StudentProgress.objects.prefetch_related('chapter_results')
         if user.role == 'student': # type: ignore
-            return StudentProgress.objects.filter(student=user)
+            return queryset.filter(student_id=user.pk)
         elif user.role == 'teacher': # type: ignore
-            return StudentProgress.objects.filter(course__teacher=user)
+            return queryset.filter(course__teacher_id=user.pk)
         return StudentProgress.objects.none()
 
     @action(detail=True, methods=['post'])
     def complete_chapter(self, request, pk=None):
         progress = self.get_object()
         chapter_id = request.data.get('chapter_id')
-        score = request.data.get('score', 100)
+        try:
+            score = int(request.data.get('score', 100))
+        except (TypeError, ValueError):
+            score = -1
+        if not 0 <= score <= 100:
+            return Response({'error': 'score must be a whole percentage'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             chapter = Chapter.objects.get(
                 id=chapter_id, course=progress.course)
-            progress.completed_chapters.add(chapter)
-            progress.chapter_scores[str(chapter_id)] = score
-            progress.save()
+        except Chapter.DoesNotExist:
+            return Response({'error': 'Chapter not found'}, status=status.HTTP_404_NOT_FOUND)
 
-            total_chapters = progress.course.chapters.count()
-            completed_chapters = progress.completed_chapters.count()
+        with transaction.atomic():
+            ChapterScore.objects.update_or_create(
+                progress=progress, chapter=chapter,
+                defaults={'score': score, 'completed_at': timezone.now()})
+            progress.save(update_fields=['last_accessed_at'])
+            progress.refresh_from_db(fields=['completed_chapter_count', 'total_chapter_count'])
 
-            if completed_chapters >= total_chapters:
+            if progress.completed_chapter_count >= progress.total_chapter_count and not progress.completed:
                 progress.completed = True
                 progress.completed_at = timezone.now()
                 progress.save()
 
-            return Response({'message': 'Chapter completed successfully'}, status=status.HTTP_200_OK)
-        except Chapter.DoesNotExist:
-            return Response({'error': 'Chapter not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'message': 'Chapter completed successfully'}, status=status.HTTP_200_OK)
 
 
 
-class TeacherDashboardAPI(generics.GenericAPIView):
+class TeacherDashboardAPI(ReplicaReadsMixin, generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    # Serving the stored snapshot; ?refresh=true recomputes it synchronously
+    # with the same number of queries whatever the number of courses
+    query_budgets = {
+        'get': 1,
+        'refresh': 9,
+    }
+
+    def refresh_requested(self, request):
+        return request.query_params.get('refresh', '').lower() in ('1', 'true', 'yes')
+
+    def reads_from_replica(self, request):
+        # A refresh stores what it reads, so it must not lag
+        return super().reads_from_replica(request) and not self.refresh_requested(request)
 
     def get(self, request):
         if request.user.role != 'teacher':
             return Response({'error': 'Access denied. Teacher role required.'}, status=status.HTTP_403_FORBIDDEN)
 
-        teacher = request.user
-        courses = Course.objects.filter(teacher=teacher)
-
-        total_courses = courses.count()
-        total_students = StudentProgress.objects.filter(
-            course__teacher=teacher).values('student').distinct().count()
-        avg_rating = courses.aggregate(avg_rating=Avg('ratings__rating'))[
-            'avg_rating'] or 0
-        completion_rate = StudentProgress.objects.filter(
-            course__teacher=teacher, completed=True
-        ).count() / max(StudentProgress.objects.filter(course__teacher=teacher).count(), 1) * 100
-
-        recent_enrollments = StudentProgress.objects.filter(
-            course__teacher=teacher
-        ).order_by('-enrolled_at')[:5]
-
-        course_stats = []
-        for course in courses:
-            stats = {
-                'course_id': course.id,
-                'course_title': course.title,
-                'enrollment_count': course.enrollment_count,
-                'completion_rate': course.student_progress.filter(completed=True).count() / max(course.student_progress.count(), 1) * 100, # type: ignore
-                'average_rating': course.average_rating
-            }
-            course_stats.append(stats)
-
+        snapshot = dashboard.get_snapshot(request.user, refresh=self.refresh_requested(request))
+        data = snapshot.data
         return Response({
-            'teacher_info': UserSerializer(teacher).data,
-            'statistics': {
-                'total_courses': total_courses,
-                'total_students': total_students,
-                'average_rating': round(avg_rating, 1),
-                'completion_rate': round(completion_rate, 1)
-            },
-            'recent_enrollments': StudentProgressSerializer(recent_enrollments, many=True).data,
-            'course_performance': course_stats,
-            'recent_activity': self.get_recent_activity(teacher)
+            'teacher_info': UserSerializer(request.user).data,
+            'statistics': data['statistics'],
+            'recent_enrollments': data['recent_enrollments'],
+            'course_performance': [
+                {name: value for name, value in row.items() if name != 'counters'}
+                for row in data['course_performance']
+            ],
+            'recent_activity': data['recent_activity'],
+            'trends': data['trends'],
+            'refreshed_at': snapshot.refreshed_at,
+            'updated_at': snapshot.updated_at,
         })
 
-    def get_recent_activity(self, teacher):
-        recent_attempts = QuizAttempt.objects.filter(
-            quiz__course__teacher=teacher
-        ).order_by('-started_at')[:10]
-
-        activity = []
-        for attempt in recent_attempts:
-            activity.append({
-                'type': 'quiz_completion',
-                'student_name': attempt.student.name,
-                'course_title': attempt.quiz.course.title,
-                'quiz_title': attempt.quiz.title,
-                'score': attempt.score,
-                'timestamp': attempt.started_at
-            })
-
-        return activity[:5] 
-
 
-
-class CourseAnalyticsAPI(generics.GenericAPIView):
+class CourseAnalyticsAPI(ReplicaReadsMixin, generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    # Sections together, whichever threads run them; the course tree is
+    # prefetched, so the count does not grow with chapters or students
+    query_budgets = {
+        'get': 17,
+    }
 
     def get(self, request, course_id):
         if request.user.role != 'teacher':
             return Response({'error': 'Access denied. Teacher role required.'}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            course = Course.objects.get(id=course_id, teacher=request.user)
+            course = Course.objects.get(id=course_id, teacher_id=request.user.pk)
         except Course.DoesNotExist:
             return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        progress_data = StudentProgress.objects.filter(course=course)
-
-        analytics = {
-            'course_info': CourseSerializer(course).data,
-            'enrollment_trends': self.get_enrollment_trends(course),
-            'completion_rates': self.get_completion_rates(course),
-            'chapter_performance': self.get_chapter_performance(course),
-            'student_performance': self.get_student_performance(course)
-        }
+        try:
+            period, buckets = timeseries.parse_window(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Independent aggregates, evaluated side by side
+        analytics = concurrency.run_sections({
+            'course_info': lambda: self.get_course_info(course),
+            'trends': lambda: rollups.series(course, period, buckets),
+            'completion_rates': lambda: self.get_completion_rates(course),
+            'chapter_performance': lambda: self.get_chapter_performance(course),
+            'student_performance': lambda: self.get_student_performance(course)
+        })
+        analytics['enrollment_trends'] = self.get_enrollment_trends(analytics['trends'])
 
         return Response(analytics)
 
-    def get_enrollment_trends(self, course):
-        from datetime import timedelta
-
-        weeks = []
-        for i in range(12):
-            start_date = timezone.now() - timedelta(weeks=i+1)
-            end_date = timezone.now() - timedelta(weeks=i)
-            enrollments = StudentProgress.objects.filter(
-                course=course,
-                enrolled_at__range=[start_date, end_date]
-            ).count()
-            weeks.append({
-                'week': f"Week {12-i}",
-                'enrollments': enrollments
-            })
-
-        return weeks
+    def get_course_info(self, course):
+        course = Course.objects.select_related('teacher', 'stats').prefetch_related(
+            'chapters__quiz__questions', 'enrolled_students').get(pk=course.pk)
+        return CourseSerializer(course).data
+
+    def get_enrollment_trends(self, trends):
+        """
+        The per-period list this endpoint has always returned, newest first
+        and labelled 'Week 12' down to 'Week 1'. The key stays 'week' for
+        other periods too.
+        """
+        label = trends['period'].capitalize()
+        rows = trends['buckets']
+        return [
+            {'week': f'{label} {number}', 'enrollments': row['enrollments']}
+            for number, row in zip(range(len(rows), 0, -1), reversed(rows))
+        ]
 
     def get_completion_rates(self, course):
-        total_enrolled = course.student_progress.count()
-        completed = course.student_progress.filter(completed=True).count()
+        totals = course.student_progress.aggregate(
+            enrolled=Count('id'), completed=Count('id', filter=Q(completed=True)))
+        total_enrolled = totals['enrolled']
+        completed = totals['completed']
         in_progress = total_enrolled - completed
 
         return {
@@ -609,29 +858,24 @@ class CourseAnalyticsAPI(generics.GenericAPIView):
         }
 
     def get_chapter_performance(self, course):
-        chapters = course.chapters.all()
+        total_enrolled = course.student_progress.count()
+        chapters = course.chapters.annotate(
+            completed_count=Count('scores'), average_score=Avg('scores__score'))
         performance = []
 
         for chapter in chapters:
-            completed_count = chapter.completed_by.count()
-            total_enrolled = course.student_progress.count()
-
             performance.append({
                 'chapter_id': chapter.id,
                 'chapter_title': chapter.title,
-                'completion_rate': (completed_count / max(total_enrolled, 1)) * 100,
-                'average_score': StudentProgress.objects.filter(
-                    course=course,
-                    chapter_scores__contains={str(chapter.id): {}}
-                ).aggregate(
-                    avg_score=Avg('chapter_scores__' + str(chapter.id))
-                )['avg_score'] or 0
+                'completion_rate': (chapter.completed_count / max(total_enrolled, 1)) * 100,
+                'average_score': chapter.average_score or 0
             })
 
         return performance
 
     def get_student_performance(self, course):
-        students = course.student_progress.all()
+        students = course.student_progress.select_related('student').annotate(
+            average_score=Avg('chapter_results__score'))
         performance = []
 
         for progress in students:
@@ -639,26 +883,59 @@ class CourseAnalyticsAPI(generics.GenericAPIView):
                 'student_id': progress.student.id,
                 'student_name': progress.student.name,
                 'progress_percentage': progress.progress_percentage,
-                'completed_chapters': progress.completed_chapters.count(),
-                'total_chapters': course.chapters.count(),
-                'average_score': sum(progress.chapter_scores.values()) / max(len(progress.chapter_scores), 1),
+                'completed_chapters': progress.completed_chapter_count,
+                'total_chapters': progress.total_chapter_count,
+                'average_score': progress.average_score or 0,
                 'last_accessed': progress.last_accessed_at
             })
 
         return performance
 
 
+class StudentPerformanceExportAPI(ReplicaReadsMixin, generics.GenericAPIView):
+    """Stream every enrolled student's performance as CSV or JSON lines"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, course_id):
+        if request.user.role != 'teacher':
+            return Response({'error': 'Access denied. Teacher role required.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            course = Course.objects.get(id=course_id, teacher_id=request.user.pk)
+        except Course.DoesNotExist:
+            return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Not `format`, which DRF reserves for picking a renderer
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in exports.FORMATS:
+            return Response({'error': f'export_format must be one of {", ".join(exports.FORMATS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            pinned(exports.lines(course, export_format)), content_type=exports.FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="course-{course.pk}-students.{export_format}"'
+        return response
+
+
 class EnrollmentRequestViewSet(viewsets.ModelViewSet):
     queryset = EnrollmentRequest.objects.all()
     serializer_class = EnrollmentRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = RequestedAtCursorPagination
+
+    query_budgets = {
+        'list': 1,
+        'retrieve': 1,
+    }
 
     def get_queryset(self): # type: ignore
         user = self.request.user
+        queryset = EnrollmentRequest.objects.select_related(
+            'student', 'course', 'reviewed_by')
         if user.role == 'teacher': # type: ignore
-            return EnrollmentRequest.objects.filter(course__teacher=user)
+            return queryset.filter(course__teacher_id=user.pk)
         elif user.role == 'student': # type: ignore
-            return EnrollmentRequest.objects.filter(student=user)
+            return queryset.filter(student_id=user.pk)
         return EnrollmentRequest.objects.none()
 
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
@@ -682,3 +959,36 @@ class EnrollmentRequestViewSet(viewsets.ModelViewSet):
             return Response({'message': 'Enrollment request rejected successfully'})
         except EnrollmentRequest.DoesNotExist:
             return Response({'error': 'Enrollment request not found'}, status=status.HTTP_404_NOT_FOUND)
+
+
+class ProfilingStatsAPI(generics.GenericAPIView):
+    """Rolling per-route request timings, for staff"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        data = {
+            'window_seconds': profiling.get_setting('WINDOW_SECONDS'),
+            'routes': profiling.report(profiling.stats.snapshot()),
+        }
+        dump_dir = profiling.get_setting('DUMP_DIR')
+        if request.query_params.get('scope') == 'all' and dump_dir:
+            profiling.dump()
+            data['all_processes'] = profiling.report(profiling.load_dumps(
+                dump_dir, max_age=profiling.get_setting('WINDOW_SECONDS')))
+        return Response(data)
+
+
+class CacheStatsAPI(generics.GenericAPIView):
+    """Catalog cache hit and miss counters for this process, for staff"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(caching.stats())
+
+
+class HashingStatsAPI(generics.GenericAPIView):
+    """Password hashing pool queue depth and timings for this process, for staff"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(hashing.stats())
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
@@ -54,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.profiling.RequestProfilingMiddleware',
+    'api.routing.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,6 +96,56 @@ DATABASES = {
     }
 }
 
+# The 'production' profile runs these pragmas on every new connection: WAL
+# lets readers carry on while one writer commits, NORMAL sync is durable
+# under WAL except on power loss, and writers wait up to busy_timeout ms for
+# the lock. Write transactions start with BEGIN IMMEDIATE, so two of them
+# never both take a read lock and then deadlock upgrading it, which SQLite
+# reports as "database is locked" without waiting. Connections are kept open
+# between requests. DATABASE_PROFILE=basic restores Django's defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    # Negative values are KiB
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-64000, cast=int),
+    'temp_store': 'MEMORY',
+}
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    'transaction_mode': 'IMMEDIATE',
+}
+
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='production')
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update(
+        OPTIONS=SQLITE_PRODUCTION_OPTIONS,
+        CONN_MAX_AGE=config('DB_CONN_MAX_AGE', default=600, cast=int),
+        CONN_HEALTH_CHECKS=True,
+    )
+
+# Read replica for analytics and catalog reads (see api.routing). Locally it
+# is a second SQLite file refreshed with `manage.py sync_replica`; query_only
+# makes sure nothing writes to it through Django. Tests read it as a mirror
+# of the test database.
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': config('DATABASE_REPLICA_NAME', default=str(BASE_DIR / 'db.replica.sqlite3')),
+    'OPTIONS': {
+        **DATABASES['default'].get('OPTIONS', {}),
+        'init_command': ';'.join(filter(None, [
+            DATABASES['default'].get('OPTIONS', {}).get('init_command'), 'PRAGMA query_only=ON'])),
+    },
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['api.routing.PrimaryReplicaRouter']
+DATABASE_REPLICA = {
+    'ENABLED': config('DATABASE_REPLICA_ENABLED', default=False, cast=bool),
+    # Seconds a user's reads stay on the primary after they write
+    'STICKY_SECONDS': config('DATABASE_REPLICA_STICKY_SECONDS', default=10, cast=int),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -141,13 +194,134 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'api.User'
 
+# ModelBackend with password checks on the hashing pool below
+AUTHENTICATION_BACKENDS = ['api.backends.PooledModelBackend']
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.profiling.ProfiledJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': config('API_PAGE_SIZE', default=20, cast=int),
+    # Token buckets (see api.throttling): N tokens refilled evenly over the period
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('LOGIN_IP_RATE', default='600/min'),
+        'login_email': config('LOGIN_EMAIL_RATE', default='10/min'),
+        'register_ip': config('REGISTER_IP_RATE', default='120/hour'),
+    },
+}
+
+# Upper bound for the `page_size` query parameter on list endpoints
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=100, cast=int)
+
+
+# Cache. Local memory is per process, so invalidations only reach the worker
+# that made the change; multi-process deployments should use the file backend
+# (CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache with
+# CACHE_LOCATION pointing at a shared directory) or a shared cache server.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='questify'),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    }
+}
+
+# Whether every server process sees the same cache. Shortcuts that must not
+# miss a revocation made by another worker (the refresh token blacklist
+# filter, long-lived access token versions) are only taken when it does. Set CACHE_SHARED=True for a local
+# memory cache behind a single-process server.
+CACHE_SHARED = config(
+    'CACHE_SHARED', cast=bool,
+    default=not CACHES['default']['BACKEND'].endswith(('.LocMemCache', '.DummyCache')))
+
+# Lifetime of cached course summaries and detail trees, in seconds
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
+
+# Quiz attempt persistence. With WRITE_BEHIND on, submissions are journaled
+# to JOURNAL_DIR and inserted in batches by a background flusher; run
+# `manage.py replay_attempts --all` after an unclean shutdown.
+
+QUIZ_ATTEMPTS = {
+    'WRITE_BEHIND': config('QUIZ_ATTEMPTS_WRITE_BEHIND', default=False, cast=bool),
+    'JOURNAL_DIR': config('QUIZ_ATTEMPTS_JOURNAL_DIR', default=str(BASE_DIR / 'journal')),
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': config('QUIZ_ATTEMPTS_FLUSH_INTERVAL', default=1.0, cast=float),
+    'FSYNC': True,
+    'MAX_BATCH': 100,
+}
+
+
+# request.user is built from access token claims; these bound the cache of
+# full user rows loaded when a view needs more than id, email and role.
+# Revoked access tokens (role change, deactivation) stop working once the
+# token version reaches the cache, which User.save updates. With CACHE_SHARED
+# that is at once for every worker; otherwise at once in the saving process
+# and within LOCAL_VERSION_TIMEOUT seconds in the others. Changes made with
+# queryset.update() bypass User.save and wait out the timeout.
+AUTH_USER_CACHE = {
+    'TIMEOUT': config('AUTH_USER_CACHE_TIMEOUT', default=30, cast=int),
+    'MAX_ENTRIES': 1024,
+    'VERSION_TIMEOUT': 300,
+    'LOCAL_VERSION_TIMEOUT': config('AUTH_LOCAL_VERSION_TIMEOUT', default=5, cast=int),
+}
+
+
+# Writes flag the teacher dashboard sections they change; a thread in each
+# process recomputes flagged sections every REFRESH_INTERVAL seconds. With
+# None, run `manage.py refresh_dashboards --stale` from a scheduler instead
+DASHBOARD_SNAPSHOTS = {
+    'REFRESH_INTERVAL': config('DASHBOARD_REFRESH_INTERVAL', default=5.0, cast=float),
+}
+
+
+# Per-process Bloom filter that lets most refreshes skip the blacklist query.
+# Without CACHE_SHARED, a token blacklisted by one worker is refused by the
+# others within CATCH_UP_INTERVAL seconds rather than at once.
+TOKEN_BLACKLIST_FILTER = {
+    'ENABLED': config('TOKEN_BLACKLIST_FILTER_ENABLED', default=True, cast=bool),
+    'REBUILD_INTERVAL': config('TOKEN_BLACKLIST_FILTER_REBUILD_INTERVAL', default=300, cast=int),
+    'CATCH_UP_INTERVAL': config('TOKEN_BLACKLIST_FILTER_CATCH_UP_INTERVAL', default=5, cast=int),
+    'FALSE_POSITIVE_RATE': 0.01,
+}
+
+
+# Password hashes run on a pool of WORKERS threads; beyond MAX_QUEUE waiting,
+# logins and registrations get a 503. WORKERS 0 hashes on the request thread.
+# One PBKDF2 hash takes about 0.4 s of a core, so eight queued per worker is
+# roughly a three second wait.
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=os.cpu_count() or 2, cast=int)
+PASSWORD_HASHING = {
+    'WORKERS': PASSWORD_HASHING_WORKERS,
+    'MAX_QUEUE': config('PASSWORD_HASHING_MAX_QUEUE', default=8 * max(PASSWORD_HASHING_WORKERS, 1), cast=int),
+}
+
+
+# Threads used to evaluate independent analytics sections concurrently; each
+# holds its own database connection. 0 or 1 evaluates them one after another.
+ANALYTICS_WORKERS = config('ANALYTICS_WORKERS', default=4, cast=int)
+
+
+# Request profiling (Server-Timing headers and rolling per-route histograms)
+
+PROFILING = {
+    'ENABLED': config('PROFILING_ENABLED', default=True, cast=bool),
+    'SAMPLE_RATE': config('PROFILING_SAMPLE_RATE', default=1.0, cast=float),
+    'WINDOW_SECONDS': 3600,
+    'SLOT_SECONDS': 60,
+    'DUMP_DIR': config('PROFILING_DUMP_DIR', default=str(BASE_DIR / 'profiling')),
+    'DUMP_INTERVAL': config('PROFILING_DUMP_INTERVAL', default=60, cast=int),
 }
 
 
@@ -186,7 +360,7 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "api.serializers.TokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
@@ -161,6 +161,37 @@ const COOKIE_CONFIG = {
 const API_BASE_URL =
   process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:8000";
 
+// List endpoints are cursor paginated; follow `next` so callers get every row
+async function fetchAllPages<T>(url: string, accessToken: string, description: string): Promise<T[]> {
+  const firstPage = new URL(url);
+  firstPage.searchParams.set("page_size", "100");
+  const rows: T[] = [];
+  let next: string | null = firstPage.toString();
+
+  while (next) {
+    const response: Response = await fetch(next, {
+      method: "GET",
+      headers: {
+        Authorization: `Bearer ${accessToken}`,
+        "Content-Type": "application/json",
+      },
+    });
+
+    if (!response.ok) {
+      throw new Error(`Failed to fetch ${description}: ${response.status}`);
+    }
+
+    const data = await response.json();
+    if (!Array.isArray(data.results)) {
+      // Not paginated
+      return data;
+    }
+    rows.push(...data.results);
+    next = data.next;
+  }
+  return rows;
+}
+
 // Helper function to set auth cookies
 async function setAuthCookies(authData: AuthResponse, rememberMe: boolean = false) {
   const cookieStore = await cookies();
@@ -332,20 +363,7 @@ export async function getTeacherCourses(): Promise<CourseResponse[]> {
       throw new Error("No access token found");
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/v1/courses/`, {
-      method: "GET",
-      headers: {
-        Authorization: `Bearer ${accessToken}`,
-        "Content-Type": "application/json",
-      },
-    });
-
-    if (!response.ok) {
-      throw new Error(`Failed to fetch courses: ${response.status}`);
-    }
-
-    const data = await response.json();
-    return data;
+    return await fetchAllPages<CourseResponse>(`${API_BASE_URL}/api/v1/courses/`, accessToken, "courses");
   } catch (error) {
     console.error("Error fetching teacher courses:", error);
     throw error;
@@ -559,20 +577,7 @@ export async function getAvailableCourses(): Promise<CourseResponse[]> {
       throw new Error("No access token found");
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/v1/courses/available/`, {
-      method: "GET",
-      headers: {
-        Authorization: `Bearer ${accessToken}`,
-        "Content-Type": "application/json",
-      },
-    });
-
-    if (!response.ok) {
-      throw new Error(`Failed to fetch available courses: ${response.status}`);
-    }
-
-    const data = await response.json();
-    return data;
+    return await fetchAllPages<CourseResponse>(`${API_BASE_URL}/api/v1/courses/available/`, accessToken, "available courses");
   } catch (error) {
     console.error("Error fetching available courses:", error);
     throw error;
@@ -618,20 +623,7 @@ export async function getCourseEnrollmentRequests(courseId: string): Promise<Enr
       throw new Error("No access token found");
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/v1/courses/${courseId}/enrollment_requests/`, {
-      method: "GET",
-      headers: {
-        Authorization: `Bearer ${accessToken}`,
-        "Content-Type": "application/json",
-      },
-    });
-
-    if (!response.ok) {
-      throw new Error(`Failed to fetch enrollment requests: ${response.status}`);
-    }
-
-    const data = await response.json();
-    return data;
+    return await fetchAllPages<EnrollmentRequestResponse>(`${API_BASE_URL}/api/v1/courses/${courseId}/enrollment_requests/`, accessToken, "enrollment requests");
   } catch (error) {
     console.error("Error fetching enrollment requests:", error);
     throw error;
@@ -709,20 +701,7 @@ export async function getAllEnrollmentRequests(): Promise<EnrollmentRequestRespo
       throw new Error("No access token found");
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/v1/enrollment-requests/`, {
-      method: "GET",
-      headers: {
-        Authorization: `Bearer ${accessToken}`,
-        "Content-Type": "application/json",
-      },
-    });
-
-    if (!response.ok) {
-      throw new Error(`Failed to fetch enrollment requests: ${response.status}`);
-    }
-
-    const data = await response.json();
-    return data;
+    return await fetchAllPages<EnrollmentRequestResponse>(`${API_BASE_URL}/api/v1/enrollment-requests/`, accessToken, "enrollment requests");
   } catch (error) {
     console.error("Error fetching enrollment requests:", error);
     throw error;
@@ -738,20 +717,7 @@ export async function getCourseStudents(courseId: string): Promise<StudentData[]
       throw new Error("No access token found");
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/v1/courses/${courseId}/students/`, {
-      method: "GET",
-      headers: {
-        Authorization: `Bearer ${accessToken}`,
-        "Content-Type": "application/json",
-      },
-    });
-
-    if (!response.ok) {
-      throw new Error(`Failed to fetch course students: ${response.status}`);
-    }
-
-    const data = await response.json();
-    return data;
+    return await fetchAllPages<StudentData>(`${API_BASE_URL}/api/v1/courses/${courseId}/students/`, accessToken, "course students");
   } catch (error) {
     console.error("Error fetching course students:", error);
     throw error;
@@ -836,20 +802,7 @@ export async function getStudentCourses(): Promise<CourseResponse[]> {
       throw new Error("No access token found");
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/v1/courses/enrolled/`, {
-      method: "GET",
-      headers: {
-        Authorization: `Bearer ${accessToken}`,
-        "Content-Type": "application/json",
-      },
-    });
-
-    if (!response.ok) {
-      throw new Error(`Failed to fetch enrolled courses: ${response.status}`);
-    }
-
-    const data = await response.json();
-    return data;
+    return await fetchAllPages<CourseResponse>(`${API_BASE_URL}/api/v1/courses/enrolled/`, accessToken, "enrolled courses");
   } catch (error) {
     console.error("Error fetching enrolled courses:", error);
     throw error;
@@ -867,20 +820,7 @@ export async function getCourseChapters(courseId: string): Promise<ChapterRespon
       throw new Error("No access token found");
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/v1/chapters/?course=${courseId}`, {
-      method: "GET",
-      headers: {
-        Authorization: `Bearer ${accessToken}`,
-        "Content-Type": "application/json",
-      },
-    });
-
-    if (!response.ok) {
-      throw new Error(`Failed to fetch chapters: ${response.status}`);
-    }
-
-    const data = await response.json();
-    return data;
+    return await fetchAllPages<ChapterResponse>(`${API_BASE_URL}/api/v1/chapters/?course=${courseId}`, accessToken, "chapters");
   } catch (error) {
     console.error("Error fetching chapters:", error);
     throw error;
@@ -987,20 +927,7 @@ export async function getCourseQuizzes(courseId: string): Promise<QuizResponse[]
       throw new Error("No access token found");
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/v1/quizzes/?course=${courseId}`, {
-      method: "GET",
-      headers: {
-        Authorization: `Bearer ${accessToken}`,
-        "Content-Type": "application/json",
-      },
-    });
-
-    if (!response.ok) {
-      throw new Error(`Failed to fetch quizzes: ${response.status}`);
-    }
-
-    const data = await response.json();
-    return data;
+    return await fetchAllPages<QuizResponse>(`${API_BASE_URL}/api/v1/quizzes/?course=${courseId}`, accessToken, "quizzes");
   } catch (error) {
     console.error("Error fetching quizzes:", error);
     throw error;
@@ -1107,20 +1034,7 @@ export async function getQuizQuestions(quizId: string): Promise<QuestionResponse
       throw new Error("No access token found");
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/v1/questions/?quiz=${quizId}`, {
-      method: "GET",
-      headers: {
-        Authorization: `Bearer ${accessToken}`,
-        "Content-Type": "application/json",
-      },
-    });
-
-    if (!response.ok) {
-      throw new Error(`Failed to fetch questions: ${response.status}`);
-    }
-
-    const data = await response.json();
-    return data;
+    return await fetchAllPages<QuestionResponse>(`${API_BASE_URL}/api/v1/questions/?quiz=${quizId}`, accessToken, "questions");
   } catch (error) {
     console.error("Error fetching questions:", error);
     throw error;